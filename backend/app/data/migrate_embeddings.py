@@ -0,0 +1,114 @@
+# app/data/migrate_embeddings.py
+# ============================================================
+# MIGRAÇÃO: faces.embedding float8[] → bytea float32 normalizado
+# ------------------------------------------------------------
+# Uso (na pasta backend/):
+#     python -m app.data.migrate_embeddings [--batch-size 1000]
+#
+#   0. cria as tabelas que ainda não existam (create_all) — é o passo
+#      de criação das tabelas quando a API sobe com DB_CREATE_TABLES=0
+#   1. cria a coluna temporária embedding_bin (bytea)
+#   2. converte em lotes (retomável: só linhas ainda sem embedding_bin)
+#   3. remove a coluna antiga e renomeia embedding_bin → embedding
+#   4. adiciona colunas e índices novos de faces e face_liveness_state
+#      que ainda não existam (NEW_COLUMNS, NEW_INDEXES)
+# Rodar com a API parada. Idempotente: pode ser executado várias vezes.
+# ============================================================
+import argparse
+
+from sqlalchemy import inspect, text
+from sqlalchemy.types import LargeBinary
+
+from app.data.database import Base, engine
+from app.utils.embedding_codec import encode_embedding
+
+
+# Colunas adicionadas depois da criação original das tabelas
+NEW_COLUMNS = {
+    "faces": {
+        "quality": "REAL",
+        "content_hash": "VARCHAR(32)",
+        "phash": "VARCHAR(16)",
+    },
+    "face_liveness_state": {
+        "hold_streak": "INTEGER DEFAULT 0",
+        "need_center": "BOOLEAN DEFAULT FALSE",
+        "face_frames": "INTEGER DEFAULT 0",
+        "matched_frames": "INTEGER DEFAULT 0",
+        "min_similarity": "REAL",
+        "attempts": "INTEGER DEFAULT 0",
+        # desafios anteriores à coluna já nascem vencidos
+        "created_at": "TIMESTAMP DEFAULT '1970-01-01'",
+    },
+}
+
+# Índices sobre colunas novas
+NEW_INDEXES = {
+    "ix_faces_user_content_hash": "faces (user_id, content_hash)",
+}
+
+
+def create_missing_tables():
+    from app.model import face, face_liveness_state, user  # noqa: F401  (registra as tabelas)
+    Base.metadata.create_all(bind=engine)
+
+
+def add_missing_columns():
+    with engine.begin() as conn:
+        for table, columns in NEW_COLUMNS.items():
+            for name, ddl in columns.items():
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {ddl}"))
+        for name, target in NEW_INDEXES.items():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+
+
+def embedding_column_is_binary(conn) -> bool:
+    columns = {c["name"]: c for c in inspect(conn).get_columns("faces")}
+    return isinstance(columns["embedding"]["type"], LargeBinary)
+
+
+def migrate(batch_size: int = 1000) -> int:
+    with engine.begin() as conn:
+        if embedding_column_is_binary(conn):
+            print("faces.embedding já está em bytea — nada a migrar.")
+            return 0
+        conn.execute(text("ALTER TABLE faces ADD COLUMN IF NOT EXISTS embedding_bin BYTEA"))
+
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT face_id, embedding FROM faces "
+                    "WHERE face_id > :last_id AND embedding IS NOT NULL AND embedding_bin IS NULL "
+                    "ORDER BY face_id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+
+            conn.execute(
+                text("UPDATE faces SET embedding_bin = :blob WHERE face_id = :face_id"),
+                [{"face_id": r.face_id, "blob": encode_embedding(r.embedding)} for r in rows],
+            )
+            last_id = rows[-1].face_id
+            converted += len(rows)
+            print(f"{converted} embeddings convertidos (face_id até {last_id})")
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE faces DROP COLUMN embedding"))
+        conn.execute(text("ALTER TABLE faces RENAME COLUMN embedding_bin TO embedding"))
+
+    print(f"Migração concluída: {converted} embeddings.")
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte faces.embedding para bytea float32.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    create_missing_tables()
+    migrate(args.batch_size)
+    add_missing_columns()
@@ -1,18 +1,166 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.data.database import engine, Base
+from fastapi.responses import PlainTextResponse
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from app.data.database import engine, Base, SessionLocal
 from app.routes.user import router as user_router
-from app.routes import face_routes
+from app.routes import face_routes, health
+from app.services.gallery_index import gallery_index
+from app.services.ann_index import load_ann_index
+from app.services.shared_gallery import shared_gallery
+from app.services.model_registry import model_registry
+from app.services.face_liveness_service import (
+    EARLY_EXIT_BATCH,
+    RECOGNITION_BATCH_SIZE,
+    prewarm_embedding_cache,
+)
+from app.services.metrics import observe_request, registry
+from app.utils.request_context import RequestContextMiddleware, configure_logging, logger
+
+configure_logging()
+
+
+# ============================================================
+# SUBIDA DO WORKER
+# ------------------------------------------------------------
+# Pré-fork (no import; com gunicorn --preload roda 1 vez no master):
+#   tabelas (create_all, uma vez só — sem corrida entre workers)
+#   arquivos de modelo baixados/quantizados e no page cache
+# Lifespan (em cada worker, antes de aceitar tráfego):
+#   sessões ONNX + warm-up por det_size e lote de reconhecimento
+#   → galeria 1:N → cache de templates (opcional)
+#   → /health/ready passa a responder 200
+#
+# Falhas (ex.: banco ainda subindo) são repetidas com backoff
+# exponencial por STARTUP_RETRIES tentativas; esgotadas, o erro
+# sobe: o processo sai e o gunicorn / a política de restart do
+# container sobe outro, em vez de ficar vivo e nunca "ready".
+# Sem --preload (vários workers uvicorn), use DB_CREATE_TABLES=0
+# e crie as tabelas antes (python -m app.data.migrate_embeddings).
+# ============================================================
+
+DB_CREATE_TABLES = os.getenv("DB_CREATE_TABLES", "1") == "1"
+STARTUP_RETRIES = int(os.getenv("STARTUP_RETRIES", "8"))
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", "1"))      # s, dobra a cada tentativa
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "30"))
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+# Índice de identificação 1:N carregado na subida do worker
+GALLERY_INDEX_ON_STARTUP = os.getenv("GALLERY_INDEX_ON_STARTUP", "1") == "1"
+# Templates dos N usuários cadastrados mais recentemente (0 = desligado)
+EMBEDDING_CACHE_PREWARM_USERS = int(os.getenv("EMBEDDING_CACHE_PREWARM_USERS", "0"))
+
+def retry_delays():
+    """Esperas entre tentativas: STARTUP_RETRY_DELAY, x2, ... até o teto."""
+    delay = STARTUP_RETRY_DELAY
+    for _ in range(max(STARTUP_RETRIES, 1) - 1):
+        yield delay
+        delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+
+
+def create_tables():
+    """create_all com retry (banco pode estar subindo junto com a API)."""
+    for delay in retry_delays():
+        try:
+            Base.metadata.create_all(bind=engine)
+            return
+        except Exception as e:
+            logger.warning("create_tables_retry", extra={"fields": {"error": str(e), "retry_in": delay}})
+            time.sleep(delay)
+    Base.metadata.create_all(bind=engine)   # última tentativa: o erro sobe
+
+
+if DB_CREATE_TABLES:
+    create_tables()
+
+if MODEL_PRELOAD:
+    try:
+        model_registry.prepare_files()
+    except Exception as e:
+        # sem os arquivos o worker tenta de novo no warm-up (e fica not ready)
+        logger.warning("model_preload_failed", extra={"fields": {"error": str(e)}})
+
+
+def build_gallery_index() -> str:
+    db = SessionLocal()
+    try:
+        # Índice IVF persistido (memmap) dispensa a galeria exata em memória;
+        # faces cadastradas depois do build entram como pendentes
+        if load_ann_index(db=db):
+            return "ann"
+        # Galeria compartilhada entre workers dispensa a cópia por worker
+        if shared_gallery.attach():
+            return "shared"
+        if not GALLERY_INDEX_ON_STARTUP:
+            return "off"
+        gallery_index.build(db)
+        return "exact"
+    finally:
+        db.close()
+
+
+def prewarm_cache() -> int:
+    db = SessionLocal()
+    try:
+        return prewarm_embedding_cache(db, EMBEDDING_CACHE_PREWARM_USERS)
+    finally:
+        db.close()
+
+
+def startup() -> dict:
+    """Warm-up, galeria e cache do worker (roda numa thread)."""
+    report = {}
+    if MODEL_WARMUP:
+        report["warmup_seconds"] = model_registry.warmup(
+            (1, RECOGNITION_BATCH_SIZE, EARLY_EXIT_BATCH)
+        )
+    report["gallery"] = build_gallery_index()
+    if EMBEDDING_CACHE_PREWARM_USERS > 0:
+        report["cached_users"] = prewarm_cache()
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.time()
+    delays = retry_delays()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            report = await asyncio.to_thread(startup)
+            break
+        except Exception as e:
+            delay = next(delays, None)
+            if delay is None:
+                # sem ficar vivo e fora do balanceamento para sempre: sai e é reiniciado
+                health.mark_not_ready("failed", str(e))
+                logger.exception("startup_failed", extra={"fields": {"attempts": attempt}})
+                raise
+            health.mark_not_ready("starting", str(e))
+            logger.warning("startup_retry", extra={"fields": {
+                "attempt": attempt, "error": str(e), "retry_in": delay
+            }})
+            await asyncio.sleep(delay)
+
+    report["startup_attempts"] = attempt
+    report["startup_seconds"] = round(time.time() - t0, 3)
+    health.mark_ready(report)
+    logger.info("startup_ready", extra={"fields": report})
+    yield
+    health.mark_not_ready("stopping")
+
 
 app = FastAPI(
     title="Face Recognition API",
     description="API para gerenciamento de usuários e reconhecimento facial com InsightFace",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Criar tabelas no banco
-Base.metadata.create_all(bind=engine)
-
 # Configuração de CORS
 origins = [
     "http://localhost:5173",
@@ -25,12 +173,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# request_id + log estruturado por requisição + latência por rota
+app.add_middleware(RequestContextMiddleware, on_finish=observe_request)
+
 # Incluir rotas
 app.include_router(user_router, prefix="/users", tags=["Usuários"])
 app.include_router(face_routes.router, prefix="/faces", tags=["Faces"])
+app.include_router(health.router, prefix="/health")
+
 
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "API de reconhecimento facial está online e funcional!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas do worker no formato texto do Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
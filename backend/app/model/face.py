@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, ARRAY, DateTime, Text, Float
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, Text, LargeBinary, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.data.database import Base
@@ -13,13 +13,23 @@ class Face(Base):
     filename = Column(String(255), nullable=True)
     source = Column(String(50), nullable=False, default="UPLOAD")
     
-    embedding = Column(ARRAY(Float), nullable=True)
+    # 512 float32 little-endian, normalizado (ver app/utils/embedding_codec.py)
+    embedding = Column(LargeBinary, nullable=True)
+    quality = Column(Float, nullable=True)   # score do detector x tamanho da face (0..1)
+
+    # Deduplicação do cadastro (ver app/utils/content_hash.py)
+    content_hash = Column(String(32), nullable=True)   # BLAKE2b dos bytes enviados
+    phash = Column(String(16), nullable=True)          # dHash 64 bits da imagem
     image_data = Column(Text, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="faces")
 
+    __table_args__ = (
+        Index("ix_faces_user_content_hash", "user_id", "content_hash"),
+    )
+
     liveness_states = relationship(
         "FaceLivenessState",
         back_populates="face",
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, Boolean, Text, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, Boolean, Text, ForeignKey, JSON, DateTime, Float
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from app.data.database import Base
 
+# ARRAY no Postgres; JSON no SQLite (banco de testes)
+TextList = ARRAY(Text).with_variant(JSON(), "sqlite")
+
 class FaceLivenessState(Base):
     __tablename__ = "face_liveness_state"
 
@@ -10,9 +14,18 @@ class FaceLivenessState(Base):
     face_id = Column(Integer, ForeignKey("faces.face_id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
-    movement_history = Column(ARRAY(Text), default=list)
-    required_sequence = Column(ARRAY(Text), default=lambda: ["LEFT", "RIGHT"])
+    movement_history = Column(TextList, default=list)
+    required_sequence = Column(TextList, default=lambda: ["LEFT", "RIGHT"])
     next_expected_move = Column(Text, default="LEFT")
     finished = Column(Boolean, default=False)
 
+    # Progresso entre requisições (ver app/services/face_challenge_service.py)
+    hold_streak = Column(Integer, default=0)        # frames seguidos no movimento esperado
+    need_center = Column(Boolean, default=False)    # precisa voltar ao CENTER antes do próximo
+    face_frames = Column(Integer, default=0)        # frames com rosto
+    matched_frames = Column(Integer, default=0)     # ... e com o rosto do usuário
+    min_similarity = Column(Float, nullable=True)
+    attempts = Column(Integer, default=0)           # POSTs de frames recebidos
+    created_at = Column(DateTime, default=datetime.utcnow)
+
     face = relationship("Face", back_populates="liveness_states")
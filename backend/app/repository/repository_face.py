@@ -1,13 +1,64 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.model.face import Face
 
 def get_embeddings_by_user(db: Session, user_id: int):
     return (
-        db.query(Face.embedding)
+        db.query(Face.embedding, Face.quality)
         .filter(Face.user_id == user_id)
         .yield_per(1000)
         .all()
     )
 
+async def get_embeddings_by_user_async(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(Face.embedding, Face.quality).where(Face.user_id == user_id)
+    )
+    return result.all()
+
+async def get_face_embedding_async(db: AsyncSession, user_id: int, face_id: int):
+    """Só a coluna embedding (sem carregar a linha Face nem seus joins)."""
+    result = await db.execute(
+        select(Face.embedding).where(Face.face_id == face_id, Face.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+async def get_upload_hashes_async(db: AsyncSession, user_id: int):
+    """(face_id, content_hash, phash) das faces do usuário, para deduplicação."""
+    result = await db.execute(
+        select(Face.face_id, Face.content_hash, Face.phash).where(Face.user_id == user_id)
+    )
+    return result.all()
+
+def get_recent_user_ids(db: Session, limit: int):
+    """Usuários com cadastro mais recente primeiro (pré-aquecimento do cache)."""
+    return [
+        user_id for (user_id,) in
+        db.query(Face.user_id)
+        .group_by(Face.user_id)
+        .order_by(func.max(Face.face_id).desc())
+        .limit(limit)
+        .all()
+    ]
+
+def iter_all_embeddings(db: Session, batch_size: int = 10000):
+    """Percorre (face_id, user_id, embedding, quality) de todas as faces, em lotes."""
+    return (
+        db.query(Face.face_id, Face.user_id, Face.embedding, Face.quality)
+        .filter(Face.embedding.isnot(None))
+        .order_by(Face.face_id)
+        .yield_per(batch_size)
+    )
+
+def get_embeddings_after(db: Session, face_id: int):
+    """(face_id, user_id, embedding) das faces com face_id maior (cauda fora do índice)."""
+    return (
+        db.query(Face.face_id, Face.user_id, Face.embedding)
+        .filter(Face.face_id > face_id, Face.embedding.isnot(None))
+        .order_by(Face.face_id)
+        .all()
+    )
+
 def save_face(db: Session, face: Face):
     db.add(face)
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import List, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.model.face import Face
+from app.model.face_liveness_state import FaceLivenessState
+
+async def get_latest_face_id_async(db: AsyncSession, user_id: int) -> Optional[int]:
+    result = await db.execute(
+        select(Face.face_id)
+        .where(Face.user_id == user_id)
+        .order_by(Face.face_id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+def create_liveness_state(db: Union[Session, AsyncSession], user_id: int, face_id: int,
+                          sequence: List[str]) -> FaceLivenessState:
+    state = FaceLivenessState(
+        user_id=user_id,
+        face_id=face_id,
+        movement_history=[],
+        required_sequence=sequence,
+        next_expected_move=sequence[0],
+        finished=False,
+        hold_streak=0,
+        need_center=False,
+        face_frames=0,
+        matched_frames=0,
+        attempts=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(state)
+    return state
+
+async def get_liveness_state_async(db: AsyncSession, state_id: int,
+                                   user_id: int) -> Optional[FaceLivenessState]:
+    result = await db.execute(
+        select(FaceLivenessState)
+        .where(FaceLivenessState.id == state_id, FaceLivenessState.user_id == user_id)
+    )
+    return result.unique().scalar_one_or_none()
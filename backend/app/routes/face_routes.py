@@ -1,32 +1,76 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import asyncio
+import json
+import os
+import time
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.data.database import get_db
+from typing import List, Optional
+from app.data.database import AsyncSessionLocal, get_async_db, get_db
 from app.services.face_capture_service import save_multiple_faces_from_upload
-from app.services.face_liveness_service import FaceLivenessService
+from app.services.face_liveness_service import (
+    FRAME_SKIP,
+    FaceLivenessService,
+    LivenessAccumulator,
+    face_app,
+    get_user_embeddings_async,
+)
+from app.services.face_tracker import (
+    TRACKING_ENABLED,
+    TRACKING_FRAME_SKIP,
+    FaceTracker,
+    tracking_stats,
+)
+from app.services.model_registry import model_registry
+from app.services.inference_executor import inference_executor, InferenceQueueFull
+from app.services.embedding_cache import embedding_cache
+from app.services.face_identify_service import identify_face
+from app.services.face_verify_service import verify_face_match
+from app.services.face_challenge_service import (
+    challenge_expired,
+    run_challenge_frames,
+    start_challenge_async,
+)
+from app.repository.repository_liveness_state import get_latest_face_id_async, get_liveness_state_async
+from app.services.gallery_index import gallery_index
+from app.services.ann_index import ann_index
+from app.services.shared_gallery import shared_gallery
+from app.services.metrics import FRAMES, stage_timer
+from app.utils.frame_batch import FRAME_BATCH_MEDIA_TYPE, FrameBatchError, read_frame_batch
 
 router = APIRouter(tags=["Faces"])
 
 
+def _queue_full(e: InferenceQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @router.post("/upload/{user_id}")
 async def upload_faces(
     user_id: int,
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not files:
         raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
 
     try:
-        results = await save_multiple_faces_from_upload(db, user_id, files)
-        db.commit()  # único commit
+        results = await save_multiple_faces_from_upload(db, user_id, files)  # único commit
         return {
             "status": "ok",
             "saved_faces": len([r for r in results if r["status"] == "ok"]),
+            "duplicates": len([r for r in results if r["status"] == "duplicate"]),
             "details": results
         }
+    except InferenceQueueFull as e:
+        await db.rollback()
+        raise _queue_full(e)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -34,24 +78,302 @@ async def upload_faces(
 async def liveness(
     user_id: int,
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not files:
         raise HTTPException(status_code=400, detail="Nenhum frame enviado.")
 
     try:
+        # embeddings do usuário pela sessão assíncrona (ou cache)
+        user_embs = await get_user_embeddings_async(db, user_id)
+        if user_embs is None:
+            return {"status": "error", "message": "Nenhuma face cadastrada"}
+
         # streaming de frames → sem estourar RAM
-        frame_bytes_list = []
-        for f in files:
-            frame_bytes_list.append(await f.read())
+        with stage_timer("multipart_read"):
+            frame_bytes_list = []
+            for f in files:
+                frame_bytes_list.append(await f.read())
 
-        result = FaceLivenessService.process_batch_frames(
-            db=db,
+        # inferência fora do event loop (fila limitada)
+        result = await inference_executor.run(
+            FaceLivenessService.process_batch_frames,
+            db=None,
             user_id=user_id,
-            frames=frame_bytes_list
+            frames=frame_bytes_list,
+            user_embs=user_embs
         )
 
         return result
 
+    except InferenceQueueFull as e:
+        raise _queue_full(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/liveness/{user_id}/frames")
+async def liveness_frames(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Liveness com o lote binário (application/x-face-frames, ver
+    app/utils/frame_batch.py): sem multipart, e os frames que o skip
+    pularia são descartados durante a leitura do corpo.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != FRAME_BATCH_MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Use Content-Type {FRAME_BATCH_MEDIA_TYPE}.")
+
+    try:
+        user_embs = await get_user_embeddings_async(db, user_id)
+        if user_embs is None:
+            return {"status": "error", "message": "Nenhuma face cadastrada"}
+
+        with stage_timer("body_read"):
+            header, frames, skipped = await read_frame_batch(
+                request.stream(), TRACKING_FRAME_SKIP if TRACKING_ENABLED else FRAME_SKIP
+            )
+        if not frames:
+            raise HTTPException(status_code=400, detail="Nenhum frame enviado.")
+        FRAMES.inc(skipped, outcome="skipped")
+
+        # lote já amostrado: o serviço processa todos os frames mantidos
+        result = await inference_executor.run(
+            FaceLivenessService.process_batch_frames,
+            db=None,
+            user_id=user_id,
+            frames=frames,
+            user_embs=user_embs,
+            frame_skip=1
+        )
+        result["frames_received"] = header.count
+        result["frames_discarded"] = skipped   # pulados na leitura do corpo
+        return result
+
+    except FrameBatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        raise _queue_full(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/identify")
+async def identify(
+    file: UploadFile = File(...),
+    top_k: int = Query(5, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Identificação 1:N: busca o rosto enviado entre todos os usuários."""
+    try:
+        with stage_timer("multipart_read"):
+            content = await file.read()
+        return await inference_executor.run(identify_face, db, content, top_k)
+    except InferenceQueueFull as e:
+        raise _queue_full(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/verify/{user_id}")
+async def verify(
+    user_id: int,
+    file: UploadFile = File(...),
+    face_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Verificação 1:1: a foto enviada é do usuário (ou da face face_id)?"""
+    try:
+        with stage_timer("multipart_read"):
+            content = await file.read()
+        result = await verify_face_match(db, user_id, content, face_id)
+    except InferenceQueueFull as e:
+        raise _queue_full(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
+
+
+# ============================================================
+# DESAFIO ATIVO DE POSE (LEFT / RIGHT / UP / DOWN)
+# ------------------------------------------------------------
+#   1. POST /faces/challenge/{user_id}            → sorteia a sequência
+#   2. POST /faces/challenge/{user_id}/{state_id} → envia frames; o
+#      estado avança frame a frame até finished (um ou vários POSTs)
+# Desafio vencido (CHALLENGE_TTL_SECONDS / CHALLENGE_MAX_ATTEMPTS) → 410.
+# ============================================================
+
+@router.post("/challenge/{user_id}")
+async def create_challenge(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    face_id = await get_latest_face_id_async(db, user_id)
+    if face_id is None:
+        raise HTTPException(status_code=404, detail="Nenhuma face cadastrada")
+    state = await start_challenge_async(db, user_id, face_id)
+    return {
+        "state_id": state.id,
+        "required_sequence": state.required_sequence,
+        "next_expected_move": state.next_expected_move,
+    }
+
+
+@router.post("/challenge/{user_id}/{state_id}")
+async def challenge_frames(
+    user_id: int,
+    state_id: int,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    state = await get_liveness_state_async(db, state_id, user_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Desafio não encontrado")
+    expired = challenge_expired(state)
+    if expired:
+        raise HTTPException(status_code=410, detail=f"Desafio encerrado ({expired}); inicie outro.")
+    state.attempts = (state.attempts or 0) + 1
+
+    try:
+        user_embs = await get_user_embeddings_async(db, user_id)
+        if user_embs is None:
+            return {"status": "error", "message": "Nenhuma face cadastrada"}
+        with stage_timer("multipart_read"):
+            frames = [await f.read() for f in files]
+
+        # a thread de inferência só altera o objeto; a sessão fica no event loop
+        challenge = await inference_executor.run(run_challenge_frames, state, user_embs, frames)
+        await db.commit()   # progresso + contadores: 1 escrita por requisição
+        return {"status": "ok", **challenge.result()}
+    except InferenceQueueFull as e:
+        raise _queue_full(e)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================================
+# LIVENESS VIA WEBSOCKET (STREAMING DE FRAMES)
+# ------------------------------------------------------------
+# Protocolo:
+#   - conecta em /faces/liveness/ws/{user_id}?total_frames=N&stride=S
+#     (total_frames = frames que serão enviados; stride = o cliente já
+#     envia só 1 a cada S capturados, e o skip do servidor cai na mesma
+#     proporção)
+#   - envia cada frame JPEG como mensagem binária, assim que capturado
+#   - recebe {"type": "frame", ...} por frame processado
+#   - recebe {"type": "result", ...} assim que o veredito não pode
+#     mais mudar (exige total_frames) ou após {"event": "end"}
+#   - sem mensagem por WS_IDLE_TIMEOUT segundos: {"type": "error"} e
+#     fechamento 1008 (cliente parado não prende slot nem conexão)
+# A sessão do banco só vive durante a carga dos embeddings: nada de
+# conexão "idle in transaction" enquanto o stream estiver aberto.
+# ============================================================
+
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "30"))
+
+
+@router.websocket("/liveness/ws/{user_id}")
+async def liveness_stream(
+    websocket: WebSocket,
+    user_id: int,
+    total_frames: Optional[int] = None,
+    stride: int = 1,
+):
+    await websocket.accept()
+    t0 = time.time()
+
+    try:
+        async with AsyncSessionLocal() as db:
+            user_embs = await get_user_embeddings_async(db, user_id)
+        if user_embs is None:
+            await websocket.send_json({"type": "result", "status": "error", "message": "Nenhuma face cadastrada"})
+            await websocket.close()
+            return
+
+        tracker = FaceTracker(face_app) if TRACKING_ENABLED else None
+        frame_skip = TRACKING_FRAME_SKIP if tracker else FRAME_SKIP
+        acc = LivenessAccumulator(
+            user_embs, expected_frames=total_frames, t0=t0,
+            frame_skip=max(1, frame_skip // max(stride, 1))
+        )
+        verdict = None
+
+        while verdict is None:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "message": "Tempo sem frames esgotado"})
+                await websocket.close(code=1008)
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                if not acc.next_frame():
+                    continue
+                score = await inference_executor.run(
+                    FaceLivenessService.score_frame, user_embs, message["bytes"], tracker, acc
+                )
+                acc.add(score)
+                await websocket.send_json({
+                    "type": "frame",
+                    "index": acc.frames_received - 1,
+                    "similarity": score,
+                })
+                verdict = acc.decide()
+
+            elif message.get("text"):
+                if json.loads(message["text"]).get("event") == "end":
+                    break
+
+        result = acc.result()
+        result["frames_received"] = acc.frames_received
+        if tracker:
+            tracking_stats.record(tracker)
+            result["tracking"] = tracker.stats()
+        await websocket.send_json({"type": "result", **result})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        return
+    except InferenceQueueFull as e:
+        await websocket.send_json({"type": "error", "message": str(e), "retry_after": e.retry_after})
+        await websocket.close(code=1013)  # Try Again Later
+    except Exception as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1011)
+
+
+@router.get("/models")
+def models_info():
+    """Modelos carregados no worker e memória ocupada por cada um."""
+    return model_registry.memory_report()
+
+
+@router.get("/inference/stats")
+def inference_stats():
+    """Profundidade da fila e tempos de espera do executor de inferência."""
+    return {**inference_executor.stats(), "recognition_batcher": model_registry.batcher.stats()}
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """Ocupação e hit-rate do cache de embeddings por usuário."""
+    return embedding_cache.stats()
+
+
+@router.get("/gallery/stats")
+def gallery_stats():
+    """Tamanho e memória dos índices de galeria (identificação 1:N)."""
+    return {"exact": gallery_index.stats(), "ann": ann_index.stats(), "shared": shared_gallery.stats()}
+
+
+@router.get("/tracking/stats")
+def tracking_stats_view():
+    """Detecções por ROI vs frame inteiro e taxa de fallback do tracker."""
+    return tracking_stats.snapshot()
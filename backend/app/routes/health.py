@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from app.data.database import engine
+
+router = APIRouter(tags=["Health"])
+
+
+# ============================================================
+# PROBES DE SAÚDE (ORQUESTRADOR / LOAD BALANCER)
+# ------------------------------------------------------------
+#   /health/live   processo de pé (não depende de modelo nem banco)
+#   /health/ready  503 até o lifespan terminar (modelos carregados,
+#                  warm-up feito, galeria pronta) e enquanto o banco
+#                  não responder — deploy gradual não manda tráfego
+#                  para worker frio
+# ============================================================
+
+_startup = {"status": "starting", "reason": None, "report": {}}
+
+
+def mark_ready(report: dict):
+    _startup.update(status="ready", reason=None, report=report)
+
+
+def mark_not_ready(status: str, reason: str = None, report: dict = None):
+    """status: "starting" (nova tentativa), "failed" (desistiu) ou "stopping"."""
+    _startup.update(status=status, reason=reason, report=report or {})
+
+
+@router.get("/live")
+def live():
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+def ready():
+    if _startup["status"] != "ready":
+        return JSONResponse(status_code=503, content={
+            "status": _startup["status"], "reason": _startup["reason"], "startup": _startup["report"]
+        })
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "db_unavailable", "reason": str(e)})
+    return {"status": "ready", "startup": _startup["report"]}
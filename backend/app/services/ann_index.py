@@ -0,0 +1,315 @@
+import os
+import json
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.enrollment_events import on_enrollment
+from app.utils.embedding_codec import EMBEDDING_DIM, decode_embeddings, l2_normalize
+
+
+# ============================================================
+# ÍNDICE APROXIMADO (IVF) PARA GALERIAS GRANDES
+# ------------------------------------------------------------
+# Com milhões de faces, o produto contra a galeria inteira fica
+# caro. O IVF divide os embeddings em `nlist` listas por k-means
+# esférico (cosseno) e a busca só percorre as `nprobe` listas
+# cujos centróides estão mais próximos do probe.
+#
+#   - nprobe maior → recall maior, latência maior
+#   - salvo em .npy (np.load(mmap_mode="r")): um worker reiniciado
+#     atende buscas na hora, sem reconstruir nem copiar para a RAM
+#   - faces cadastradas depois do build ficam numa lista pendente
+#     (busca exata) até o próximo build: as deste worker chegam pelo
+#     evento de cadastro; as de outros workers (ou feitas entre o
+#     build e a subida) pela consulta face_id > maior face_id já
+#     visto (catch_up, antes de cada busca)
+#
+# Arquivos em ANN_INDEX_PATH:
+#   centroids.npy  nlist x 512
+#   vectors.npy    N x 512, ordenados por lista
+#   offsets.npy    nlist + 1 (lista i = linhas offsets[i]:offsets[i+1])
+#   user_ids.npy / face_ids.npy
+#   meta.json
+# ============================================================
+
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "")
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))        # 0 = automático (~4·√N)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "64"))   # amostras por lista no treino
+
+_CHUNK = 65536   # linhas por bloco ao atribuir listas (limita memória)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Lista (centróide mais similar) de cada vetor, em blocos."""
+    labels = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], _CHUNK):
+        block = np.asarray(vectors[start:start + _CHUNK], dtype=np.float32)
+        labels[start:start + _CHUNK] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, n_iter: int = 20,
+                     seed: int = 0) -> np.ndarray:
+    """k-means com similaridade de cosseno; retorna centróides normalizados."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    centroids = vectors[rng.choice(n, size=k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        nonempty = counts > 0
+        sums = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+        centroids[nonempty] = l2_normalize(sums)
+
+        # Listas vazias recebem pontos aleatórios
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            centroids[empty] = vectors[rng.choice(n, size=empty.size, replace=False)]
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+
+    def __init__(self, nprobe: int = ANN_NPROBE):
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.user_ids: Optional[np.ndarray] = None
+        self.face_ids: Optional[np.ndarray] = None
+
+        # Cadastros após o build (busca exata)
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_user_ids: List[int] = []
+        self._pending_face_ids: List[int] = []
+        self._pending_ids = set()
+        self._lock = threading.Lock()
+
+        # maior face_id lido do banco (snapshot ou catch_up)
+        self.max_face_id = 0
+        self._catchup_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        built = 0 if self.vectors is None else self.vectors.shape[0]
+        return built + len(self._pending_user_ids)
+
+    # ------------------------------------------------------------
+    # CONSTRUÇÃO
+    # ------------------------------------------------------------
+    def build(self, vectors: np.ndarray, user_ids, face_ids,
+              nlist: int = ANN_NLIST, n_iter: int = 20, seed: int = 0) -> "IVFIndex":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        if nlist <= 0:
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        # Treina os centróides numa amostra (custo independente de N)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * ANN_TRAIN_SAMPLE)
+        sample = vectors[rng.choice(n, size=sample_size, replace=False)]
+        centroids = spherical_kmeans(sample, nlist, n_iter=n_iter, seed=seed)
+
+        # Ordena todos os vetores por lista → cada lista é um bloco contíguo
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+
+        self.centroids = centroids
+        self.vectors = vectors[order]
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)[order]
+        self.face_ids = np.asarray(face_ids, dtype=np.int64)[order]
+        self.max_face_id = int(self.face_ids.max()) if n else 0
+        self._reset_pending()
+        return self
+
+    def _reset_pending(self):
+        with self._lock:
+            self._pending_vectors, self._pending_user_ids, self._pending_face_ids = [], [], []
+            self._pending_ids = set()
+
+    def build_from_db(self, db, nlist: int = ANN_NLIST) -> "IVFIndex":
+        from app.repository.repository_face import iter_all_embeddings
+
+        user_ids, face_ids, blobs = [], [], []
+        for row in iter_all_embeddings(db):
+            user_ids.append(row.user_id)
+            face_ids.append(row.face_id)
+            blobs.append(row.embedding)
+        vectors = decode_embeddings(blobs)
+        if vectors is None:
+            raise ValueError("Nenhuma face cadastrada para indexar.")
+        return self.build(vectors, user_ids, face_ids, nlist=nlist)
+
+    def add(self, user_ids, face_ids, embeddings: np.ndarray):
+        """Cadastros novos: ficam na lista pendente até o próximo build."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        with self._lock:
+            for user_id, face_id, emb in zip(user_ids, face_ids, embeddings):
+                if int(face_id) in self._pending_ids:
+                    continue
+                self._pending_ids.add(int(face_id))
+                self._pending_vectors.append(emb)
+                self._pending_user_ids.append(int(user_id))
+                self._pending_face_ids.append(int(face_id))
+
+    def catch_up(self, db) -> int:
+        """
+        Traz para a lista pendente as faces com face_id acima do maior já
+        lido do banco: cadastros de outros workers e os feitos entre o build
+        e a subida. Consulta pela chave primária — quase sempre vazia.
+        """
+        from app.repository.repository_face import get_embeddings_after
+
+        with self._catchup_lock:
+            rows = get_embeddings_after(db, self.max_face_id)
+            if not rows:
+                return 0
+            embs = decode_embeddings(r.embedding for r in rows)
+            self.add([r.user_id for r in rows], [r.face_id for r in rows], embs)
+            self.max_face_id = max(self.max_face_id, max(r.face_id for r in rows))
+            return len(rows)
+
+    # ------------------------------------------------------------
+    # PERSISTÊNCIA
+    # ------------------------------------------------------------
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ("centroids", "vectors", "offsets", "user_ids", "face_ids"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "type": "ivf",
+                "dim": int(self.centroids.shape[1]),
+                "nlist": int(self.centroids.shape[0]),
+                "size": int(self.vectors.shape[0]),
+                "max_face_id": int(self.max_face_id),
+            }, f)
+
+    def load(self, path: str, mmap: bool = True) -> "IVFIndex":
+        """Abre o índice salvo; com mmap=True nada é copiado para a RAM."""
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+            for name in ("centroids", "vectors", "offsets", "user_ids", "face_ids")
+        }
+        # centróides e offsets são pequenos e acessados em toda busca
+        arrays["centroids"] = np.array(arrays["centroids"])
+        arrays["offsets"] = np.array(arrays["offsets"])
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        face_ids = arrays["face_ids"]
+        with self._lock:
+            for name, arr in arrays.items():
+                setattr(self, name, arr)
+        # índices salvos antes do campo: maior face_id pelos próprios ids
+        self.max_face_id = int(meta.get("max_face_id", face_ids.max() if face_ids.size else 0))
+        self._reset_pending()
+        return self
+
+    # ------------------------------------------------------------
+    # BUSCA
+    # ------------------------------------------------------------
+    def search(self, probe: np.ndarray, k: int = 5,
+               nprobe: Optional[int] = None) -> List[dict]:
+        q = l2_normalize(probe).reshape(-1)
+        nprobe = max(1, min(nprobe or self.nprobe, self.centroids.shape[0]))
+
+        # Listas mais próximas do probe
+        coarse = self.centroids @ q
+        lists = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        rows = np.concatenate([
+            np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists
+        ])
+
+        sims = np.asarray(self.vectors[rows]) @ q
+        user_ids = np.asarray(self.user_ids[rows])
+        face_ids = np.asarray(self.face_ids[rows])
+
+        with self._lock:
+            if self._pending_vectors:
+                sims = np.concatenate([sims, np.vstack(self._pending_vectors) @ q])
+                user_ids = np.concatenate([user_ids, self._pending_user_ids])
+                face_ids = np.concatenate([face_ids, self._pending_face_ids])
+
+        if sims.size == 0:
+            return []
+        k = min(k, sims.size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [
+            {
+                "user_id": int(user_ids[i]),
+                "face_id": int(face_ids[i]),
+                "score": float(sims[i]),
+            }
+            for i in top
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "faces": len(self),
+            "nlist": 0 if self.centroids is None else int(self.centroids.shape[0]),
+            "nprobe": self.nprobe,
+            "pending": len(self._pending_user_ids),
+            "max_face_id": self.max_face_id,
+            "memory_mapped": isinstance(self.vectors, np.memmap),
+        }
+
+
+# Instância global: carregada de ANN_INDEX_PATH na subida (se existir)
+ann_index = IVFIndex()
+
+
+def load_ann_index(path: str = ANN_INDEX_PATH, db=None) -> bool:
+    """Abre o índice persistido (memmap) na instância global e, com db, já alcança a cauda."""
+    if not path or not os.path.exists(os.path.join(path, "meta.json")):
+        return False
+    ann_index.load(path, mmap=True)
+    if db is not None:
+        ann_index.catch_up(db)
+    return True
+
+
+@on_enrollment
+def _add_on_enrollment(user_id: int, faces):
+    """Novas faces entram na lista pendente (busca exata) do índice."""
+    if not ann_index.loaded or not faces:
+        return
+    embs = decode_embeddings(blob for _, blob, _ in faces)
+    if embs is None:
+        return
+    ann_index.add([user_id] * len(embs), [face_id for face_id, _, _ in faces], embs)
+
+
+if __name__ == "__main__":
+    # Uso (na pasta backend/): python -m app.services.ann_index --out app/ann_index
+    import argparse
+    from app.data.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Constrói o índice IVF a partir da tabela faces.")
+    parser.add_argument("--out", default=ANN_INDEX_PATH or "ann_index")
+    parser.add_argument("--nlist", type=int, default=ANN_NLIST)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        index = IVFIndex().build_from_db(db, nlist=args.nlist)
+    finally:
+        db.close()
+    index.save(args.out)
+    print(f"Índice salvo em {args.out}: {len(index)} faces, {index.centroids.shape[0]} listas")
@@ -0,0 +1,267 @@
+# app/services/bulk_enrollment.py
+# ============================================================
+# CADASTRO EM MASSA (DIRETÓRIO OU ZIP + MANIFESTO)
+# ------------------------------------------------------------
+# Uso (na pasta backend/):
+#     python -m app.services.bulk_enrollment fotos.zip manifest.csv \
+#         --workers 4 --chunk 32 --checkpoint bulk.json
+#
+# manifest.csv: colunas `file,user_id` (caminho relativo ao
+# diretório / membro do zip). Os usuários precisam existir.
+#
+#   - imagens lidas em streaming (nunca o acervo inteiro na RAM)
+#   - decode + embedding num pool de processos, com o MESMO código
+#     do upload (extract_upload_embeddings)
+#   - gravação com COPY no Postgres (executemany em outros bancos)
+#   - checkpoint após cada lote gravado → retomável com o mesmo comando;
+#     (user_id, content_hash) já gravados são pulados, então um lote
+#     gravado antes de uma queda (sem checkpoint) não duplica na retomada
+#
+# Caches e índices dos workers da API não são avisados: reinicie a
+# API (ou reconstrua o índice ANN) ao final de uma carga grande.
+# ============================================================
+import argparse
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import insert, select
+
+from app.data.database import engine
+from app.model.face import Face
+from app.utils.content_hash import content_hash
+
+
+# ------------------------------------------------------------
+# LEITURA DO ACERVO
+# ------------------------------------------------------------
+def read_manifest(path: str) -> List[Tuple[str, int]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["file"], int(row["user_id"])) for row in csv.DictReader(f)]
+
+
+def iter_images(source: str, entries: List[Tuple[str, int]]) -> Iterator[Tuple[str, int, bytes]]:
+    """Produz (arquivo, user_id, bytes) na ordem do manifesto."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for name, user_id in entries:
+                try:
+                    yield name, user_id, zf.read(name)
+                except KeyError:
+                    yield name, user_id, b""
+    else:
+        for name, user_id in entries:
+            try:
+                with open(os.path.join(source, name), "rb") as f:
+                    yield name, user_id, f.read()
+            except OSError:
+                yield name, user_id, b""
+
+
+def iter_chunks(items: Iterator, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ------------------------------------------------------------
+# WORKERS (1 conjunto de sessões ONNX por processo)
+# ------------------------------------------------------------
+def _init_worker():
+    import cv2
+    from app.services.model_registry import model_registry
+    cv2.setNumThreads(1)
+    # 1 chamador por processo: lote entre requisições não tem com quem juntar
+    model_registry.batcher.enabled = False
+
+
+def _embed_chunk(chunk):
+    from app.services.face_capture_service import extract_upload_embeddings
+
+    filenames = [name for name, _, _ in chunk]
+    contents = [data for _, _, data in chunk]
+    results, embeddings = extract_upload_embeddings(contents, filenames)
+    return [
+        (name, user_id, content_hash(data), extracted, result)
+        for (name, user_id, data), extracted, result in zip(chunk, embeddings, results)
+    ]
+
+
+# ------------------------------------------------------------
+# GRAVAÇÃO
+# ------------------------------------------------------------
+def _copy_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def drop_existing(rows: List[dict]) -> List[dict]:
+    """Remove linhas cujo (user_id, content_hash) já está no banco ou repete no lote."""
+    if not rows:
+        return rows
+    faces = Face.__table__
+    with engine.connect() as conn:
+        existing = {tuple(row) for row in conn.execute(
+            select(faces.c.user_id, faces.c.content_hash).where(
+                faces.c.user_id.in_({r["user_id"] for r in rows}),
+                faces.c.content_hash.in_({r["content_hash"] for r in rows}),
+            )
+        )}
+    kept = []
+    for r in rows:
+        key = (r["user_id"], r["content_hash"])
+        if key not in existing:
+            existing.add(key)
+            kept.append(r)
+    return kept
+
+
+def write_rows(rows: List[dict]):
+    """COPY no Postgres; executemany em lotes nos demais bancos."""
+    if not rows:
+        return
+
+    if engine.dialect.name == "postgresql":
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join((
+                str(r["user_id"]),
+                _copy_escape(r["filename"]),
+                r["source"],
+                "\\\\x" + r["embedding"].hex(),
+                repr(r["quality"]),
+                r["content_hash"],
+                r["phash"],
+                r["created_at"].isoformat(),
+            )) + "\n")
+        buf.seek(0)
+
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(
+                    "COPY faces (user_id, filename, source, embedding, quality, content_hash, phash, created_at) FROM STDIN",
+                    buf,
+                )
+            raw.commit()
+        finally:
+            raw.close()
+    else:
+        with engine.begin() as conn:
+            conn.execute(insert(Face.__table__), rows)
+
+
+# ------------------------------------------------------------
+# ORQUESTRAÇÃO
+# ------------------------------------------------------------
+def _load_checkpoint(path: str) -> int:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return int(json.load(f).get("done", 0))
+    return 0
+
+
+def _save_checkpoint(path: str, done: int, saved: int, failed: int):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"done": done, "saved": saved, "failed": failed}, f)
+    os.replace(tmp, path)
+
+
+def bulk_enroll(source: str, manifest: str, workers: int = os.cpu_count() or 1,
+                chunk_size: int = 32, checkpoint: str = "", errors_path: str = "") -> dict:
+    entries = read_manifest(manifest)
+    total = len(entries)
+    done = _load_checkpoint(checkpoint)
+    saved = failed = duplicates = 0
+    if done:
+        print(f"Retomando do item {done}/{total}")
+
+    chunks = iter_chunks(iter_images(source, entries[done:]), chunk_size)
+    max_in_flight = max(workers, 1) * 2
+    errors = open(errors_path, "a", encoding="utf-8") if errors_path else None
+    t0 = time.time()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending = deque()
+
+            def drain_one():
+                nonlocal done, saved, failed, duplicates
+                processed = pending.popleft().result()
+                now = datetime.utcnow()
+                rows = []
+                for name, user_id, digest, extracted, result in processed:
+                    if extracted is None:
+                        failed += 1
+                        if errors:
+                            errors.write(json.dumps({"user_id": user_id, **result}) + "\n")
+                        continue
+                    embedding, quality, phash = extracted
+                    rows.append({
+                        "user_id": user_id,
+                        "filename": os.path.basename(name)[:255],
+                        "source": "BULK",
+                        "embedding": embedding,
+                        "quality": quality,
+                        "content_hash": digest,
+                        "phash": phash,
+                        "created_at": now,
+                    })
+                kept = drop_existing(rows)
+                duplicates += len(rows) - len(kept)
+                rows = kept
+                write_rows(rows)
+
+                # checkpoint só depois do lote gravado (ordem do manifesto)
+                saved += len(rows)
+                done += len(processed)
+                _save_checkpoint(checkpoint, done, saved, failed)
+
+                rate = (saved + failed) / max(time.time() - t0, 1e-6)
+                eta = (total - done) / rate if rate else 0
+                print(f"{done}/{total} ({done / total:.1%}) | salvas={saved} falhas={failed} "
+                      f"duplicadas={duplicates} "
+                      f"| {rate:.1f} img/s | ETA {eta / 60:.1f} min", flush=True)
+
+            for chunk in chunks:
+                pending.append(pool.submit(_embed_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    drain_one()
+            while pending:
+                drain_one()
+    finally:
+        if errors:
+            errors.close()
+
+    return {"total": total, "done": done, "saved": saved, "failed": failed,
+            "duplicates": duplicates, "seconds": time.time() - t0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cadastro facial em massa a partir de diretório ou zip.")
+    parser.add_argument("source", help="diretório ou arquivo .zip com as imagens")
+    parser.add_argument("manifest", help="CSV com colunas file,user_id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=32, help="imagens por tarefa do pool")
+    parser.add_argument("--checkpoint", default="bulk_enrollment.json", help="arquivo de progresso (retomada)")
+    parser.add_argument("--errors", default="bulk_enrollment_errors.jsonl", help="log das imagens com falha")
+    args = parser.parse_args()
+
+    summary = bulk_enroll(args.source, args.manifest, workers=args.workers,
+                          chunk_size=args.chunk, checkpoint=args.checkpoint,
+                          errors_path=args.errors)
+    print(json.dumps(summary, indent=2))
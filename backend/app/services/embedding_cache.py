@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.enrollment_events import on_enrollment
+from app.services.metrics import registry
+
+
+# ============================================================
+# CACHE DE EMBEDDINGS POR USUÁRIO
+# ------------------------------------------------------------
+# user_id → matriz Nx512 float32 normalizada
+#   - limite total em bytes (EMBEDDING_CACHE_MAX_BYTES)
+#   - despejo LRU quando o limite estoura
+#   - TTL (EMBEDDING_CACHE_TTL em segundos, 0 = sem TTL)
+#   - invalidado a cada novo cadastro do usuário
+#   - versão por usuário: put() de uma leitura iniciada antes de
+#     um invalidate() é descartado (não reinsere dado velho)
+#   - contadores de hit / miss / eviction
+#
+# A invalidação vale só para o processo. Com vários workers, os
+# outros enxergam o cadastro pela galeria compartilhada
+# (GALLERY_STORE_PATH, sync_embedding_cache) ou, sem ela, quando
+# a entrada expira pelo TTL — por isso o padrão não é 0.
+# ============================================================
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "60"))
+
+
+class EmbeddingCache:
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+                 ttl: float = EMBEDDING_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()   # user_id → (arr, expira_em)
+        self._bytes = 0
+        self._versions: Dict[int, int] = {}   # user_id → nº de invalidações
+        self._epoch = 0                       # +1 a cada clear()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def _drop(self, user_id: int):
+        arr, _ = self._data.pop(user_id)
+        self._bytes -= arr.nbytes
+
+    def get(self, user_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            arr, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._drop(user_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return arr
+
+    def version(self, user_id: int) -> Tuple[int, int]:
+        """Token a pegar ANTES de ler o banco e repassar ao put()."""
+        with self._lock:
+            return self._epoch, self._versions.get(user_id, 0)
+
+    def put(self, user_id: int, arr: np.ndarray, version: Optional[Tuple[int, int]] = None):
+        # Entrada maior que o cache inteiro: não armazena
+        if arr.nbytes > self.max_bytes:
+            return
+        arr.setflags(write=False)
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+
+        with self._lock:
+            # invalidado durante a leitura → dado possivelmente velho
+            if version is not None and version != (self._epoch, self._versions.get(user_id, 0)):
+                self.stale_puts += 1
+                return
+            if user_id in self._data:
+                self._drop(user_id)
+            self._data[user_id] = (arr, expires_at)
+            self._bytes += arr.nbytes
+
+            # Despejo LRU até caber no limite
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            # mesmo sem entrada: pode haver leitura em andamento
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if user_id in self._data:
+                self._drop(user_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self._epoch += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
+
+
+# Instância global (1 por worker)
+embedding_cache = EmbeddingCache()
+
+registry.callback("face_embedding_cache_hits_total", "Consultas atendidas pelo cache de embeddings.",
+                  lambda: embedding_cache.hits, kind="counter")
+registry.callback("face_embedding_cache_misses_total", "Consultas que foram ao banco.",
+                  lambda: embedding_cache.misses, kind="counter")
+registry.callback("face_embedding_cache_bytes", "Bytes ocupados pelo cache de embeddings.",
+                  lambda: embedding_cache._bytes)
+
+
+@on_enrollment
+def _invalidate_on_enrollment(user_id: int, faces):
+    """Novo cadastro → galeria do usuário em cache fica obsoleta."""
+    embedding_cache.invalidate(user_id)
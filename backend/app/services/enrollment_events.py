@@ -0,0 +1,33 @@
+from typing import Callable, List
+
+from app.utils.request_context import logger
+
+
+# ============================================================
+# EVENTOS DE CADASTRO (ENROLLMENT)
+# ------------------------------------------------------------
+# Quem mantém estado derivado da tabela faces (caches, índices)
+# registra um listener aqui; o serviço de cadastro dispara
+# notify_enrollment(user_id, faces) logo após o commit, onde
+# faces = [(face_id, embedding_bytes, quality), ...] das faces
+# gravadas (quality None em faces sem nota de qualidade).
+# ============================================================
+
+_listeners: List[Callable] = []
+
+
+def on_enrollment(fn: Callable) -> Callable:
+    """Registra fn(user_id, faces) para ser chamado após cada cadastro."""
+    _listeners.append(fn)
+    return fn
+
+
+def notify_enrollment(user_id: int, faces=None):
+    """Dispara todos os listeners; falha em um listener não afeta os demais."""
+    for fn in list(_listeners):
+        try:
+            fn(user_id, faces or [])
+        except Exception:
+            logger.exception("enrollment_listener_failed", extra={"fields": {
+                "listener": fn.__name__, "user_id": user_id,
+            }})
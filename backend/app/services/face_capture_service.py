@@ -1,132 +1,253 @@
-import cv2
+import os
 import numpy as np
 from app.model.face import Face
-from insightface.app import FaceAnalysis
+from app.repository.repository_face import get_upload_hashes_async
+from app.utils.content_hash import content_hash, hamming_distance, perceptual_hash
+from app.utils.embedding_codec import encode_embedding
+from app.utils.image_decode import DECODE_LONG_SIDE_ENROLLMENT, decode_image, scale_face
+from app.services.model_registry import model_registry
+from app.services.inference_executor import inference_executor
+from app.services.enrollment_events import notify_enrollment
+from app.services.metrics import stage_timer
 
 
 # ============================================================
-#  DETECÇÃO AUTOMÁTICA DE GPU
+#  MODELO DE CADASTRO
 # ------------------------------------------------------------
-#  insightface utiliza ctx_id para decidir se roda na GPU (CUDA)
-#    ctx_id = -1 → CPU
-#    ctx_id = 0  → GPU device 0
-#  Aqui testamos automaticamente se existe GPU CUDA disponível.
+#  Usa as sessões compartilhadas do model_registry (carregadas
+#  no primeiro uso) com o det_size de cadastro (640 por padrão).
 # ============================================================
 
-def detect_gpu():
-    try:
-        # Tentativa simples para verificar presença das GPUs CUDA
-        import torch
-        if torch.cuda.is_available():
-            return 0  # GPU ID 0
-    except Exception:
-        pass
-    return -1         # fallback → CPU
+face_app = model_registry.analyzer("enrollment")
 
-
-CTX_ID = detect_gpu()  
-face_app = FaceAnalysis(name="buffalo_l")
-face_app.prepare(ctx_id=CTX_ID)   # inicializa CPU ou GPU de acordo com CTX_ID
+# Deduplicação de reenvios (por usuário):
+#   - hash de conteúdo (BLAKE2b dos bytes) → sem decode nem inferência
+#   - hash perceptual (dHash) a até ENROLL_PHASH_MAX_DISTANCE bits →
+#     pega cópias re-encodadas de fotos já cadastradas; só decode, sem
+#     inferência. Desligado por padrão (-1): o dHash é da imagem inteira,
+#     e fotos diferentes do mesmo enquadramento (mesmo fundo, mesma pose)
+#     também ficam a poucos bits
+ENROLL_DEDUP = os.getenv("ENROLL_DEDUP", "1") == "1"
+ENROLL_PHASH_MAX_DISTANCE = int(os.getenv("ENROLL_PHASH_MAX_DISTANCE", "-1"))
 
 
 # ============================================================
-#  SAVE MULTIPLE FACES WITH AUTO-GPU
+#  EMBEDDING DA MAIOR FACE DE UMA IMAGEM
 # ------------------------------------------------------------
-#  Este método:
-#   - Lê múltiplos arquivos enviados
-#   - Converte para matriz OpenCV
-#   - Detecta faces com InsightFace
-#   - Extrai o embedding da maior face
-#   - Salva no banco com SQLAlchemy
-#   - Retorna lista com resultados individuais
+#  Pipeline único de cadastro/consulta: detecção InsightFace,
+#  escolha da maior face e embedding de 512 floats.
 # ============================================================
 
-async def save_multiple_faces_from_upload(db, user_id: int, files):
-    results = []             # Feedback por arquivo
-    objects_to_save = []     # Objetos ORM a serem salvos no final em batch
-
+def largest_face(img):
     # ------------------------------------------------------------
-    # LER TODOS OS ARQUIVOS EM MEMÓRIA (assíncrono, eficiente)
+    # DETECÇÃO DE FACES COM INSIGHTFACE
+    # face_app.get(img) → retorna várias faces, com bbox + embedding
     # ------------------------------------------------------------
-    contents = [await f.read() for f in files]
+    faces = face_app.get(img)
+    if not faces:
+        return None
 
     # ------------------------------------------------------------
-    # DECODIFICAR IMAGENS USANDO OPENCV
-    # cv2.imdecode → transforma bytes em matriz BGR
+    # ESCOLHE A MAIOR FACE
+    # bbox formato: [x1, y1, x2, y2]
+    # maior largura = x2 - x1
     # ------------------------------------------------------------
-    imgs = [
-        cv2.imdecode(np.frombuffer(c, np.uint8), cv2.IMREAD_COLOR)
-        for c in contents
-    ]
+    return max(faces, key=lambda f: f.bbox[2] - f.bbox[0])
+
 
+def embed_largest_face(img):
     # ------------------------------------------------------------
-    # LOOP PARA TRATAR CADA ARQUIVO E SUA IMAGEM
+    # EXTRAÇÃO DO EMBEDDING
+    # embedding é um vetor de 512 floats gerado pela rede neural
     # ------------------------------------------------------------
-    for file, img in zip(files, imgs):
+    face = largest_face(img)
+    if face is None:
+        return None
+    return np.asarray(face.embedding, dtype=np.float32)
+
+
+def face_quality(face) -> float:
+    """Qualidade 0..1: score do detector, penalizando faces < 112px."""
+    width = float(face.bbox[2] - face.bbox[0])
+    return float(face.det_score) * min(1.0, width / 112.0)
+
+
+# ============================================================
+#  EXTRAÇÃO DE EMBEDDINGS (SÍNCRONA — RODA NO INFERENCE EXECUTOR)
+# ------------------------------------------------------------
+#  Este método:
+#   - Converte os bytes para matriz OpenCV
+#   - Detecta faces com InsightFace
+#   - Extrai o embedding da maior face
+#   - Retorna, por arquivo, o resultado e o embedding (ou None)
+#
+#  known_phashes: [(face_id, phash)] já cadastrados; imagem a até
+#  max_distance bits de um deles sai como "duplicate" antes da detecção.
+#  Só compara com o que já está no banco: fotos parecidas do mesmo
+#  envio (ex.: rajada de captura) são todas cadastradas.
+# ============================================================
+
+def _near_duplicate(phash, known_phashes, max_distance):
+    for face_id, known in known_phashes:
+        if hamming_distance(phash, known) <= max_distance:
+            return face_id, known
+    return None
+
+
+def extract_upload_embeddings(contents, filenames, known_phashes=None,
+                              max_distance=ENROLL_PHASH_MAX_DISTANCE):
+    results = []             # Feedback por arquivo
+    embeddings = []          # (embedding, qualidade, phash) por arquivo (None em caso de erro)
+
+    for filename, content in zip(filenames, contents):
         try:
+            # ------------------------------------------------------------
+            # DECODIFICAR IMAGEM USANDO OPENCV
+            # decode reduzido (DCT) para fotos muito maiores que o
+            # necessário; scale = original / decodificado
+            # ------------------------------------------------------------
+            with stage_timer("decode"):
+                img, scale = decode_image(content, DECODE_LONG_SIDE_ENROLLMENT)
+
             if img is None:
                 results.append({
-                    "file": file.filename,
+                    "file": filename,
                     "status": "error",
                     "message": "unable to decode image"
                 })
+                embeddings.append(None)
                 continue
 
-            # ------------------------------------------------------------
-            # DETECÇÃO DE FACES COM INSIGHTFACE
-            # face_app.get(img) → retorna várias faces, com bbox + embedding
-            # ------------------------------------------------------------
-            faces = face_app.get(img)
-
-            if not faces:
+            phash = perceptual_hash(img)
+            if known_phashes is not None and max_distance >= 0:
+                near = _near_duplicate(phash, known_phashes, max_distance)
+                if near is not None:
+                    results.append({
+                        "file": filename,
+                        "status": "duplicate",
+                        "match": "perceptual",
+                        "face_id": near[0],
+                    })
+                    embeddings.append(None)
+                    continue
+
+            face = largest_face(img)
+
+            if face is None:
                 results.append({
-                    "file": file.filename,
+                    "file": filename,
                     "status": "error",
                     "message": "no face detected"
                 })
+                embeddings.append(None)
                 continue
 
             # ------------------------------------------------------------
-            # ESCOLHE A MAIOR FACE
-            # bbox formato: [x1, y1, x2, y2]
-            # maior largura = x2 - x1
+            # embedding gravado como bytes float32 já normalizados,
+            # junto da qualidade (peso no template do usuário), medida
+            # com a bbox remapeada para a foto original
             # ------------------------------------------------------------
-            main_face = max(faces, key=lambda f: f.bbox[2] - f.bbox[0])
-
-            # ------------------------------------------------------------
-            # EXTRAÇÃO DO EMBEDDING
-            # embedding é um vetor de 512 floats gerado pela rede neural
-            # ------------------------------------------------------------
-            embedding = main_face.embedding.tolist()
-
-            # ------------------------------------------------------------
-            # CRIA OBJETO ORM (SQLAlchemy)
-            # ------------------------------------------------------------
-            new_face = Face(
-                user_id=user_id,
-                filename=file.filename,
-                source="UPLOAD",
-                embedding=embedding
-            )
-
-            # Adicionado para commit em batch (melhor performance)
-            objects_to_save.append(new_face)
-
-            results.append({"file": file.filename, "status": "ok"})
+            embedding = encode_embedding(face.embedding)
+            embeddings.append((embedding, face_quality(scale_face(face, scale)), phash))
+            results.append({"file": filename, "status": "ok"})
 
         except Exception as e:
             # Qualquer erro inesperado é retornado ao cliente
             results.append({
-                "file": file.filename,
+                "file": filename,
                 "status": "error",
                 "message": str(e)
             })
+            embeddings.append(None)
+
+    return results, embeddings
+
+
+# ============================================================
+#  SAVE MULTIPLE FACES WITH AUTO-GPU
+# ------------------------------------------------------------
+#  Este método:
+#   - Lê múltiplos arquivos enviados
+#   - Descarta reenvios já cadastrados (status "duplicate")
+#   - Extrai embeddings no inference_executor (fora do event loop)
+#   - Salva no banco com SQLAlchemy (AsyncSession: commit sem
+#     bloquear o event loop)
+#   - Retorna lista com resultados individuais
+#
+#  Fila de inferência cheia → InferenceQueueFull (503 na rota).
+# ============================================================
+
+async def save_multiple_faces_from_upload(db, user_id: int, files):
+    objects_to_save = []     # Objetos ORM a serem salvos no final em batch
+
+    # ------------------------------------------------------------
+    # LER TODOS OS ARQUIVOS EM MEMÓRIA (assíncrono, eficiente)
+    # ------------------------------------------------------------
+    with stage_timer("multipart_read"):
+        contents = [await f.read() for f in files]
+    filenames = [f.filename for f in files]
+    hashes = [content_hash(c) for c in contents]
+
+    # ------------------------------------------------------------
+    # DEDUPLICAÇÃO POR HASH DE CONTEÚDO (antes de qualquer inferência)
+    # ------------------------------------------------------------
+    results = [None] * len(files)
+    known_phashes = None
+    if ENROLL_DEDUP:
+        with stage_timer("db_fetch"):
+            rows = await get_upload_hashes_async(db, user_id)
+        known = {r.content_hash: r.face_id for r in rows if r.content_hash}
+        known_phashes = [(r.face_id, r.phash) for r in rows if r.phash]
+        for i, h in enumerate(hashes):
+            if h in known:
+                results[i] = {"file": filenames[i], "status": "duplicate",
+                              "match": "content", "face_id": known[h]}
+            else:
+                known.setdefault(h, None)   # repetido no mesmo envio
+    pending = [i for i, r in enumerate(results) if r is None]
+
+    # ------------------------------------------------------------
+    # DECODE + DETECÇÃO + EMBEDDING NO POOL DE INFERÊNCIA
+    # ------------------------------------------------------------
+    embeddings = [None] * len(files)
+    if pending:
+        extracted_results, extracted = await inference_executor.run(
+            extract_upload_embeddings,
+            [contents[i] for i in pending],
+            [filenames[i] for i in pending],
+            known_phashes
+        )
+        for i, result, item in zip(pending, extracted_results, extracted):
+            results[i], embeddings[i] = result, item
+
+    # ------------------------------------------------------------
+    # CRIA OBJETOS ORM (SQLAlchemy)
+    # ------------------------------------------------------------
+    for filename, h, extracted in zip(filenames, hashes, embeddings):
+        if extracted is None:
+            continue
+        embedding, quality, phash = extracted
+        objects_to_save.append(Face(
+            user_id=user_id,
+            filename=filename,
+            source="UPLOAD",
+            embedding=embedding,
+            quality=quality,
+            content_hash=h,
+            phash=phash
+        ))
 
     # ------------------------------------------------------------
     # SALVA TODOS DE UMA VEZ — ganho de performance massivo
     # ------------------------------------------------------------
     if objects_to_save:
-        db.add_all(objects_to_save)
-        db.commit()
+        with stage_timer("enrollment_commit"):
+            db.add_all(objects_to_save)
+            await db.flush()   # gera os face_id antes do commit
+            saved = [(f.face_id, f.embedding, f.quality) for f in objects_to_save]
+            await db.commit()
+
+        # Caches / índices derivados da tabela faces
+        notify_enrollment(user_id, saved)
 
     return results
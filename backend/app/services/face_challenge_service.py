@@ -0,0 +1,307 @@
+import os
+import random
+from datetime import datetime
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.model.face_liveness_state import FaceLivenessState
+from app.repository.repository_liveness_state import create_liveness_state
+from app.services.face_liveness_service import (
+    BATCH_MATCH_RATIO,
+    FACE_MATCH_THRESHOLD,
+    FaceLivenessService,
+    LivenessAccumulator,
+    decode_frame,
+    face_app,
+    get_user_embeddings,
+)
+from app.services.face_tracker import FaceTracker
+
+
+# ============================================================
+# DESAFIO ATIVO DE POSE DA CABEÇA (LEFT / RIGHT / UP / DOWN)
+# ------------------------------------------------------------
+# A pose é estimada pelos 5 keypoints que o detector já devolve
+# (olho esq., olho dir., nariz, boca esq., boca dir.), sem modelo
+# extra de landmarks:
+#   yaw   = deslocamento horizontal do nariz em relação ao meio
+#           dos olhos / distância entre os olhos
+#   pitch = posição vertical do nariz entre a linha dos olhos e a
+#           da boca (≈0.5 de frente) − POSE_PITCH_NEUTRAL
+#   roll  = inclinação da linha dos olhos (graus)
+#
+# A mesma detecção de cada frame alimenta a pose E o embedding
+# de identidade. Um movimento só conta em frames com o rosto do
+# usuário (similaridade >= FACE_MATCH_THRESHOLD), e "live" sai dos
+# contadores de identidade gravados no estado — o desafio inteiro,
+# não só o último lote, precisa ser feito pela mesma pessoa.
+#
+# O progresso (streak do movimento, volta ao CENTER, contadores)
+# fica no FaceLivenessState: vale entre requisições, e é gravado
+# uma vez por requisição, nunca por frame. O desafio expira após
+# CHALLENGE_TTL_SECONDS ou CHALLENGE_MAX_ATTEMPTS envios.
+# ============================================================
+
+CHALLENGE_MOVES = ["LEFT", "RIGHT", "UP", "DOWN"]
+CHALLENGE_LENGTH = int(os.getenv("CHALLENGE_LENGTH", "2"))
+POSE_YAW_THRESHOLD = float(os.getenv("POSE_YAW_THRESHOLD", "0.25"))
+POSE_PITCH_THRESHOLD = float(os.getenv("POSE_PITCH_THRESHOLD", "0.12"))
+POSE_PITCH_NEUTRAL = float(os.getenv("POSE_PITCH_NEUTRAL", "0.5"))
+POSE_HOLD_FRAMES = int(os.getenv("POSE_HOLD_FRAMES", "2"))   # frames seguidos no movimento para contar
+# O frontend espelha a câmera (selfie): virar para a esquerda leva o nariz para a esquerda da imagem
+POSE_MIRRORED = os.getenv("POSE_MIRRORED", "1") == "1"
+CHALLENGE_TTL_SECONDS = float(os.getenv("CHALLENGE_TTL_SECONDS", "120"))
+CHALLENGE_MAX_ATTEMPTS = int(os.getenv("CHALLENGE_MAX_ATTEMPTS", "30"))
+
+
+def estimate_pose(kps: np.ndarray) -> dict:
+    """yaw/pitch normalizados e roll em graus a partir dos 5 keypoints."""
+    left_eye, right_eye, nose, left_mouth, right_mouth = np.asarray(kps, dtype=np.float32)
+    eye_mid = (left_eye + right_eye) / 2
+    mouth_mid = (left_mouth + right_mouth) / 2
+    eye_dist = float(np.linalg.norm(right_eye - left_eye)) + 1e-6
+
+    yaw = float(nose[0] - eye_mid[0]) / eye_dist
+    face_height = float(mouth_mid[1] - eye_mid[1]) + 1e-6
+    pitch = float(nose[1] - eye_mid[1]) / face_height - POSE_PITCH_NEUTRAL
+    roll = float(np.degrees(np.arctan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0])))
+    return {"yaw": yaw, "pitch": pitch, "roll": roll}
+
+
+def classify_move(pose: dict, mirrored: bool = POSE_MIRRORED) -> Optional[str]:
+    """LEFT/RIGHT/UP/DOWN/CENTER, ou None em posições intermediárias."""
+    yaw = pose["yaw"] if mirrored else -pose["yaw"]
+    pitch = pose["pitch"]
+
+    if abs(yaw) >= POSE_YAW_THRESHOLD and abs(yaw) >= abs(pitch):
+        return "LEFT" if yaw < 0 else "RIGHT"
+    if abs(pitch) >= POSE_PITCH_THRESHOLD:
+        return "UP" if pitch < 0 else "DOWN"
+    if abs(yaw) < POSE_YAW_THRESHOLD / 2 and abs(pitch) < POSE_PITCH_THRESHOLD / 2:
+        return "CENTER"
+    return None
+
+
+def random_sequence(length: int = CHALLENGE_LENGTH) -> List[str]:
+    """Sequência aleatória de movimentos, sem repetir o anterior."""
+    rng = random.SystemRandom()
+    seq: List[str] = []
+    while len(seq) < length:
+        move = rng.choice(CHALLENGE_MOVES)
+        if not seq or seq[-1] != move:
+            seq.append(move)
+    return seq
+
+
+def start_challenge(db: Session, user_id: int, face_id: int,
+                    length: int = CHALLENGE_LENGTH) -> FaceLivenessState:
+    state = create_liveness_state(db, user_id, face_id, random_sequence(length))
+    db.commit()
+    return state
+
+
+async def start_challenge_async(db: AsyncSession, user_id: int, face_id: int,
+                                length: int = CHALLENGE_LENGTH) -> FaceLivenessState:
+    state = create_liveness_state(db, user_id, face_id, random_sequence(length))
+    await db.commit()
+    return state
+
+
+def challenge_expired(state: FaceLivenessState, now: Optional[datetime] = None,
+                      ttl: float = CHALLENGE_TTL_SECONDS,
+                      max_attempts: int = CHALLENGE_MAX_ATTEMPTS) -> Optional[str]:
+    """Motivo ("expired" / "too_many_attempts") se o desafio não aceita mais frames."""
+    now = now or datetime.utcnow()
+    if ttl > 0 and state.created_at is not None and (now - state.created_at).total_seconds() > ttl:
+        return "expired"
+    if max_attempts > 0 and (state.attempts or 0) >= max_attempts:
+        return "too_many_attempts"
+    return None
+
+
+class HeadPoseChallenge:
+    """
+    Máquina de estados do desafio, alimentada frame a frame.
+
+    - só frames com o rosto do usuário contam para o movimento
+    - movimento esperado mantido por POSE_HOLD_FRAMES → avança o estado
+    - após cada movimento é preciso voltar ao CENTER antes do próximo
+    - streak e volta ao CENTER são lidos do estado e gravados de volta,
+      então valem entre requisições
+    - `transitions` conta os movimentos concluídos
+    """
+
+    def __init__(self, state: FaceLivenessState, user_embs: np.ndarray,
+                 hold_frames: int = POSE_HOLD_FRAMES, analyzer=None):
+        self.state = state
+        self.hold_frames = max(1, hold_frames)
+        self.analyzer = analyzer or face_app
+        self.acc = LivenessAccumulator(user_embs, frame_skip=1)
+        self.tracker = FaceTracker(self.analyzer)
+        self.transitions = 0
+
+    def _advance(self, move: Optional[str], matched: bool):
+        state = self.state
+        if state.finished:
+            return
+
+        if not matched:
+            # rosto de outra pessoa (ou duvidoso): não conta e quebra a sequência
+            state.hold_streak = 0
+            return
+
+        if state.need_center:
+            if move == "CENTER":
+                state.need_center = False
+            return
+
+        streak = (state.hold_streak or 0) + 1 if move == state.next_expected_move else 0
+        state.hold_streak = streak
+        if streak < self.hold_frames:
+            return
+
+        # Transição: novas listas para o SQLAlchemy detectar a mudança no ARRAY
+        history = list(state.movement_history or []) + [move]
+        required = list(state.required_sequence or [])
+        state.movement_history = history
+        if len(history) >= len(required):
+            state.finished = True
+            state.next_expected_move = None
+        else:
+            state.next_expected_move = required[len(history)]
+        self.transitions += 1
+        state.hold_streak = 0
+        state.need_center = True
+
+    def _record_identity(self, score: float) -> bool:
+        """Contadores de identidade do desafio inteiro (gravados no estado)."""
+        state = self.state
+        matched = score >= FACE_MATCH_THRESHOLD
+        state.face_frames = (state.face_frames or 0) + 1
+        state.matched_frames = (state.matched_frames or 0) + int(matched)
+        state.min_similarity = score if state.min_similarity is None else min(state.min_similarity, score)
+        return matched
+
+    def feed(self, img: np.ndarray) -> dict:
+        """Processa um frame: 1 detecção → pose + identidade."""
+        self.acc.next_frame()
+        faces = self.tracker.detect(img)
+        if not faces:
+            self.state.hold_streak = 0
+            return {"face": False}
+
+        face = faces[0]
+        pose = estimate_pose(face.kps)
+        move = classify_move(pose)
+        score = FaceLivenessService.match_similarity(self.acc.user_embs, self.analyzer.embed(img, face))
+        self.acc.add(score)
+        matched = self._record_identity(score)
+        self._advance(move, matched)
+        return {"face": True, "move": move, "similarity": score, "matched": matched, **pose}
+
+    def identity_ok(self) -> bool:
+        """Mesma pessoa ao longo do desafio (todas as requisições)."""
+        face_frames = self.state.face_frames or 0
+        if not face_frames:
+            return False
+        return (self.state.matched_frames or 0) / face_frames >= BATCH_MATCH_RATIO
+
+    def result(self) -> dict:
+        state = self.state
+        return {
+            "state_id": state.id,
+            "required_sequence": list(state.required_sequence or []),
+            "movement_history": list(state.movement_history or []),
+            "next_expected_move": state.next_expected_move,
+            "finished": bool(state.finished),
+            "live": bool(state.finished) and self.identity_ok(),
+            "identity": self.acc.result(),          # frames desta requisição
+            "challenge_identity": {                 # desafio inteiro
+                "face_frames": state.face_frames or 0,
+                "matched_frames": state.matched_frames or 0,
+                "min_similarity": state.min_similarity,
+            },
+        }
+
+
+def run_challenge_frames(state: FaceLivenessState, user_embs: np.ndarray,
+                         frames: List[bytes], analyzer=None) -> HeadPoseChallenge:
+    """
+    Avança o desafio com um lote de frames (só CPU, roda no inference
+    executor). Não toca na sessão: quem chamou grava o estado (uma vez
+    por requisição).
+    """
+    challenge = HeadPoseChallenge(state, user_embs, analyzer=analyzer)
+    for raw in frames:
+        if state.finished:
+            break
+        img = decode_frame(raw)
+        if img is not None:
+            challenge.feed(img)
+    return challenge
+
+
+# ============================================================
+# MODO VISUAL (JANELA OPENCV + WEBCAM LOCAL)
+# ------------------------------------------------------------
+# Usado pelo test_liveness.py: abre a câmera, mostra o movimento
+# esperado e pressione `q` para encerrar.
+# ============================================================
+
+ARROWS = {"LEFT": "<-", "RIGHT": "->", "UP": "^", "DOWN": "v"}
+
+
+def check_face_liveness_visual(db: Session, user_id: int, face_id: int,
+                               threshold: float = 0.8, movements_required: int = 2,
+                               frames_to_capture: int = 30, camera_index: int = 0) -> dict:
+    user_embs = get_user_embeddings(db, user_id)
+    if user_embs is None:
+        return {"match": False, "user_id": user_id, "face_id": face_id,
+                "message": "Nenhuma face cadastrada"}
+
+    state = start_challenge(db, user_id, face_id, length=movements_required)
+    challenge = HeadPoseChallenge(state, user_embs)
+    cap = cv2.VideoCapture(camera_index)
+    max_frames = frames_to_capture * max(movements_required, 1)
+
+    try:
+        for _ in range(max_frames):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frame = cv2.flip(frame, 1)   # visão espelhada, como no frontend
+            transitions = challenge.transitions
+            info = challenge.feed(frame)
+            if challenge.transitions != transitions:
+                db.commit()
+
+            label = state.next_expected_move or "OK"
+            cv2.putText(frame, f"{label} {ARROWS.get(label, '')}", (20, 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 2)
+            if info.get("face"):
+                cv2.putText(frame, f"sim={info['similarity']:.2f} move={info['move']}", (20, 80),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            cv2.imshow("Face Liveness", frame)
+
+            if state.finished or (cv2.waitKey(1) & 0xFF) == ord("q"):
+                break
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+
+    sims = challenge.acc.similarities
+    score = float(np.mean(sims)) if sims else 0.0
+    done = len(state.movement_history or [])
+    match = bool(state.finished) and score >= threshold
+    return {
+        "match": match,
+        "score": score,
+        "user_id": user_id,
+        "face_id": face_id,
+        "message": f"Liveness {'confirmado' if match else 'não confirmado'} "
+                   f"({done}/{movements_required} movimentos detectados)",
+    }
@@ -0,0 +1,61 @@
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.services.face_capture_service import embed_largest_face
+from app.services.face_liveness_service import FACE_MATCH_THRESHOLD
+from app.services.gallery_index import gallery_index
+from app.services.ann_index import ann_index
+from app.services.shared_gallery import shared_gallery
+from app.services.metrics import stage_timer
+from app.utils.image_decode import DECODE_LONG_SIDE_ENROLLMENT, decode_image
+
+
+# ============================================================
+# IDENTIFICAÇÃO 1:N ("quem é esta pessoa?")
+# ------------------------------------------------------------
+# Extrai o embedding da maior face do probe e busca em todos os
+# usuários cadastrados: pelo índice IVF (ann_index) quando há um
+# persistido em ANN_INDEX_PATH, senão pela galeria compartilhada
+# (GALLERY_STORE_PATH) ou pelo gallery_index exato do worker.
+# ============================================================
+
+def search_gallery(db: Session, embedding: np.ndarray, top_k: int = 5):
+    if ann_index.loaded:
+        # faces cadastradas fora deste worker depois do build
+        ann_index.catch_up(db)
+        return ann_index.search(embedding, k=top_k)
+    if shared_gallery.attached:
+        return shared_gallery.search(embedding, k=top_k)
+
+    # Índice ainda não carregado neste worker → carrega agora
+    if not gallery_index.loaded:
+        gallery_index.build(db)
+    return gallery_index.search(embedding, k=top_k)
+
+
+def identify_face(db: Session, image_bytes: bytes, top_k: int = 5) -> dict:
+    with stage_timer("decode"):
+        img, _ = decode_image(image_bytes, DECODE_LONG_SIDE_ENROLLMENT)
+    if img is None:
+        return {"status": "error", "message": "Imagem inválida."}
+
+    embedding = embed_largest_face(img)
+    if embedding is None:
+        return {"status": "no_face_detected", "message": "Nenhum rosto detectado."}
+
+    with stage_timer("matching"):
+        candidates = search_gallery(db, embedding, top_k)
+    if not candidates:
+        return {"status": "error", "message": "Nenhuma face cadastrada"}
+
+    best = candidates[0]
+    match = best["score"] >= FACE_MATCH_THRESHOLD
+    return {
+        "status": "ok",
+        "match": match,
+        "user_id": best["user_id"] if match else None,
+        "face_id": best["face_id"] if match else None,
+        "score": best["score"],
+        "candidates": candidates,
+        "message": "Rosto identificado." if match else "Rosto não cadastrado.",
+    }
@@ -2,98 +2,92 @@ import os
 import cv2
 import numpy as np
 import time
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from insightface.app import FaceAnalysis
-from app.repository.repository_face import get_embeddings_by_user
+from typing import Dict, List, Optional, Tuple
+from app.repository.repository_face import (
+    get_embeddings_by_user,
+    get_embeddings_by_user_async,
+    get_recent_user_ids,
+)
+from app.services.model_registry import model_registry
+from app.services.metrics import FACES_FOUND, FRAMES, REJECTIONS, stage_timer
+from app.services.embedding_cache import embedding_cache
+from app.services.shared_gallery import shared_gallery, sync_embedding_cache
+from app.services.face_template import TEMPLATE_ENABLED, build_template
+from app.services.face_tracker import (
+    TRACKING_ENABLED,
+    TRACKING_FRAME_SKIP,
+    FaceTracker,
+    tracking_stats,
+)
+from app.services.frame_quality import QUALITY_GATE_ENABLED, check_face, check_frame
+from app.utils.embedding_codec import decode_embeddings
+from app.utils.image_decode import DECODE_LONG_SIDE_LIVENESS, decode_image
+from app.utils.request_context import logger
 
 
 # ============================================================
 # CONFIGURAÇÕES GERAIS DO SISTEMA
 # ============================================================
 
-MODEL_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models"))
-
-# Otimizações internas do OpenCV
+# Otimizações internas do OpenCV (threads do processo; somam com as do ONNX Runtime)
+OPENCV_THREADS = int(os.getenv("OPENCV_THREADS", "2"))
 cv2.setUseOptimized(True)
-cv2.setNumThreads(2)
+cv2.setNumThreads(OPENCV_THREADS)
 
 # Parâmetros do sistema de detecção e validação
-DET_SIZE = 160
 FACE_MATCH_THRESHOLD = 0.60   # Similaridade mínima por frame
 BATCH_MATCH_RATIO = 0.50      # % mínima de frames aceitos
 FRAME_SKIP = 3                # Processa 1 frame a cada 3
 
+# Reconhecimento em lote: recortes de todos os frames em um único
+# session.run (0 = modo antigo, detecção + embedding frame a frame)
+RECOGNITION_BATCH_SIZE = int(os.getenv("RECOGNITION_BATCH_SIZE", "16"))
 
-# ============================================================
-# DETECÇÃO AUTOMÁTICA DE GPU
-# ------------------------------------------------------------
-# ctx_id = -1 → CPU
-# ctx_id = 0  → GPU CUDA 0
-# insightface utiliza ctx_id para definir onde rodar o modelo
-# ============================================================
-
-def detect_gpu():
-    try:
-        import torch
-        if torch.cuda.is_available():
-            return 0
-    except Exception:
-        pass
-    return -1
-
+# Parada antecipada: encerra quando os frames restantes não mudam o veredito.
+# Com ela ligada (padrão), o lote efetivo é min(RECOGNITION_BATCH_SIZE,
+# EARLY_EXIT_BATCH) — 4, não 16: o veredito é checado entre lotes. O
+# tamanho usado volta no resultado como "batch_size".
+EARLY_EXIT = os.getenv("EARLY_EXIT", "1") == "1"
+EARLY_EXIT_BATCH = int(os.getenv("EARLY_EXIT_BATCH", "4"))   # lote máximo com parada antecipada ligada
 
-CTX_ID = detect_gpu()
+# SPRT opcional sobre o acerto por frame (similaridade >= FACE_MATCH_THRESHOLD)
+#   SPRT_CONFIDENCE = 0 → desligado; ex.: 0.99 → erro tipo I/II de 1%
+SPRT_CONFIDENCE = float(os.getenv("SPRT_CONFIDENCE", "0"))
+SPRT_P_MATCH = float(os.getenv("SPRT_P_MATCH", "0.8"))        # taxa de acerto esperada (mesma pessoa)
+SPRT_P_IMPOSTOR = float(os.getenv("SPRT_P_IMPOSTOR", "0.2"))  # taxa de acerto esperada (impostor)
 
 
 # ============================================================
-# INICIALIZAÇÃO DO FACE ANALYSIS (DETECÇÃO + EMBEDDING)
-# ============================================================
-
-def _init_face_app():
-    """
-    Inicializa o InsightFace com:
-      - Modelo buffalo_l (robusto e rápido)
-      - root customizado
-      - apenas detection + recognition
-      - processamento automático em GPU se disponível
-    """
-    fa = FaceAnalysis(
-        name="buffalo_l",
-        root=MODEL_ROOT,
-        allowed_modules=["detection", "recognition"]
-    )
-    
-    # ctx_id é definido automaticamente (GPU ou CPU)
-    fa.prepare(
-        ctx_id=CTX_ID,
-        det_size=(DET_SIZE, DET_SIZE)
-    )
-    return fa
-
-
-# Instância global (carregada 1 vez por worker)
-face_app = _init_face_app()
-
-
-# ============================================================
-# CACHE EM MEMÓRIA PARA EMBEDDINGS DE USUÁRIOS
+# MODELO DE LIVENESS
 # ------------------------------------------------------------
-# user_id → matriz Nx512 com embeddings normalizados
-# evita consultas repetidas no banco (grande ganho de performance)
+# Mesmas sessões ONNX do cadastro (model_registry), apenas com
+# det_size reduzido para frames de câmera (DET_SIZE_LIVENESS).
 # ============================================================
 
-embedding_cache: dict[int, np.ndarray] = {}
+face_app = model_registry.analyzer("liveness")
 
 
 # ============================================================
 # FUNÇÕES UTILITÁRIAS
 # ============================================================
 
+def decode_frame_scaled(data: bytes) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Converte bytes do frame em matriz BGR usando OpenCV, já reduzido
+    (1/2, 1/4, 1/8) quando o frame é bem maior que o necessário.
+    As bboxes ficam no espaço do frame decodificado (todos os frames
+    do lote têm a mesma escala, então o tracker segue consistente);
+    scale = tamanho original / decodificado.
+    """
+    with stage_timer("decode"):
+        return decode_image(data, DECODE_LONG_SIDE_LIVENESS)
+
+
 def decode_frame(data: bytes) -> Optional[np.ndarray]:
-    """Converte bytes do frame em matriz BGR usando OpenCV."""
-    arr = np.frombuffer(data, np.uint8)
-    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    """decode_frame_scaled sem a escala."""
+    return decode_frame_scaled(data)[0]
 
 def normalize(v: np.ndarray) -> np.ndarray:
     """Normaliza embedding (L2 norm) para dot product correto."""
@@ -101,21 +95,227 @@ def normalize(v: np.ndarray) -> np.ndarray:
 
 def get_user_embeddings(db: Session, user_id: int) -> Optional[np.ndarray]:
     """
-    Carrega embeddings do usuário do banco e mantém em cache.
-    Cada embedding já é convertido para float32 e normalizado.
+    Carrega embeddings do usuário do banco e mantém em cache
+    (LRU limitado em bytes, invalidado a cada novo cadastro).
+    Os embeddings já estão gravados em float32 normalizado: a matriz
+    é montada direto dos bytes, sem loop em Python. Com TEMPLATE_ENABLED,
+    guarda só o template compacto (centróide + K embeddings diversos).
+    Com a galeria compartilhada anexada, lê dela em vez do banco.
     """
-    if user_id in embedding_cache:
-        return embedding_cache[user_id]
-
-    rows = get_embeddings_by_user(db, user_id)
-    if not rows:
+    version = _sync_and_version(user_id)
+    cached = _cached_or_shared(user_id, version)
+    if cached is not None:
+        return cached
+    with stage_timer("db_fetch"):
+        rows = get_embeddings_by_user(db, user_id)
+    return _cache_user_rows(user_id, rows, version)
+
+
+async def get_user_embeddings_async(db: AsyncSession, user_id: int) -> Optional[np.ndarray]:
+    """get_user_embeddings com AsyncSession: a consulta não bloqueia o event loop."""
+    version = _sync_and_version(user_id)
+    cached = _cached_or_shared(user_id, version)
+    if cached is not None:
+        return cached
+    with stage_timer("db_fetch"):
+        rows = await get_embeddings_by_user_async(db, user_id)
+    return _cache_user_rows(user_id, rows, version)
+
+
+def prewarm_embedding_cache(db: Session, users: int) -> int:
+    """Carrega os templates dos `users` usuários cadastrados mais recentemente."""
+    loaded = 0
+    for user_id in get_recent_user_ids(db, users):
+        if get_user_embeddings(db, user_id) is not None:
+            loaded += 1
+    return loaded
+
+
+def _sync_and_version(user_id: int):
+    """Aplica invalidações de outros workers e pega a versão antes de ler."""
+    if shared_gallery.attached:
+        sync_embedding_cache()   # cadastros feitos por outros workers
+    return embedding_cache.version(user_id)
+
+
+def _cached_or_shared(user_id: int, version) -> Optional[np.ndarray]:
+    """Cache do worker; se vazio, linhas do usuário na galeria compartilhada."""
+    cached = embedding_cache.get(user_id)
+    if cached is not None or not shared_gallery.attached:
+        return cached
+    found = shared_gallery.user_embeddings(user_id)
+    if found is None:
+        return None   # usuário ainda fora da galeria: cai no banco
+    return _cache_user_matrix(user_id, *found, version)
+
+
+def _cache_user_rows(user_id: int, rows, version=None) -> Optional[np.ndarray]:
+    rows = [r for r in rows if r.embedding is not None]
+    arr = decode_embeddings(r.embedding for r in rows)
+    if arr is None:
         return None
+    qualities = np.array(
+        [np.nan if r.quality is None else r.quality for r in rows], dtype=np.float32
+    )
+    return _cache_user_matrix(user_id, arr, qualities, version)
+
 
-    arr = np.vstack([normalize(np.array(r, dtype=np.float32)) for r in rows])
-    embedding_cache[user_id] = arr
+def _cache_user_matrix(user_id: int, arr: np.ndarray, qualities: np.ndarray,
+                       version=None) -> np.ndarray:
+    if TEMPLATE_ENABLED:
+        arr = build_template(arr, qualities)
+    embedding_cache.put(user_id, arr, version)
     return arr
 
 
+# ============================================================
+# ESTATÍSTICAS INCREMENTAIS DE MATCH
+# ------------------------------------------------------------
+# Acumula as similaridades frame a frame. Usado pelo batch
+# (process_batch_frames) e pelo streaming via WebSocket, onde
+# o veredito pode sair antes do último frame chegar.
+# ============================================================
+
+class LivenessAccumulator:
+
+    def __init__(self, user_embs: np.ndarray, expected_frames: Optional[int] = None,
+                 t0: Optional[float] = None, frame_skip: int = FRAME_SKIP):
+        self.user_embs = user_embs
+        self.expected_frames = expected_frames   # total de frames brutos previstos
+        self.frame_skip = max(1, frame_skip)
+        self.similarities: List[float] = []
+        self.frames_received = 0
+        self.frames_sampled = 0
+        self.rejections: Dict[str, int] = {}
+        self.verdict: Optional[bool] = None
+        self.exit_reason: Optional[str] = None
+        self.t0 = t0 if t0 is not None else time.time()
+
+    def next_frame(self) -> bool:
+        """Registra a chegada de um frame; True se ele deve ser processado."""
+        index = self.frames_received
+        self.frames_received += 1
+        if index % self.frame_skip != 0:
+            FRAMES.inc(outcome="skipped")
+            return False
+        self.frames_sampled += 1
+        FRAMES.inc(outcome="analyzed")
+        return True
+
+    def reject(self, reason: str):
+        """Frame descartado pelo filtro de qualidade (não entra nas estatísticas)."""
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        FRAMES.inc(outcome="rejected")
+        REJECTIONS.inc(reason=reason)
+
+    def add(self, score: Optional[float]):
+        """Adiciona a similaridade do frame (None = sem rosto válido)."""
+        if score is not None:
+            self.similarities.append(score)
+            FACES_FOUND.inc()
+
+    def matches(self) -> int:
+        return sum(s >= FACE_MATCH_THRESHOLD for s in self.similarities)
+
+    def remaining(self) -> Optional[int]:
+        """Frames amostrados que ainda faltam (None se o total é desconhecido)."""
+        if self.expected_frames is None:
+            return None
+        total = (self.expected_frames + self.frame_skip - 1) // self.frame_skip
+        return max(total - self.frames_sampled, 0)
+
+    def settled(self) -> Optional[bool]:
+        """
+        Veredito que nenhum frame restante consegue mudar.
+          aceite garantido : matches / (válidos + restantes) >= BATCH_MATCH_RATIO
+          rejeição garantida: (matches + restantes) / (válidos + restantes) < BATCH_MATCH_RATIO
+        Retorna None enquanto o resultado ainda pode mudar.
+        """
+        remaining = self.remaining()
+        if remaining is None or not self.similarities:
+            return None
+        matches, valid = self.matches(), len(self.similarities)
+        if matches / (valid + remaining) >= BATCH_MATCH_RATIO:
+            return True
+        if (matches + remaining) / (valid + remaining) < BATCH_MATCH_RATIO:
+            return False
+        return None
+
+    def sprt(self, confidence: float = SPRT_CONFIDENCE) -> Optional[bool]:
+        """
+        Teste sequencial da razão de verossimilhança (Wald) sobre os acertos:
+          H1: P(acerto) = SPRT_P_MATCH   vs   H0: P(acerto) = SPRT_P_IMPOSTOR
+        Aceita H1 com LLR >= ln((1-b)/a), aceita H0 com LLR <= ln(b/(1-a)),
+        a = b = 1 - confidence. None enquanto não há evidência suficiente.
+        """
+        if confidence <= 0 or not self.similarities:
+            return None
+        err = 1.0 - confidence
+        hits = self.matches()
+        misses = len(self.similarities) - hits
+        llr = (hits * np.log(SPRT_P_MATCH / SPRT_P_IMPOSTOR)
+               + misses * np.log((1 - SPRT_P_MATCH) / (1 - SPRT_P_IMPOSTOR)))
+        if llr >= np.log((1 - err) / err):
+            return True
+        if llr <= np.log(err / (1 - err)):
+            return False
+        return None
+
+    def decide(self, sprt_confidence: float = SPRT_CONFIDENCE) -> Optional[bool]:
+        """Veredito antecipado (settled ou SPRT); guarda o motivo da parada."""
+        verdict = self.settled()
+        reason = "settled"
+        if verdict is None:
+            verdict = self.sprt(sprt_confidence)
+            reason = "sprt"
+        if verdict is not None:
+            self.verdict = verdict
+            self.exit_reason = reason
+        return verdict
+
+    def result(self) -> dict:
+        """Estatísticas finais no formato de resposta da API."""
+        if not self.similarities:
+            return {
+                "status": "error",
+                "message": "Nenhum rosto válido detectado",
+                "rejected_frames": dict(self.rejections),
+            }
+
+        avg_sim = float(np.mean(self.similarities))
+        ratio = self.matches() / len(self.similarities)
+        same = ratio >= BATCH_MATCH_RATIO if self.verdict is None else self.verdict
+        total_time = time.time() - self.t0
+        skipped = (self.remaining() or 0) if self.exit_reason else 0
+
+        if skipped:
+            FRAMES.inc(skipped, outcome="early_exit")
+
+        # Log estruturado para debugging / calibração (com request_id)
+        logger.info("liveness_result", extra={"fields": {
+            "average_similarity": round(avg_sim, 4),
+            "matching_ratio": round(ratio, 4),
+            "same_person": bool(same),
+            "processing_time": round(total_time, 4),
+            "frames_analyzed": len(self.similarities),
+            "frames_skipped": skipped,
+            "early_exit": self.exit_reason,
+            "rejected_frames": dict(self.rejections),
+        }})
+
+        return {
+            "status": "ok",
+            "same_person_batch": same,
+            "matching_ratio": ratio,
+            "average_similarity": avg_sim,
+            "processing_time": total_time,
+            "frames_analyzed": len(self.similarities),
+            "frames_skipped": skipped,
+            "early_exit": self.exit_reason,
+            "rejected_frames": dict(self.rejections),
+        }
+
+
 # ============================================================
 # SERVIÇO PRINCIPAL DE LIVENESS E MATCHING POR BATCH
 # ============================================================
@@ -128,80 +328,164 @@ class FaceLivenessService:
         Calcula a maior similaridade (dot product) entre o embedding detectado
         e todos os embeddings cadastrados do usuário.
         """
-        emb = normalize(emb)
-        sims = np.dot(user_embs, emb)
-        return float(np.max(sims))
+        with stage_timer("matching"):
+            emb = normalize(emb)
+            sims = np.dot(user_embs, emb)
+            return float(np.max(sims))
 
     @staticmethod
-    def process_batch_frames(db: Session, user_id: int, frames: List[bytes]):
+    def _frame_face(raw: bytes, detect, acc: Optional[LivenessAccumulator],
+                    quality_gate: bool = QUALITY_GATE_ENABLED):
+        """
+        Um frame de ponta a ponta até a face: decode → filtro pré-detecção
+        → detecção → filtro pós-detecção. Retorna (img, face) ou None.
+        Usado pelo lote (POST) e pelo streaming (WebSocket).
+        """
+        img, scale = decode_frame_scaled(raw)
+        if img is None:
+            return None
+        reason = check_frame(img) if quality_gate else None
+        if reason:
+            if acc is not None:
+                acc.reject(reason)
+            return None
+        face = FaceLivenessService._main_face(img, detect, acc, quality_gate, scale)
+        if face is None:
+            return None
+        return img, face
+
+    @staticmethod
+    def _sampled_faces(frames: List[bytes], acc: LivenessAccumulator, detect,
+                       quality_gate: bool = QUALITY_GATE_ENABLED):
+        """1 a cada acc.frame_skip frames (skip reduz carga), já com a face."""
+        for raw in frames:
+            if not acc.next_frame():
+                continue
+            found = FaceLivenessService._frame_face(raw, detect, acc, quality_gate)
+            if found is not None:
+                yield found
+
+    @staticmethod
+    def _main_face(img: np.ndarray, detect, acc: Optional[LivenessAccumulator],
+                   quality_gate: bool = QUALITY_GATE_ENABLED, scale: float = 1.0):
+        """Primeira face detectada, se aprovada no filtro pós-detecção."""
+        faces = detect(img)
+        if not faces:
+            return None
+        reason = check_face(faces[0], scale) if quality_gate else None
+        if reason:
+            if acc is not None:
+                acc.reject(reason)
+            return None
+        return faces[0]
+
+    @staticmethod
+    def _embed_frames(frames: List[bytes], acc: LivenessAccumulator, detect):
+        """Modo frame a frame: detecção + embedding (batch de 1) por frame."""
+        # Detecção com GPU/CPU conforme disponível (frame inteiro ou ROI)
+        for img, face in FaceLivenessService._sampled_faces(frames, acc, detect):
+            # Pega embedding da primeira face detectada
+            yield [face_app.embed(img, face)]
+
+    @staticmethod
+    def _embed_frames_batched(frames: List[bytes], acc: LivenessAccumulator, detect,
+                              batch_size: int):
+        """
+        Modo em lote: detecta em cada frame, alinha os recortes da primeira
+        face e calcula os embeddings em session.run de até batch_size.
+        Produz um lote por vez, permitindo parada antecipada entre lotes.
+        """
+        crops = []
+        for img, face in FaceLivenessService._sampled_faces(frames, acc, detect):
+            crops.append(face_app.align(img, face))
+            if len(crops) >= batch_size:
+                yield list(face_app.embed_crops(crops, batch_size=batch_size))
+                crops = []
+        if crops:
+            yield list(face_app.embed_crops(crops, batch_size=batch_size))
+
+    @staticmethod
+    def process_batch_frames(db: Optional[Session], user_id: int, frames: List[bytes],
+                             batch_size: Optional[int] = None,
+                             early_exit: Optional[bool] = None,
+                             tracking: Optional[bool] = None,
+                             user_embs: Optional[np.ndarray] = None,
+                             frame_skip: Optional[int] = None):
         """
         Processa um lote de frames para validação facial.
 
         Fluxo:
         - Carrega embeddings do usuário
-        - Itera frames (com skip para performance)
-        - Detecta face com InsightFace (GPU se disponível)
-        - Extrai embedding do primeiro rosto
+        - Itera frames (com skip para performance; frame_skip=1 quando o
+          lote já chega amostrado, ex.: lote binário)
+        - Detecta face com InsightFace (GPU se disponível); com tracking,
+          só numa ROI em volta da face do frame anterior
+        - Extrai embedding do primeiro rosto (em lote se batch_size > 0)
         - Calcula similaridade
+        - Para antes do fim se o veredito já estiver decidido (early_exit)
         - Calcula média final e razão de matches
         """
 
         t0 = time.time()
 
-        # Carrega embeddings do usuário da base (ou cache)
-        user_embs = get_user_embeddings(db, user_id)
+        # Carrega embeddings do usuário da base (ou cache), se a rota
+        # ainda não os trouxe pela sessão assíncrona
+        if user_embs is None:
+            user_embs = get_user_embeddings(db, user_id)
         if user_embs is None:
             return {"status": "error", "message": "Nenhuma face cadastrada"}
 
-        similarities = []
-        processed = 0
-
-        for i, raw in enumerate(frames):
-
-            # Skip reduz carga (processa +- 30% dos frames)
-            if i % FRAME_SKIP != 0:
-                continue
-
-            img = decode_frame(raw)
-            if img is None:
-                continue
-
-            # Detecção com GPU/CPU conforme disponível
-            faces = face_app.get(img)
-            if not faces:
-                continue
-
-            # Pega embedding da primeira face detectada
-            emb = np.asarray(faces[0].embedding, dtype=np.float32)
-
-            score = FaceLivenessService.match_similarity(user_embs, emb)
-            similarities.append(score)
-            processed += 1
-
-        if not similarities:
-            return {"status": "error", "message": "Nenhum rosto válido detectado"}
-
-        # Estatísticas finais
-        avg_sim = float(np.mean(similarities))
-        ratio = sum(s >= FACE_MATCH_THRESHOLD for s in similarities) / len(similarities)
-        same = ratio >= BATCH_MATCH_RATIO
-        total_time = time.time() - t0
-
-        # Logs para debugging / calibração
-        print("\n===== RESULTADO FINAL =====")
-        print(f"Avg Similarity : {avg_sim:.4f}")
-        print(f"Match Ratio    : {ratio:.4f}")
-        print(f"Same Person    : {same}")
-        print(f"Processing Time: {total_time:.4f} sec")
-        print(f"Frames Analyzed: {len(similarities)}")
-        print("===========================\n")
+        if batch_size is None:
+            batch_size = RECOGNITION_BATCH_SIZE
+        if early_exit is None:
+            early_exit = EARLY_EXIT
+        if tracking is None:
+            tracking = TRACKING_ENABLED
+
+        tracker = FaceTracker(face_app) if tracking else None
+        detect = tracker.detect if tracker else face_app.detect
+        if frame_skip is None:
+            frame_skip = TRACKING_FRAME_SKIP if tracker else FRAME_SKIP
+
+        acc = LivenessAccumulator(user_embs, expected_frames=len(frames), t0=t0,
+                                  frame_skip=frame_skip)
+
+        if batch_size > 0:
+            # lotes menores → o veredito é checado com mais frequência
+            if early_exit:
+                batch_size = min(batch_size, max(EARLY_EXIT_BATCH, 1))
+            batches = FaceLivenessService._embed_frames_batched(frames, acc, detect, batch_size)
+        else:
+            batches = FaceLivenessService._embed_frames(frames, acc, detect)
+
+        for embeddings in batches:
+            for emb in embeddings:
+                acc.add(FaceLivenessService.match_similarity(user_embs, emb))
+            if early_exit and acc.decide() is not None:
+                break
 
         # Retorno para API
-        return {
-            "status": "ok",
-            "same_person_batch": same,
-            "matching_ratio": ratio,
-            "average_similarity": avg_sim,
-            "processing_time": total_time,
-            "frames_analyzed": len(similarities),
-        }
+        result = acc.result()
+        result["batch_size"] = batch_size   # efetivo (0 = frame a frame)
+        if tracker:
+            tracking_stats.record(tracker)
+            result["tracking"] = tracker.stats()
+        return result
+
+    @staticmethod
+    def score_frame(user_embs: np.ndarray, raw: bytes,
+                    tracker: Optional[FaceTracker] = None,
+                    acc: Optional[LivenessAccumulator] = None) -> Optional[float]:
+        """
+        Streaming: processa um único frame (decode + qualidade + detecção +
+        embedding) e retorna a similaridade, ou None se não houver rosto válido.
+        O tracker (1 por stream) mantém a ROI entre frames; rejeições de
+        qualidade são contadas em acc.
+        """
+        detect = tracker.detect if tracker else face_app.detect
+        found = FaceLivenessService._frame_face(raw, detect, acc)
+        if found is None:
+            return None
+        img, face = found
+        emb = face_app.embed(img, face)
+        return FaceLivenessService.match_similarity(user_embs, emb)
@@ -0,0 +1,69 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.utils.embedding_codec import l2_normalize
+
+
+# ============================================================
+# TEMPLATE COMPACTO POR USUÁRIO
+# ------------------------------------------------------------
+# Cada upload adiciona uma linha em faces; comparar o probe com
+# TODAS as N fotos faz o custo (e o cache) crescer sem limite.
+#
+# O template do usuário tem no máximo TEMPLATE_SIZE + 1 linhas:
+#   - centróide ponderado pela qualidade de cada foto
+#   - até TEMPLATE_SIZE embeddings mais diversos (k-center guloso)
+# As linhas brutas continuam no banco; o template é recalculado
+# sempre que a galeria do usuário é recarregada.
+#
+# Opt-in (TEMPLATE_ENABLED=1): o centróide é uma linha a mais no
+# max da similaridade e costuma ficar mais perto do probe que
+# qualquer foto isolada — os scores sobem e FACE_MATCH_THRESHOLD
+# precisa ser recalibrado antes de ligar.
+# ============================================================
+
+TEMPLATE_ENABLED = os.getenv("TEMPLATE_ENABLED", "0") == "1"
+TEMPLATE_SIZE = int(os.getenv("TEMPLATE_SIZE", "8"))
+
+
+def weighted_centroid(embs: np.ndarray, qualities: Optional[np.ndarray] = None) -> np.ndarray:
+    """Média dos embeddings ponderada pela qualidade, normalizada."""
+    if qualities is None:
+        weights = np.ones(embs.shape[0], dtype=np.float32)
+    else:
+        weights = np.clip(np.nan_to_num(qualities, nan=1.0), 1e-3, None).astype(np.float32)
+    return l2_normalize(weights @ embs)
+
+
+def k_center(embs: np.ndarray, k: int, first: int = 0) -> np.ndarray:
+    """
+    Seleção gulosa k-center: começa em `first` e a cada passo escolhe o
+    embedding menos similar a todos os já escolhidos. Retorna os índices.
+    """
+    n = embs.shape[0]
+    if n <= k:
+        return np.arange(n)
+
+    chosen = [first]
+    # maior similaridade de cada embedding com o conjunto escolhido
+    closest = embs @ embs[first]
+    for _ in range(k - 1):
+        nxt = int(np.argmin(closest))
+        chosen.append(nxt)
+        closest = np.maximum(closest, embs @ embs[nxt])
+    return np.asarray(chosen)
+
+
+def build_template(embs: np.ndarray, qualities: Optional[np.ndarray] = None,
+                   size: int = TEMPLATE_SIZE) -> np.ndarray:
+    """Matriz (até size+1)x512: centróide + embeddings diversos."""
+    if embs.shape[0] <= 1:
+        return embs
+    centroid = weighted_centroid(embs, qualities)
+
+    # Começa pelo embedding mais representativo (mais próximo do centróide)
+    first = int(np.argmax(embs @ centroid))
+    diverse = embs[k_center(embs, size, first=first)]
+    return np.vstack([centroid[None, :], diverse]).astype(np.float32)
@@ -0,0 +1,112 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+# ============================================================
+# RASTREAMENTO DE FACE ENTRE FRAMES (ROI)
+# ------------------------------------------------------------
+# Entre frames consecutivos da webcam o rosto quase não se move.
+# O tracker roda a detecção completa só no primeiro frame; nos
+# seguintes detecta apenas dentro de uma ROI expandida em volta
+# da bbox anterior, com det_size menor (o rosto ocupa boa parte
+# da ROI, então a resolução efetiva da face se mantém).
+# Rosto perdido na ROI → volta para a detecção no frame inteiro.
+#
+# Opt-in (TRACKING_ENABLED=1). A amostragem padrão continua 1 a
+# cada 3 frames, igual ao modo sem tracking; TRACKING_FRAME_SKIP=1
+# analisa todo frame (mais reconhecimento por requisição, e muda
+# average_similarity / veredito em relação ao modo antigo).
+# ============================================================
+
+TRACKING_ENABLED = os.getenv("TRACKING_ENABLED", "0") == "1"
+TRACKING_ROI_EXPAND = float(os.getenv("TRACKING_ROI_EXPAND", "0.6"))   # margem por lado (x tamanho da face)
+TRACKING_DET_SIZE = int(os.getenv("TRACKING_DET_SIZE", "96"))          # múltiplo de 32
+TRACKING_FRAME_SKIP = int(os.getenv("TRACKING_FRAME_SKIP", "3"))       # = FRAME_SKIP; 1 = todo frame
+
+
+class TrackingStats:
+    """Contadores acumulados do processo (todas as requisições)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.fallbacks = 0
+
+    def record(self, tracker: "FaceTracker"):
+        with self._lock:
+            self.full_detections += tracker.full_detections
+            self.roi_detections += tracker.roi_detections
+            self.fallbacks += tracker.fallbacks
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.roi_detections + self.fallbacks
+            return {
+                "full_detections": self.full_detections,
+                "roi_detections": self.roi_detections,
+                "fallbacks": self.fallbacks,
+                "fallback_rate": self.fallbacks / attempts if attempts else 0.0,
+            }
+
+
+tracking_stats = TrackingStats()
+
+
+class FaceTracker:
+    """Detector com memória da última bbox (1 instância por requisição/stream)."""
+
+    def __init__(self, analyzer, expand: float = TRACKING_ROI_EXPAND,
+                 roi_det_size: int = TRACKING_DET_SIZE):
+        self.analyzer = analyzer
+        self.expand = expand
+        self.roi_det_size = (roi_det_size, roi_det_size)
+        self.prev_bbox: Optional[np.ndarray] = None
+
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.fallbacks = 0
+
+    def _roi(self, img: np.ndarray):
+        """ROI quadrada expandida em volta da bbox anterior (recortada à imagem)."""
+        x1, y1, x2, y2 = self.prev_bbox
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        half = max(x2 - x1, y2 - y1) * (0.5 + self.expand)
+        h, w = img.shape[:2]
+        rx1, ry1 = max(int(cx - half), 0), max(int(cy - half), 0)
+        rx2, ry2 = min(int(cx + half), w), min(int(cy + half), h)
+        return rx1, ry1, rx2, ry2
+
+    def detect(self, img: np.ndarray):
+        """Mesma saída de analyzer.detect(img), com bbox/kps no frame inteiro."""
+        if self.prev_bbox is not None:
+            rx1, ry1, rx2, ry2 = self._roi(img)
+            if rx2 - rx1 > 1 and ry2 - ry1 > 1:
+                faces = self.analyzer.detect(img[ry1:ry2, rx1:rx2], det_size=self.roi_det_size)
+                if faces:
+                    offset = np.array([rx1, ry1], dtype=np.float32)
+                    for face in faces:
+                        face.bbox = face.bbox + np.tile(offset, 2)
+                        if face.kps is not None:
+                            face.kps = face.kps + offset
+                    self.roi_detections += 1
+                    self.prev_bbox = faces[0].bbox
+                    return faces
+            self.fallbacks += 1
+
+        faces = self.analyzer.detect(img)
+        self.full_detections += 1
+        self.prev_bbox = faces[0].bbox if faces else None
+        return faces
+
+    def stats(self) -> dict:
+        attempts = self.roi_detections + self.fallbacks
+        return {
+            "full_detections": self.full_detections,
+            "roi_detections": self.roi_detections,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / attempts if attempts else 0.0,
+        }
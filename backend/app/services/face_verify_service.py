@@ -1,35 +1,93 @@
-import cv2
+import os
+from typing import Optional
+
 import numpy as np
-from sqlalchemy.orm import Session
-from app.model.face import Face
-
-def compute_cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
-    if vec1 is None or vec2 is None:
-        return 0.0
-    return float(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
-
-def verify_face_match(db: Session, user_id: int, face_id: int, frame_bytes: bytes) -> dict:
-    np_arr = np.frombuffer(frame_bytes, np.uint8)
-    img_bgr = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    if img_bgr is None:
-        return {"status": "error", "message": "Frame inválido."}
-
-    from app.services.face_capture_service import extract_embeddings
-    embeddings = extract_embeddings(img_bgr)
-    if not embeddings:
-        return {"status": "no_face_detected", "message": "Nenhum rosto detectado."}
-
-    captured_emb = embeddings[0]
-    face = db.query(Face).filter(Face.face_id == face_id, Face.user_id == user_id).first()
-    if not face:
-        return {"status": "error", "message": "Face não encontrada."}
-
-    saved_emb = np.array(face.embedding, dtype=np.float32)
-    score = compute_cosine_similarity(captured_emb, saved_emb)
-    match = score >= 0.6
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repository.repository_face import get_face_embedding_async
+from app.services.embedding_cache import EmbeddingCache
+from app.services.face_capture_service import embed_largest_face
+from app.services.face_liveness_service import FACE_MATCH_THRESHOLD, get_user_embeddings_async
+from app.services.inference_executor import inference_executor
+from app.services.metrics import registry, stage_timer
+from app.utils.content_hash import content_hash
+from app.utils.embedding_codec import decode_embedding, l2_normalize
+from app.utils.image_decode import DECODE_LONG_SIDE_ENROLLMENT, decode_image
+
+
+# ============================================================
+# VERIFICAÇÃO 1:1 ("esta foto é do usuário X?")
+# ------------------------------------------------------------
+# Mesmo pipeline do cadastro (decode reduzido + maior face +
+# ArcFace) e comparação por cosseno contra:
+#   - uma face específica (face_id): só a coluna embedding é lida
+#   - todas as faces do usuário: template em cache (liveness)
+#
+# Sem referência (face_id de outro usuário / inexistente, ou usuário
+# sem cadastro) → status "not_found" (404 na rota), antes da inferência.
+#
+# Embeddings de probe ficam num cache LRU pela BLAKE2b dos bytes:
+# reenvios do mesmo arquivo (retry do cliente) não passam de novo
+# pela fila de inferência.
+# ============================================================
+
+PROBE_CACHE_MAX_BYTES = int(os.getenv("PROBE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))   # ~4000 probes
+PROBE_CACHE_TTL = float(os.getenv("PROBE_CACHE_TTL", "600"))
+
+probe_cache = EmbeddingCache(max_bytes=PROBE_CACHE_MAX_BYTES, ttl=PROBE_CACHE_TTL)
+
+registry.callback("face_probe_cache_hits_total", "Probes de verificação atendidos pelo cache.",
+                  lambda: probe_cache.hits, kind="counter")
+registry.callback("face_probe_cache_misses_total", "Probes de verificação que rodaram inferência.",
+                  lambda: probe_cache.misses, kind="counter")
+
+
+def extract_probe_embedding(image_bytes: bytes) -> Optional[np.ndarray]:
+    """Embedding normalizado da maior face (síncrono — roda no inference executor)."""
+    with stage_timer("decode"):
+        img, _ = decode_image(image_bytes, DECODE_LONG_SIDE_ENROLLMENT)
+    if img is None:
+        raise ValueError("Imagem inválida.")
+    embedding = embed_largest_face(img)
+    if embedding is None:
+        return None
+    return l2_normalize(embedding).astype(np.float32)
+
+
+async def verify_face_match(db: AsyncSession, user_id: int, image_bytes: bytes,
+                            face_id: Optional[int] = None) -> dict:
+    # Referência primeiro: sem cadastro não vale gastar inferência
+    if face_id is not None:
+        with stage_timer("db_fetch"):
+            blob = await get_face_embedding_async(db, user_id, face_id)
+        if blob is None:
+            return {"status": "not_found", "message": "Face não encontrada."}
+        reference = decode_embedding(blob).reshape(1, -1)
+    else:
+        reference = await get_user_embeddings_async(db, user_id)
+        if reference is None:
+            return {"status": "not_found", "message": "Nenhuma face cadastrada"}
+
+    key = content_hash(image_bytes)
+    probe = probe_cache.get(key)
+    cached = probe is not None
+    if not cached:
+        try:
+            probe = await inference_executor.run(extract_probe_embedding, image_bytes)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        if probe is None:
+            return {"status": "no_face_detected", "message": "Nenhum rosto detectado."}
+        probe_cache.put(key, probe)
+
+    with stage_timer("matching"):
+        score = float(np.max(reference @ probe))
+    match = score >= FACE_MATCH_THRESHOLD
     return {
         "status": "ok" if match else "mismatch",
         "match": match,
         "score": score,
-        "message": "Rosto reconhecido." if match else "Rosto não corresponde."
+        "face_id": face_id,
+        "probe_cached": cached,
+        "message": "Rosto reconhecido." if match else "Rosto não corresponde.",
     }
@@ -0,0 +1,78 @@
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+# ============================================================
+# FILTRO DE QUALIDADE DE FRAMES (ANTES DA INFERÊNCIA)
+# ------------------------------------------------------------
+# Frames borrados, escuros ou com rosto minúsculo gastam detecção
+# e ArcFace à toa e ainda puxam a average_similarity para baixo.
+#
+#   antes da detecção (frame reduzido para QUALITY_PROBE_SIZE px):
+#     - nitidez: variância do Laplaciano          → "blur"
+#     - exposição: brilho médio / pixels saturados → "too_dark" / "too_bright"
+#   depois da detecção (primeira face):
+#     - tamanho da bbox, em pixels da imagem ORIGINAL (o decode
+#       reduzido de frames grandes não muda o limite) → "face_too_small"
+#     - score do detector                         → "low_det_score"
+# Frame reprovado não passa pelo reconhecimento.
+#
+# Opt-in (QUALITY_GATE_ENABLED=1): ligar muda quais frames entram
+# no veredito (average_similarity / matching_ratio).
+# ============================================================
+
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "0") == "1"
+QUALITY_PROBE_SIZE = int(os.getenv("QUALITY_PROBE_SIZE", "160"))
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "20"))
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "220"))
+QUALITY_MAX_CLIPPED = float(os.getenv("QUALITY_MAX_CLIPPED", "0.4"))   # fração de pixels em 0-15 ou 240-255
+QUALITY_MIN_FACE_PX = float(os.getenv("QUALITY_MIN_FACE_PX", "48"))
+QUALITY_MIN_DET_SCORE = float(os.getenv("QUALITY_MIN_DET_SCORE", "0.6"))
+
+
+def _probe(img: np.ndarray) -> np.ndarray:
+    """Versão pequena em tons de cinza do frame (checagens baratas)."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    scale = QUALITY_PROBE_SIZE / max(h, w)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(int(w * scale), 1), max(int(h * scale), 1)),
+                          interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def check_frame(img: np.ndarray) -> Optional[str]:
+    """Checagem antes da detecção; retorna o motivo da rejeição ou None."""
+    gray = _probe(img)
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    total = hist.sum()
+    mean = float(np.dot(hist, np.arange(256)) / total)
+    dark = hist[:16].sum() / total
+    bright = hist[240:].sum() / total
+
+    if mean < QUALITY_MIN_BRIGHTNESS or dark > QUALITY_MAX_CLIPPED:
+        return "too_dark"
+    if mean > QUALITY_MAX_BRIGHTNESS or bright > QUALITY_MAX_CLIPPED:
+        return "too_bright"
+
+    if cv2.Laplacian(gray, cv2.CV_64F).var() < QUALITY_MIN_SHARPNESS:
+        return "blur"
+    return None
+
+
+def check_face(face, scale: float = 1.0) -> Optional[str]:
+    """
+    Checagem depois da detecção; retorna o motivo da rejeição ou None.
+    scale = tamanho original / decodificado (ver decode_image).
+    """
+    x1, y1, x2, y2 = face.bbox
+    if min(x2 - x1, y2 - y1) * scale < QUALITY_MIN_FACE_PX:
+        return "face_too_small"
+    if float(face.det_score) < QUALITY_MIN_DET_SCORE:
+        return "low_det_score"
+    return None
@@ -0,0 +1,146 @@
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.repository.repository_face import iter_all_embeddings
+from app.services.enrollment_events import on_enrollment
+from app.utils.embedding_codec import EMBEDDING_DIM, decode_embeddings, l2_normalize
+
+
+# ============================================================
+# ÍNDICE DE GALERIA EM MEMÓRIA (IDENTIFICAÇÃO 1:N)
+# ------------------------------------------------------------
+# Todos os embeddings cadastrados em UMA matriz contígua float32
+# normalizada + vetores paralelos linha → (user_id, face_id).
+# Busca = 1 produto matriz-vetor + seleção top-k (argpartition).
+#
+#   - build(db): carrega a tabela faces inteira (startup)
+#   - add(...): atualização incremental a cada cadastro
+# ============================================================
+
+GALLERY_BUILD_BATCH = int(os.getenv("GALLERY_BUILD_BATCH", "10000"))
+
+
+class GalleryIndex:
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        self._user_ids = np.empty(capacity, dtype=np.int64)
+        self._face_ids = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ------------------------------------------------------------
+    # ESCRITA
+    # ------------------------------------------------------------
+    def _reserve(self, extra: int):
+        """Cresce a capacidade (dobrando) para caber mais `extra` linhas."""
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        # Novos arrays: buscas em andamento continuam lendo os antigos
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        user_ids = np.empty(capacity, dtype=np.int64)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        face_ids = np.empty(capacity, dtype=np.int64)
+        face_ids[:self._size] = self._face_ids[:self._size]
+        self._matrix, self._user_ids, self._face_ids = matrix, user_ids, face_ids
+
+    def add(self, user_ids, face_ids, embeddings: np.ndarray):
+        """Adiciona linhas (embeddings Nx512, normalizados na gravação)."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        n = embeddings.shape[0]
+        if n == 0:
+            return
+        with self._lock:
+            self._reserve(n)
+            start, end = self._size, self._size + n
+            self._matrix[start:end] = embeddings
+            self._user_ids[start:end] = user_ids
+            self._face_ids[start:end] = face_ids
+            self._size = end
+
+    def build(self, db) -> int:
+        """Recarrega o índice inteiro a partir da tabela faces."""
+        fresh = GalleryIndex(self.dim, capacity=max(self._matrix.shape[0], 1024))
+        user_ids, face_ids, blobs = [], [], []
+
+        def flush():
+            embs = decode_embeddings(blobs)
+            if embs is not None:
+                fresh.add(user_ids, face_ids, embs)
+            user_ids.clear(); face_ids.clear(); blobs.clear()
+
+        for row in iter_all_embeddings(db, GALLERY_BUILD_BATCH):
+            user_ids.append(row.user_id)
+            face_ids.append(row.face_id)
+            blobs.append(row.embedding)
+            if len(blobs) >= GALLERY_BUILD_BATCH:
+                flush()
+        flush()
+
+        with self._lock:
+            self._matrix, self._user_ids, self._face_ids = fresh._matrix, fresh._user_ids, fresh._face_ids
+            self._size = fresh._size
+            self.loaded = True
+        return self._size
+
+    # ------------------------------------------------------------
+    # BUSCA
+    # ------------------------------------------------------------
+    def search(self, probe: np.ndarray, k: int = 5) -> List[dict]:
+        """Top-k faces mais similares ao probe (similaridade de cosseno)."""
+        with self._lock:
+            size = self._size
+            matrix, user_ids, face_ids = self._matrix, self._user_ids, self._face_ids
+        if size == 0:
+            return []
+
+        q = l2_normalize(probe).reshape(-1)
+        sims = matrix[:size] @ q
+
+        k = min(k, size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [
+            {
+                "user_id": int(user_ids[i]),
+                "face_id": int(face_ids[i]),
+                "score": float(sims[i]),
+            }
+            for i in top
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "faces": self._size,
+            "capacity": int(self._matrix.shape[0]),
+            "bytes": int(self._matrix.nbytes),
+        }
+
+
+# Instância global (1 por worker)
+gallery_index = GalleryIndex()
+
+
+@on_enrollment
+def _add_on_enrollment(user_id: int, faces):
+    """Novas faces entram no índice sem reconstrução."""
+    if not gallery_index.loaded or not faces:
+        return
+    embs = decode_embeddings(blob for _, blob, _ in faces)
+    if embs is None:
+        return
+    gallery_index.add([user_id] * len(embs), [face_id for face_id, _, _ in faces], embs)
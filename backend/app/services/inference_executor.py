@@ -0,0 +1,150 @@
+import os
+import math
+import time
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.metrics import registry
+
+
+# ============================================================
+# EXECUTOR DE INFERÊNCIA (FORA DO EVENT LOOP)
+# ------------------------------------------------------------
+# face_app.get() é síncrono e pesado. Rodando direto em rotas
+# async ele trava o event loop do uvicorn inteiro.
+#
+# Aqui a inferência vai para um pool de threads (o ONNX Runtime
+# libera o GIL durante session.run) com fila limitada:
+#   - INFERENCE_WORKERS     → threads de inferência
+#   - INFERENCE_QUEUE_SIZE  → jobs aguardando além dos em execução
+# Fila cheia → InferenceQueueFull (rota responde 503 + Retry-After).
+# ============================================================
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "8"))
+
+
+class InferenceQueueFull(Exception):
+    """Fila de inferência lotada; retry_after em segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Fila de inferência cheia, tente novamente.")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+
+    def __init__(self, max_workers: int = INFERENCE_WORKERS,
+                 max_queue: int = INFERENCE_QUEUE_SIZE):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self._pending = 0          # em fila + em execução
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._started = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_ewma = 0.0   # tempo médio de execução (s)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="inference"
+                    )
+        return self._pool
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def retry_after(self) -> int:
+        """Estimativa (s) de quando a fila terá espaço novamente."""
+        queued = max(self._pending - self._running, 0)
+        service = self._service_ewma or 1.0
+        return max(1, math.ceil(service * (queued + 1) / self.max_workers))
+
+    def _job(self, submitted: float, fn, args, kwargs):
+        started = time.perf_counter()
+        wait = started - submitted
+        with self._lock:
+            self._running += 1
+            self._started += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._service_ewma = (
+                    elapsed if self._service_ewma == 0.0
+                    else 0.8 * self._service_ewma + 0.2 * elapsed
+                )
+
+    async def run(self, fn, *args, **kwargs):
+        """Executa fn(*args, **kwargs) no pool; rejeita na hora se a fila estiver cheia."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFull(self.retry_after())
+            self._pending += 1
+
+        # copia o contexto → request_id e tempos por etapa seguem para a thread
+        ctx = contextvars.copy_context()
+        job = functools.partial(ctx.run, self._job, time.perf_counter(), fn, args, kwargs)
+        try:
+            future = self._get_pool().submit(job)
+        except BaseException:
+            self._release()
+            raise
+        # libera a vaga quando o job termina de fato (ou é cancelado antes de
+        # começar) — não quando o chamador desiste (cliente desconectou)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._started
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": max(self._pending - self._running, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self._wait_total / started * 1000) if started else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+                "avg_service_ms": self._service_ewma * 1000,
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+# Instância global (1 pool por worker)
+inference_executor = InferenceExecutor()
+
+registry.callback("face_inference_queue_depth", "Jobs aguardando thread de inferência.",
+                  lambda: inference_executor.stats()["queue_depth"])
+registry.callback("face_inference_running", "Jobs de inferência em execução.",
+                  lambda: inference_executor.stats()["running"])
+registry.callback("face_inference_rejected_total", "Jobs recusados com a fila cheia (503).",
+                  lambda: inference_executor.rejected, kind="counter")
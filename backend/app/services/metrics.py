@@ -0,0 +1,186 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from app.utils.request_context import add_stage
+
+
+# ============================================================
+# MÉTRICAS (FORMATO TEXTO DO PROMETHEUS) — GET /metrics
+# ------------------------------------------------------------
+# Contadores e histogramas em memória, por processo (com vários
+# workers do uvicorn, o Prometheus agrega pelas instâncias).
+#
+#   face_stage_seconds{stage}         tempo por etapa do pipeline
+#   face_frames_total{outcome}        frames analisados/pulados/rejeitados
+#   face_frames_rejected_total{reason} rejeições do filtro de qualidade por motivo
+#   face_faces_found_total            faces detectadas e comparadas
+#   face_http_request_seconds{...}    latência por rota
+#   + métricas lidas na hora (cache de embeddings, fila de inferência)
+#
+# Etapas: multipart_read, body_read, decode, detection, recognition, matching,
+# db_fetch, enrollment_commit. stage_timer() também soma o tempo da
+# etapa no log estruturado da requisição (request_id).
+# ============================================================
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[tuple, list] = {}   # labels → [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    le = _labels(self.labelnames, key, f'le="{_fmt(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Valor lido no momento da coleta (ex.: contadores já mantidos por outro módulo)."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {_fmt(value)}"]
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = STAGE_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        return self.register(CallbackMetric(name, help, kind, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Instância global (1 por worker)
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "face_stage_seconds", "Tempo por etapa do pipeline facial.", ("stage",)
+)
+FRAMES = registry.counter(
+    "face_frames_total", "Frames de liveness por destino (analyzed, skipped, rejected, early_exit).",
+    ("outcome",)
+)
+REJECTIONS = registry.counter(
+    "face_frames_rejected_total", "Frames reprovados no filtro de qualidade, por motivo.", ("reason",)
+)
+FACES_FOUND = registry.counter(
+    "face_faces_found_total", "Faces detectadas e comparadas com o cadastro."
+)
+REQUEST_SECONDS = registry.histogram(
+    "face_http_request_seconds", "Latência das requisições HTTP/WebSocket por rota.",
+    ("method", "route", "status"), buckets=REQUEST_BUCKETS
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Mede o bloco: alimenta face_stage_seconds e o log da requisição atual."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        add_stage(stage, elapsed)
+
+
+def observe_request(method: str, route: str, status, seconds: float):
+    REQUEST_SECONDS.observe(seconds, method=method, route=route, status=status)
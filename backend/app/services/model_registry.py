@@ -0,0 +1,379 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.metrics import stage_timer
+from app.services.recognition_batcher import RecognitionBatcher
+
+
+# ============================================================
+# REGISTRO CENTRAL DE MODELOS (DETECÇÃO + RECONHECIMENTO)
+# ------------------------------------------------------------
+# Antes cada serviço criava seu próprio FaceAnalysis("buffalo_l")
+# no import, duplicando as sessões ONNX em cada worker.
+#
+# Aqui existe UMA sessão de detecção e UMA de reconhecimento por
+# processo, carregadas no primeiro uso ou no warm-up da subida
+# (lifespan em app/main.py). Cada caso de uso
+# (cadastro, liveness...) define apenas o tamanho de entrada do
+# detector — o RetinaFace do insightface aceita input_size por
+# chamada, então a mesma sessão atende todos os tamanhos.
+# ============================================================
+
+MODEL_ROOT = os.getenv(
+    "MODEL_ROOT",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models"))
+)
+MODEL_PACK = os.getenv("MODEL_PACK", "buffalo_l")
+
+# Arquivos ONNX de cada pacote (evita carregar módulos não usados)
+MODEL_FILES = {
+    "buffalo_l": {"detection": "det_10g.onnx", "recognition": "w600k_r50.onnx"},
+    "buffalo_m": {"detection": "det_2.5g.onnx", "recognition": "w600k_r50.onnx"},
+    "buffalo_s": {"detection": "det_500m.onnx", "recognition": "w600k_mbf.onnx"},
+    "buffalo_sc": {"detection": "det_500m.onnx", "recognition": "w600k_mbf.onnx"},
+}
+
+# Precisão dos pesos: "fp32" (original) ou "int8" (quantização dinâmica,
+# gerada na primeira carga ao lado do original: <arquivo>.int8.onnx)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32")
+MODEL_PRECISIONS = {
+    "detection": os.getenv("MODEL_PRECISION_DETECTION", MODEL_PRECISION),
+    "recognition": os.getenv("MODEL_PRECISION_RECOGNITION", MODEL_PRECISION),
+}
+
+# Tamanho de entrada do detector por caso de uso
+DET_SIZES: Dict[str, Tuple[int, int]] = {
+    "enrollment": (int(os.getenv("DET_SIZE_ENROLLMENT", "640")),) * 2,
+    "liveness": (int(os.getenv("DET_SIZE_LIVENESS", "160")),) * 2,
+}
+
+
+# ============================================================
+# ONNX RUNTIME: PROVIDERS E OPÇÕES DE SESSÃO
+# ------------------------------------------------------------
+# Providers pela ordem de ORT_PROVIDERS, filtrados pelos que o
+# onnxruntime instalado oferece (get_available_providers), sem
+# importar torch. ctx_id = 0 se o primeiro for GPU, senão -1.
+#
+#   ORT_INTRA_OP_THREADS  threads dentro de cada operador (0 = padrão ORT)
+#   ORT_INTER_OP_THREADS  threads entre operadores (modo parallel)
+#   ORT_GRAPH_OPT_LEVEL   disable | basic | extended | all
+#   ORT_EXECUTION_MODE    sequential | parallel
+#
+# Com INFERENCE_WORKERS threads chamando a mesma sessão, o ideal
+# costuma ser INFERENCE_WORKERS x ORT_INTRA_OP_THREADS ≈ nº de núcleos.
+# ============================================================
+
+ORT_PROVIDERS = [
+    p.strip() for p in
+    os.getenv("ORT_PROVIDERS", "CUDAExecutionProvider,CPUExecutionProvider").split(",")
+    if p.strip()
+]
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPT_LEVEL = os.getenv("ORT_GRAPH_OPT_LEVEL", "all")
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")
+
+_GPU_PROVIDERS = ("CUDAExecutionProvider", "TensorrtExecutionProvider", "ROCMExecutionProvider")
+
+
+def select_providers(preferred=ORT_PROVIDERS):
+    """Providers preferidos que existem nesta instalação (CPU sempre no fim)."""
+    import onnxruntime
+
+    available = onnxruntime.get_available_providers()
+    providers = [p for p in preferred if p in available]
+    if "CPUExecutionProvider" not in providers:
+        providers.append("CPUExecutionProvider")
+    return providers
+
+
+def session_options():
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    modes = {
+        "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+        "parallel": ort.ExecutionMode.ORT_PARALLEL,
+    }
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    so.inter_op_num_threads = ORT_INTER_OP_THREADS
+    so.graph_optimization_level = levels[ORT_GRAPH_OPT_LEVEL]
+    so.execution_mode = modes[ORT_EXECUTION_MODE]
+    return so
+
+
+def quantize_int8(src: str) -> str:
+    """Quantização dinâmica int8 dos pesos (gerada uma vez, ao lado do fp32)."""
+    dst = src[:-len(".onnx")] + ".int8.onnx"
+    if not os.path.exists(dst):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = dst + ".tmp"
+        quantize_dynamic(src, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, dst)
+    return dst
+
+
+def _current_rss() -> int:
+    """Memória residente do processo em bytes (psutil ou /proc)."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    """
+    Mantém as sessões ONNX compartilhadas do processo.
+
+    - detector()   → modelo de detecção (carregado sob demanda)
+    - recognizer() → modelo ArcFace (carregado sob demanda)
+    - analyzer()   → objeto com .get(img) compatível com FaceAnalysis
+    - memory_report() → memória consumida por cada modelo
+    """
+
+    def __init__(self, root: str = MODEL_ROOT, pack: str = MODEL_PACK,
+                 precision: Optional[str] = None):
+        self.root = root
+        self.pack = pack
+        # precision sobrescreve MODEL_PRECISION_* nas duas tarefas
+        self.precisions = {task: precision or p for task, p in MODEL_PRECISIONS.items()}
+        self.providers = None
+        self.ctx_id: Optional[int] = None
+        self._models: Dict[str, object] = {}
+        self._paths: Dict[str, str] = {}
+        self._stats: Dict[str, dict] = {}
+        self.warmup_report: Dict[str, float] = {}
+        self._analyzers: Dict[Tuple[int, int], "FaceAnalyzer"] = {}
+        self._lock = threading.Lock()
+        # session.run de reconhecimento compartilhado entre requisições
+        self.batcher = RecognitionBatcher(self.recognizer)
+
+    # ------------------------------------------------------------
+    # CARREGAMENTO PREGUIÇOSO
+    # ------------------------------------------------------------
+    def _pack_dir(self) -> str:
+        from insightface.utils.storage import ensure_available
+        return ensure_available("models", self.pack, root=self.root)
+
+    def model_path(self, task: str) -> str:
+        """Arquivo ONNX da tarefa (baixa o pacote e gera o int8 se preciso)."""
+        path = self._paths.get(task)
+        if path is None:
+            path = os.path.join(self._pack_dir(), MODEL_FILES[self.pack][task])
+            if self.precisions[task] == "int8":
+                path = quantize_int8(path)
+            self._paths[task] = path
+        return path
+
+    def prepare_files(self):
+        """
+        Etapa pré-fork (gunicorn --preload): download, quantização e leitura
+        dos ONNX para o page cache, uma vez para todos os workers. As sessões
+        ficam para cada worker — as threads do ONNX Runtime não sobrevivem
+        ao fork.
+        """
+        for task in MODEL_FILES[self.pack]:
+            with open(self.model_path(task), "rb") as f:
+                while f.read(16 * 1024 * 1024):
+                    pass
+
+    def _load(self, task: str):
+        model = self._models.get(task)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(task)
+            if model is not None:
+                return model
+
+            from insightface.model_zoo import model_zoo
+
+            if self.providers is None:
+                self.providers = select_providers()
+                self.ctx_id = 0 if self.providers[0] in _GPU_PROVIDERS else -1
+
+            path = self.model_path(task)
+            rss_before = _current_rss()
+            t0 = time.time()
+
+            model = model_zoo.ModelRouter(path).get_model(
+                providers=self.providers, sess_options=session_options()
+            )
+            if task == "detection":
+                model.prepare(ctx_id=self.ctx_id, input_size=DET_SIZES["enrollment"])
+            else:
+                model.prepare(ctx_id=self.ctx_id)
+
+            self._stats[task] = {
+                "file": os.path.basename(path),
+                "precision": self.precisions[task],
+                "file_bytes": os.path.getsize(path),
+                "rss_delta_bytes": max(_current_rss() - rss_before, 0),
+                "load_seconds": time.time() - t0,
+            }
+            self._models[task] = model
+            return model
+
+    def detector(self):
+        return self._load("detection")
+
+    def recognizer(self):
+        return self._load("recognition")
+
+    def analyzer(self, use_case: str = "enrollment",
+                 det_size: Optional[Tuple[int, int]] = None) -> "FaceAnalyzer":
+        """Retorna um analisador com o tamanho de detecção do caso de uso."""
+        size = tuple(det_size or DET_SIZES[use_case])
+        analyzer = self._analyzers.get(size)
+        if analyzer is None:
+            analyzer = self._analyzers.setdefault(size, FaceAnalyzer(self, size))
+        return analyzer
+
+    def loaded(self) -> bool:
+        return "detection" in self._models and "recognition" in self._models
+
+    def warmup(self, batch_sizes=(1,)) -> Dict[str, float]:
+        """
+        Carrega as sessões e roda inferência em imagens vazias: uma detecção
+        por det_size configurado e um lote de reconhecimento por tamanho.
+        A alocação de memória e a otimização de grafo do ONNX Runtime saem
+        do primeiro request. Fora do stage_timer (não entra nas métricas).
+        """
+        report = {}
+        detector = self.detector()
+        for w, h in sorted(set(DET_SIZES.values()) | set(self._analyzers)):
+            t0 = time.time()
+            detector.detect(np.zeros((h, w, 3), dtype=np.uint8),
+                            input_size=(w, h), max_num=0, metric="default")
+            report[f"detection_{w}x{h}"] = time.time() - t0
+
+        rec = self.recognizer()
+        side = rec.input_size[0]
+        for n in sorted({max(1, int(b)) for b in batch_sizes}):
+            t0 = time.time()
+            rec.get_feat([np.zeros((side, side, 3), dtype=np.uint8)] * n)
+            report[f"recognition_batch_{n}"] = time.time() - t0
+
+        self.warmup_report = report
+        return report
+
+    def memory_report(self) -> dict:
+        """Memória por modelo carregado (tamanho do ONNX e delta de RSS)."""
+        return {
+            "pack": self.pack,
+            "ctx_id": self.ctx_id,
+            "providers": self.providers,
+            "session_options": {
+                "intra_op_threads": ORT_INTRA_OP_THREADS,
+                "inter_op_threads": ORT_INTER_OP_THREADS,
+                "graph_optimization": ORT_GRAPH_OPT_LEVEL,
+                "execution_mode": ORT_EXECUTION_MODE,
+            },
+            "process_rss_bytes": _current_rss(),
+            "warmup_seconds": dict(self.warmup_report),
+            "models": {task: dict(s) for task, s in self._stats.items()},
+        }
+
+
+class FaceAnalyzer:
+    """
+    Substituto leve do FaceAnalysis: detecção com det_size próprio,
+    reconhecimento pela sessão compartilhada do registro.
+    """
+
+    def __init__(self, registry: ModelRegistry, det_size: Tuple[int, int]):
+        self.registry = registry
+        self.det_size = det_size
+
+    def detect(self, img: np.ndarray, max_num: int = 0,
+               det_size: Optional[Tuple[int, int]] = None):
+        """Somente detecção: retorna lista de Face com bbox, kps e det_score."""
+        from insightface.app.common import Face
+
+        detector = self.registry.detector()
+        with stage_timer("detection"):
+            bboxes, kpss = detector.detect(
+                img, input_size=det_size or self.det_size, max_num=max_num, metric="default"
+            )
+        faces = []
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            faces.append(Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4]))
+        return faces
+
+    def embed(self, img: np.ndarray, face) -> np.ndarray:
+        """Embedding (512 floats) de uma face já detectada."""
+        if self.registry.batcher.enabled:
+            face.embedding = self.embed_crops([self.align(img, face)])[0]
+            return face.embedding
+        rec = self.registry.recognizer()
+        with stage_timer("recognition"):
+            rec.get(img, face)
+        return np.asarray(face.embedding, dtype=np.float32)
+
+    def align(self, img: np.ndarray, face) -> np.ndarray:
+        """Recorte alinhado (112x112) pelos 5 keypoints, entrada do ArcFace."""
+        from insightface.utils import face_align
+
+        size = self.registry.recognizer().input_size[0]
+        return face_align.norm_crop(img, landmark=face.kps, image_size=size)
+
+    def embed_crops(self, crops, batch_size: int = 32) -> np.ndarray:
+        """
+        Embeddings de vários recortes alinhados em session.run batched
+        (tensor Nx3x112x112). Retorna matriz Nx512 float32, não normalizada
+        — mesmo resultado de rec.get() recorte a recorte.
+        """
+        if not crops:
+            return np.empty((0, 512), dtype=np.float32)
+        if self.registry.batcher.enabled:
+            # lote dividido com as outras requisições (tamanho do batcher)
+            with stage_timer("recognition"):
+                return self.registry.batcher.embed(crops)
+        rec = self.registry.recognizer()
+        batch_size = max(1, batch_size)
+        with stage_timer("recognition"):
+            feats = [
+                rec.get_feat(crops[i:i + batch_size])
+                for i in range(0, len(crops), batch_size)
+            ]
+        return np.vstack(feats).astype(np.float32, copy=False)
+
+    def get(self, img: np.ndarray, max_num: int = 0):
+        """Detecção + embedding, mesmo contrato de FaceAnalysis.get()."""
+        faces = self.detect(img, max_num=max_num)
+        if not faces:
+            return faces
+        if self.registry.batcher.enabled:
+            feats = self.embed_crops([self.align(img, face) for face in faces])
+            for face, feat in zip(faces, feats):
+                face.embedding = feat
+            return faces
+        rec = self.registry.recognizer()
+        with stage_timer("recognition"):
+            for face in faces:
+                rec.get(img, face)
+        return faces
+
+
+# Instância global (sessões carregadas 1 vez por worker, no primeiro uso)
+model_registry = ModelRegistry()
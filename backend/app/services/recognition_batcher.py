@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.services.inference_executor import inference_executor
+from app.services.metrics import registry
+
+
+# ============================================================
+# LOTES DINÂMICOS DE RECONHECIMENTO ENTRE REQUISIÇÕES
+# ------------------------------------------------------------
+# Sob carga, cada requisição (liveness, cadastro, identificação)
+# chamava o ArcFace com 1 recorte por vez. Aqui os recortes
+# alinhados de todas as threads de inferência entram numa fila
+# única; uma thread dedicada junta e roda UM get_feat (Nx112x112)
+# quando:
+#   - a fila soma RECOGNITION_BATCHER_MAX_BATCH recortes, ou
+#   - o primeiro da fila esperou RECOGNITION_BATCHER_MAX_WAIT_MS, ou
+#   - todas as threads de inferência em execução já estão na fila
+#     (ninguém mais pode chegar — sem carga não há espera extra)
+# Cada chamador recebe os seus embeddings por um Future.
+#
+# Com o batcher ligado vale subir INFERENCE_WORKERS: decode e
+# detecção seguem em paralelo, e mais threads = lotes maiores.
+# ============================================================
+
+RECOGNITION_BATCHER = os.getenv("RECOGNITION_BATCHER", "1") == "1"
+RECOGNITION_BATCHER_MAX_BATCH = int(os.getenv("RECOGNITION_BATCHER_MAX_BATCH", "32"))
+RECOGNITION_BATCHER_MAX_WAIT_MS = float(os.getenv("RECOGNITION_BATCHER_MAX_WAIT_MS", "3"))
+# Limite de espera do chamador: sem resposta nesse prazo, desiste (TimeoutError)
+RECOGNITION_BATCHER_TIMEOUT = float(os.getenv("RECOGNITION_BATCHER_TIMEOUT", "30"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class RecognitionBatcher:
+
+    def __init__(self, recognizer: Callable, max_batch: int = RECOGNITION_BATCHER_MAX_BATCH,
+                 max_wait_ms: float = RECOGNITION_BATCHER_MAX_WAIT_MS,
+                 producers: Optional[Callable[[], int]] = None,
+                 enabled: bool = RECOGNITION_BATCHER,
+                 timeout: float = RECOGNITION_BATCHER_TIMEOUT):
+        self.recognizer = recognizer          # callable → modelo com get_feat()
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # threads do inference_executor em execução = quem ainda pode entrar no lote
+        self.producers = producers or (lambda: inference_executor.running)
+        self.enabled = enabled
+        self.timeout = timeout
+        self.restarts = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.crops = 0
+        self.requests = 0
+        self._sizes = registry.histogram(
+            "face_recognition_batch_size", "Recortes por session.run do batcher de reconhecimento.",
+            buckets=BATCH_SIZE_BUCKETS
+        )
+        self._waits = registry.histogram(
+            "face_recognition_batch_wait_seconds", "Espera na fila do batcher até o session.run."
+        )
+
+    def _start(self):
+        """Sobe a thread no primeiro uso e de novo se ela tiver morrido."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is not None:
+                self.restarts += 1
+            self._thread = threading.Thread(
+                target=self._loop, name="recognition-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, crops: List[np.ndarray]) -> Future:
+        """Enfileira os recortes de um chamador; o Future resolve com a matriz Nx512."""
+        future = Future()
+        self._start()
+        self._queue.put((crops, future, time.perf_counter()))
+        return future
+
+    def embed(self, crops: List[np.ndarray]) -> np.ndarray:
+        """Mesmo resultado de get_feat(crops), dividindo o session.run com outras requisições."""
+        if not crops:
+            return np.empty((0, 512), dtype=np.float32)
+        future = self.submit(list(crops))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()   # a thread descarta o item se ainda não rodou
+            raise
+
+    # ------------------------------------------------------------
+    # THREAD DO BATCHER
+    # ------------------------------------------------------------
+    def _collect(self) -> list:
+        first = self._queue.get()
+        group, total = [first], len(first[0])
+        deadline = first[2] + self.max_wait
+        while total < self.max_batch and len(group) < max(1, self.producers()):
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            group.append(item)
+            total += len(item[0])
+        # já enfileirados entram de graça enquanto houver espaço
+        while total < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            group.append(item)
+            total += len(item[0])
+        return group
+
+    @staticmethod
+    def _resolve(future: Future, result=None, error: Optional[BaseException] = None):
+        """Entrega o resultado, ignorando chamadores que já desistiram (cancel)."""
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _loop(self):
+        while True:
+            group = []
+            try:
+                # quem desistiu (timeout) não entra no session.run
+                group = [item for item in self._collect() if not item[1].cancelled()]
+                if group:
+                    self._run(group)
+            except BaseException as e:
+                # nenhum chamador fica preso esperando um Future órfão
+                for _, future, _ in group:
+                    self._resolve(future, error=e)
+                if not isinstance(e, Exception):
+                    raise
+
+    def _run(self, group: list):
+        crops = [crop for item in group for crop in item[0]]
+        started = time.perf_counter()
+        rec = self.recognizer()
+        feats = np.vstack([
+            rec.get_feat(crops[i:i + self.max_batch])
+            for i in range(0, len(crops), self.max_batch)
+        ]).astype(np.float32, copy=False)
+
+        self.batches += 1
+        self.crops += len(crops)
+        self.requests += len(group)
+        self._sizes.observe(len(crops))
+        offset = 0
+        for item_crops, future, submitted in group:
+            self._waits.observe(started - submitted)
+            self._resolve(future, feats[offset:offset + len(item_crops)])
+            offset += len(item_crops)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            "alive": self._thread is not None and self._thread.is_alive(),
+            "restarts": self.restarts,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.crops / self.batches if self.batches else 0.0,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,370 @@
+import os
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.embedding_cache import embedding_cache
+from app.services.enrollment_events import on_enrollment
+from app.utils.embedding_codec import EMBEDDING_DIM, decode_embeddings, l2_normalize
+
+
+# ============================================================
+# GALERIA COMPARTILHADA ENTRE WORKERS (ARQUIVOS MEMORY-MAPPED)
+# ------------------------------------------------------------
+# Com N workers do uvicorn/gunicorn, cada gallery_index / cache
+# é uma cópia própria: memória cresce com N e o aquecimento de um
+# worker não ajuda os outros.
+#
+# Aqui a galeria fica em arquivos em GALLERY_STORE_PATH, mapeados
+# por todos os workers (page cache do SO = 1 cópia na RAM):
+#   - loader: python -m app.services.shared_gallery --path DIR
+#     constrói a partir da tabela faces
+#   - workers: attach() somente leitura, views NumPy sem cópia
+#   - cadastro: append() sob flock; linhas escritas antes do size,
+#     leitores nunca veem linha incompleta
+#   - header: [epoch, generation, size, capacity]
+#       epoch      muda quando os arquivos são recriados (build ou
+#                  crescimento) → leitores reabrem os mapas
+#       generation +1 a cada escrita; o anel de alterações
+#                  (generation, user_id) diz quais usuários mudaram,
+#                  e cada worker invalida só esses no embedding_cache
+#   - size.<epoch>: linhas válidas daquele epoch. O leitor usa o size
+#     do próprio mapa, nunca o do header: mapa antigo + size novo
+#     exporia linhas zeradas (user_id 0, similaridade 0)
+#   - epoch removido entre a leitura do header e o open (crescimento
+#     concorrente) → FileNotFoundError → relê o header e tenta de novo
+#
+# Arquivos: header.i64, changes.i64, lock e, por epoch,
+# vectors.<epoch>.f32, user_ids/face_ids/size.<epoch>.i64, quality.<epoch>.f32
+# (galerias geradas antes do size por epoch: rodar o loader de novo)
+# ============================================================
+
+GALLERY_STORE_PATH = os.getenv("GALLERY_STORE_PATH", "")
+GALLERY_STORE_CHANGES = int(os.getenv("GALLERY_STORE_CHANGES", "4096"))   # tamanho do anel
+
+_EPOCH, _GENERATION, _SIZE, _CAPACITY = range(4)
+_BUILD_BATCH = 10000
+_REMAP_RETRIES = 5
+
+
+class SharedGallery:
+
+    def __init__(self, path: str = GALLERY_STORE_PATH, dim: int = EMBEDDING_DIM,
+                 changes: int = GALLERY_STORE_CHANGES):
+        self.path = path
+        self.dim = dim
+        self.n_changes = changes
+        self._header = None
+        self._changes = None
+        self._epoch = -1
+        self._arrays = {}
+        self._seen_generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def attached(self) -> bool:
+        return self._header is not None
+
+    # ------------------------------------------------------------
+    # ARQUIVOS
+    # ------------------------------------------------------------
+    def _file(self, name: str, epoch: Optional[int] = None) -> str:
+        return os.path.join(self.path, name if epoch is None else f"{name}.{epoch}")
+
+    def _layout(self, epoch: int):
+        return {
+            "vectors": (self._file("vectors", epoch) + ".f32", np.float32, self.dim),
+            "user_ids": (self._file("user_ids", epoch) + ".i64", np.int64, None),
+            "face_ids": (self._file("face_ids", epoch) + ".i64", np.int64, None),
+            "quality": (self._file("quality", epoch) + ".f32", np.float32, None),
+            "size": (self._file("size", epoch) + ".i64", np.int64, None),
+        }
+
+    def _open_epoch(self, epoch: int, mode: str, capacity: Optional[int] = None) -> dict:
+        arrays = {}
+        for name, (path, dtype, width) in self._layout(epoch).items():
+            if mode == "w+":
+                shape = (1,) if name == "size" else (capacity, width) if width else (capacity,)
+                arrays[name] = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+            else:
+                arr = np.memmap(path, dtype=dtype, mode=mode)
+                arrays[name] = arr.reshape(-1, width) if width else arr
+        return arrays
+
+    def _remove_epoch(self, epoch: int):
+        for path, _, _ in self._layout(epoch).values():
+            try:
+                os.remove(path)   # leitores com o mapa aberto continuam válidos
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_header(self, create: bool = False):
+        header_path, changes_path = self._file("header.i64"), self._file("changes.i64")
+        if create and not os.path.exists(header_path):
+            np.memmap(header_path, dtype=np.int64, mode="w+", shape=(4,)).flush()
+            np.memmap(changes_path, dtype=np.int64, mode="w+", shape=(self.n_changes, 2)).flush()
+        mode = "r+" if create else "r"
+        header = np.memmap(header_path, dtype=np.int64, mode=mode, shape=(4,))
+        changes = np.memmap(changes_path, dtype=np.int64, mode=mode).reshape(-1, 2)
+        return header, changes
+
+    # ------------------------------------------------------------
+    # ESCRITA (loader / cadastro)
+    # ------------------------------------------------------------
+    def build(self, db) -> int:
+        """Recria a galeria inteira a partir da tabela faces (novo epoch)."""
+        from sqlalchemy import func
+        from app.model.face import Face
+        from app.repository.repository_face import iter_all_embeddings
+
+        total = db.query(func.count(Face.face_id)).filter(Face.embedding.isnot(None)).scalar()
+        capacity = max(1024, int(total * 1.25))
+
+        with self._write_lock():
+            header, changes = self._open_header(create=True)
+            old_epoch, epoch = int(header[_EPOCH]), int(header[_EPOCH]) + 1
+            arrays = self._open_epoch(epoch, "w+", capacity)
+
+            size = 0
+            batch = []
+
+            def flush():
+                nonlocal size
+                embs = decode_embeddings(r.embedding for r in batch)
+                if embs is not None:
+                    end = size + embs.shape[0]
+                    arrays["vectors"][size:end] = embs
+                    arrays["user_ids"][size:end] = [r.user_id for r in batch]
+                    arrays["face_ids"][size:end] = [r.face_id for r in batch]
+                    arrays["quality"][size:end] = [np.nan if r.quality is None else r.quality
+                                                   for r in batch]
+                    size = end
+                batch.clear()
+
+            for row in iter_all_embeddings(db, _BUILD_BATCH):
+                if size + len(batch) >= capacity:
+                    break   # cadastrados depois da contagem: entram pelo append
+                batch.append(row)
+                if len(batch) >= _BUILD_BATCH:
+                    flush()
+            flush()
+
+            arrays["size"][0] = size
+            for arr in arrays.values():
+                arr.flush()
+            header[_EPOCH], header[_CAPACITY], header[_SIZE] = epoch, capacity, size
+            header[_GENERATION] += 1
+            changes[:] = 0   # rebuild → todos os caches invalidados (ver changed_users)
+            header.flush()
+            if old_epoch:
+                self._remove_epoch(old_epoch)
+        return size
+
+    def append(self, user_ids, face_ids, embeddings: np.ndarray, qualities=None):
+        """Cadastro novo: acrescenta linhas e registra os usuários no anel de alterações."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        n = embeddings.shape[0]
+        if n == 0 or not os.path.exists(self._file("header.i64")):
+            return
+        if qualities is None:
+            qualities = np.full(n, np.nan, dtype=np.float32)
+
+        with self._write_lock():
+            header, changes = self._open_header(create=True)
+            epoch, size, capacity = int(header[_EPOCH]), int(header[_SIZE]), int(header[_CAPACITY])
+            arrays = self._open_epoch(epoch, "r+")
+
+            # faces já lidas por um build concorrente não entram duas vezes
+            new = ~np.isin(np.asarray(face_ids, dtype=np.int64), arrays["face_ids"][:size])
+            if not new.any():
+                return
+            user_ids = np.asarray(user_ids, dtype=np.int64)[new]
+            face_ids = np.asarray(face_ids, dtype=np.int64)[new]
+            embeddings, qualities = embeddings[new], np.asarray(qualities, dtype=np.float32)[new]
+            n = embeddings.shape[0]
+
+            if size + n > capacity:
+                # cresce dobrando: novo epoch com cópia das linhas atuais
+                new_capacity = max(capacity * 2, size + n)
+                grown = self._open_epoch(epoch + 1, "w+", new_capacity)
+                for name, arr in arrays.items():
+                    if name != "size":
+                        grown[name][:size] = arr[:size]
+                arrays, epoch, capacity = grown, epoch + 1, new_capacity
+
+            end = size + n
+            arrays["vectors"][size:end] = embeddings
+            arrays["user_ids"][size:end] = user_ids
+            arrays["face_ids"][size:end] = face_ids
+            arrays["quality"][size:end] = qualities
+            for arr in arrays.values():
+                arr.flush()
+            arrays["size"][0] = end   # só depois das linhas: leitor nunca vê linha incompleta
+            arrays["size"].flush()
+
+            # 1 geração por usuário alterado (1 entrada no anel cada)
+            generation = int(header[_GENERATION])
+            for user_id in sorted(set(int(u) for u in user_ids)):
+                generation += 1
+                changes[generation % self.n_changes] = (generation, user_id)
+            old_epoch = int(header[_EPOCH])
+            header[_EPOCH], header[_CAPACITY] = epoch, capacity
+            header[_SIZE] = end
+            header[_GENERATION] = generation
+            header.flush()
+            if epoch != old_epoch:
+                self._remove_epoch(old_epoch)
+
+    # ------------------------------------------------------------
+    # LEITURA (workers)
+    # ------------------------------------------------------------
+    def attach(self) -> bool:
+        """Mapeia a galeria somente leitura (False se ainda não foi construída)."""
+        if not self.path or not os.path.exists(self._file("header.i64")):
+            return False
+        with self._lock:
+            self._header, self._changes = self._open_header()
+            self._seen_generation = int(self._header[_GENERATION])
+        self._view()
+        return True
+
+    def _view(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Views sem cópia das linhas válidas; reabre os mapas se o epoch mudou."""
+        with self._lock:
+            for attempt in range(_REMAP_RETRIES):
+                epoch = int(self._header[_EPOCH])
+                if epoch == self._epoch:
+                    break
+                try:
+                    self._arrays = self._open_epoch(epoch, "r")
+                    self._epoch = epoch
+                    break
+                except FileNotFoundError:
+                    # epoch trocado de novo e removido antes do open: header já aponta o novo
+                    if attempt == _REMAP_RETRIES - 1:
+                        raise
+            arrays = self._arrays
+        size = min(int(arrays["size"][0]), arrays["user_ids"].shape[0])
+        return (arrays["vectors"][:size], arrays["user_ids"][:size],
+                arrays["face_ids"][:size], arrays["quality"][:size])
+
+    def generation(self) -> int:
+        return int(self._header[_GENERATION]) if self.attached else 0
+
+    def changed_users(self) -> Optional[Set[int]]:
+        """
+        Usuários alterados desde a última chamada neste worker.
+        None → alterações demais (anel sobrescrito) ou rebuild: invalidar tudo.
+        """
+        if not self.attached:
+            return set()
+        with self._lock:
+            current = int(self._header[_GENERATION])
+            seen, self._seen_generation = self._seen_generation, current
+        if current == seen:
+            return set()
+        if current - seen > self.n_changes:
+            return None
+        changes = np.asarray(self._changes)
+        recent = changes[(changes[:, 0] > seen) & (changes[:, 0] <= current)]
+        if recent.shape[0] < current - seen:
+            return None   # gerações sem registro (rebuild limpa o anel)
+        return set(int(u) for u in recent[:, 1])
+
+    def user_embeddings(self, user_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(embeddings, qualidades) do usuário — cópia pequena, só as linhas dele."""
+        vectors, user_ids, _, quality = self._view()
+        rows = np.flatnonzero(user_ids == user_id)
+        if rows.size == 0:
+            return None
+        return np.asarray(vectors[rows]), np.asarray(quality[rows])
+
+    def search(self, probe: np.ndarray, k: int = 5) -> List[dict]:
+        """Top-k por cosseno sobre a galeria inteira (mesmo contrato do gallery_index)."""
+        vectors, user_ids, face_ids, _ = self._view()
+        if vectors.shape[0] == 0:
+            return []
+        q = l2_normalize(probe).reshape(-1)
+        sims = vectors @ q
+        k = min(k, sims.size)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [
+            {
+                "user_id": int(user_ids[i]),
+                "face_id": int(face_ids[i]),
+                "score": float(sims[i]),
+            }
+            for i in top
+        ]
+
+    def stats(self) -> dict:
+        if not self.attached:
+            return {"attached": False, "path": self.path}
+        vectors, _, _, _ = self._view()
+        return {
+            "attached": True,
+            "path": self.path,
+            "faces": int(vectors.shape[0]),
+            "capacity": int(self._header[_CAPACITY]),
+            "epoch": int(self._header[_EPOCH]),
+            "generation": int(self._header[_GENERATION]),
+            "mapped_bytes": int(sum(a.nbytes for a in self._arrays.values())),
+        }
+
+
+# Instância global: attach() na subida se GALLERY_STORE_PATH existir
+shared_gallery = SharedGallery()
+
+
+def sync_embedding_cache():
+    """Invalida no cache deste worker os usuários alterados por qualquer worker."""
+    changed = shared_gallery.changed_users()
+    if changed is None:
+        embedding_cache.clear()
+        return
+    for user_id in changed:
+        embedding_cache.invalidate(user_id)
+
+
+@on_enrollment
+def _append_on_enrollment(user_id: int, faces):
+    """Novas faces vão para a galeria compartilhada (visível a todos os workers)."""
+    if not shared_gallery.attached or not faces:
+        return
+    embs = decode_embeddings(blob for _, blob, _ in faces)
+    if embs is None:
+        return
+    # mesma qualidade do banco → template ponderado igual ao de get_user_embeddings
+    qualities = [np.nan if q is None else q for _, _, q in faces]
+    shared_gallery.append([user_id] * len(embs), [face_id for face_id, _, _ in faces], embs, qualities)
+
+
+if __name__ == "__main__":
+    # Uso (na pasta backend/): python -m app.services.shared_gallery --path /dev/shm/gallery
+    import argparse
+    from app.data.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Constrói a galeria compartilhada a partir da tabela faces.")
+    parser.add_argument("--path", default=GALLERY_STORE_PATH or "gallery_store")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = SharedGallery(args.path).build(db)
+    finally:
+        db.close()
+    print(f"Galeria salva em {args.path}: {total} faces")
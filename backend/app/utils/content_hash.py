@@ -0,0 +1,38 @@
+import hashlib
+
+import cv2
+import numpy as np
+
+
+# ============================================================
+# HASH DE CONTEÚDO (BLAKE2b)
+# ------------------------------------------------------------
+# Identifica bytes idênticos (reenvio do mesmo arquivo): chave
+# do cache de probes na verificação e deduplicação do cadastro.
+# 128 bits em hex.
+# ============================================================
+
+CONTENT_HASH_BYTES = 16
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=CONTENT_HASH_BYTES).hexdigest()
+
+
+# ============================================================
+# HASH PERCEPTUAL (dHash 64 bits)
+# ------------------------------------------------------------
+# Gradiente horizontal de uma miniatura 9x8 em cinza: sobrevive a
+# recompressão JPEG e redimensionamento. Cópias re-encodadas ficam
+# a poucos bits de distância (Hamming); fotos diferentes, ~32.
+# ============================================================
+
+def perceptual_hash(img: np.ndarray) -> str:
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
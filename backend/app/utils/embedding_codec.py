@@ -0,0 +1,47 @@
+import numpy as np
+from typing import Iterable, Optional
+
+
+# ============================================================
+# CODEC DE EMBEDDINGS (BYTEA)
+# ------------------------------------------------------------
+# Embeddings são gravados como 512 float32 little-endian
+# (2 KB por face), já normalizados (L2) na escrita.
+# A leitura monta a matriz Nx512 direto com np.frombuffer,
+# sem conversão elemento a elemento.
+# ============================================================
+
+EMBEDDING_DIM = 512
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def l2_normalize(v: np.ndarray) -> np.ndarray:
+    """Normaliza vetor (ou linhas de uma matriz) pela norma L2."""
+    v = np.asarray(v, dtype=np.float32)
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / (norm + 1e-10)
+
+
+def encode_embedding(vec) -> bytes:
+    """Vetor de 512 floats → bytes float32 little-endian normalizados."""
+    vec = l2_normalize(np.asarray(vec, dtype=np.float32).reshape(-1))
+    return vec.astype(EMBEDDING_DTYPE, copy=False).tobytes()
+
+
+def decode_embedding(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """Bytes de um embedding → vetor float32 (view somente leitura)."""
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE).astype(np.float32, copy=False)
+
+
+def decode_embeddings(blobs: Iterable[Optional[bytes]]) -> Optional[np.ndarray]:
+    """Vários blobs → matriz contígua Nx512 float32 (None se vazio)."""
+    blobs = [bytes(b) for b in blobs if b is not None]
+    if not blobs:
+        return None
+    return (
+        np.frombuffer(b"".join(blobs), dtype=EMBEDDING_DTYPE)
+        .reshape(-1, EMBEDDING_DIM)
+        .astype(np.float32, copy=False)
+    )
@@ -0,0 +1,123 @@
+import os
+import struct
+from typing import AsyncIterator, List, NamedTuple, Tuple
+
+
+# ============================================================
+# LOTE BINÁRIO DE FRAMES (application/x-face-frames)
+# ------------------------------------------------------------
+# Alternativa compacta ao multipart do liveness: um único corpo
+#
+#   header (16 bytes, little-endian)
+#     magic    4s   b"FRMB"
+#     version  u8   1
+#     stride   u8   cliente envia 1 a cada `stride` frames capturados
+#     quality  u8   qualidade JPEG usada pelo cliente (0-100)
+#     reserved u8
+#     width    u16  resolução dos frames enviados
+#     height   u16
+#     count    u32  frames no corpo
+#   frames
+#     length   u32  + `length` bytes de JPEG, `count` vezes
+#
+# O servidor lê o corpo em streaming (request.stream()) e descarta
+# os frames que o FRAME_SKIP pularia sem nunca juntar os bytes deles;
+# se o cliente já amostrou (stride), o skip do servidor é reduzido
+# na mesma proporção.
+# ============================================================
+
+FRAME_BATCH_MEDIA_TYPE = "application/x-face-frames"
+FRAME_BATCH_MAX_FRAMES = int(os.getenv("FRAME_BATCH_MAX_FRAMES", "120"))
+FRAME_BATCH_MAX_FRAME_BYTES = int(os.getenv("FRAME_BATCH_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+FRAME_BATCH_MAX_SIDE = int(os.getenv("FRAME_BATCH_MAX_SIDE", "1920"))
+
+_MAGIC = b"FRMB"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBBBHHI")
+_LENGTH = struct.Struct("<I")
+
+
+class FrameBatchError(ValueError):
+    """Corpo fora do formato (ou além dos limites configurados)."""
+
+
+class FrameBatchHeader(NamedTuple):
+    width: int
+    height: int
+    count: int
+    stride: int
+    quality: int
+
+
+def encode_frame_batch(frames: List[bytes], width: int, height: int,
+                       stride: int = 1, quality: int = 0) -> bytes:
+    """Monta o corpo (clientes Python, testes e benchmarks)."""
+    parts = [_HEADER.pack(_MAGIC, _VERSION, stride, quality, 0, width, height, len(frames))]
+    for frame in frames:
+        parts.append(_LENGTH.pack(len(frame)))
+        parts.append(frame)
+    return b"".join(parts)
+
+
+class _ChunkReader:
+    """Leitura exata / descarte sobre os chunks do corpo, sem guardar o que é pulado."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buf = bytearray()
+
+    async def _fill(self):
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            raise FrameBatchError("Corpo truncado.")
+        self._buf += chunk
+
+    async def read(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            await self._fill()
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+    async def skip(self, n: int):
+        while n > 0:
+            if not self._buf:
+                await self._fill()
+            take = min(n, len(self._buf))
+            del self._buf[:take]
+            n -= take
+
+
+def _parse_header(raw: bytes) -> FrameBatchHeader:
+    magic, version, stride, quality, _, width, height, count = _HEADER.unpack(raw)
+    if magic != _MAGIC or version != _VERSION:
+        raise FrameBatchError("Formato de lote de frames não reconhecido.")
+    if count > FRAME_BATCH_MAX_FRAMES:
+        raise FrameBatchError(f"Lote com {count} frames (máximo {FRAME_BATCH_MAX_FRAMES}).")
+    if max(width, height) > FRAME_BATCH_MAX_SIDE:
+        raise FrameBatchError(f"Resolução {width}x{height} acima de {FRAME_BATCH_MAX_SIDE}px.")
+    return FrameBatchHeader(width, height, count, max(stride, 1), quality)
+
+
+async def read_frame_batch(chunks: AsyncIterator[bytes],
+                           frame_skip: int) -> Tuple[FrameBatchHeader, List[bytes], int]:
+    """
+    Lê o lote mantendo 1 a cada max(1, frame_skip // stride) frames.
+    Retorna (header, frames mantidos, quantidade descartada).
+    """
+    reader = _ChunkReader(chunks)
+    header = _parse_header(await reader.read(_HEADER.size))
+    keep_every = max(1, frame_skip // header.stride)
+
+    frames, skipped = [], 0
+    for index in range(header.count):
+        (length,) = _LENGTH.unpack(await reader.read(_LENGTH.size))
+        if length > FRAME_BATCH_MAX_FRAME_BYTES:
+            raise FrameBatchError(f"Frame {index} com {length} bytes (máximo {FRAME_BATCH_MAX_FRAME_BYTES}).")
+        if index % keep_every:
+            await reader.skip(length)
+            skipped += 1
+        else:
+            frames.append(await reader.read(length))
+    return header, frames, skipped
@@ -0,0 +1,103 @@
+import os
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# ============================================================
+# DECODE REDUZIDO DE IMAGENS (JPEG DCT SCALING)
+# ------------------------------------------------------------
+# Decodificar um JPEG 1080p inteiro para depois o detector
+# reduzir para 160/640 px desperdiça CPU e memória.
+#
+# Aqui o cabeçalho (SOF do JPEG / IHDR do PNG) é lido sem
+# decodificar a imagem, e escolhe-se o maior fator 1/2, 1/4, 1/8
+# (cv2.IMREAD_REDUCED_COLOR_*, que no JPEG escala direto no
+# domínio DCT) que ainda mantém o lado maior >= long_side.
+#
+# decode_image() devolve (img, scale): coordenadas na imagem
+# decodificada * scale = coordenadas na imagem original.
+# ============================================================
+
+DECODE_LONG_SIDE_LIVENESS = int(os.getenv("DECODE_LONG_SIDE_LIVENESS", "640"))
+DECODE_LONG_SIDE_ENROLLMENT = int(os.getenv("DECODE_LONG_SIDE_ENROLLMENT", "1280"))
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Marcadores SOF (start of frame) que trazem altura/largura
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(largura, altura) lidas do cabeçalho JPEG/PNG; None se desconhecido."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:           # preenchimento
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS and i + 9 <= n:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def reduction_factor(size: Optional[Tuple[int, int]], long_side: int) -> int:
+    """Maior fator (8/4/2/1) que mantém o lado maior >= long_side."""
+    if size is None or long_side <= 0:
+        return 1
+    longest = max(size)
+    for factor, _ in _REDUCED_FLAGS:
+        if longest // factor >= long_side:
+            return factor
+    return 1
+
+
+def decode_image(data: bytes, long_side: int = 0) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Decodifica em BGR já reduzido quando possível.
+    Retorna (img, scale) com scale = tamanho original / decodificado.
+    """
+    arr = np.frombuffer(data, np.uint8)
+    size = read_image_size(data)
+    factor = reduction_factor(size, long_side)
+    if factor == 1:
+        return cv2.imdecode(arr, cv2.IMREAD_COLOR), 1.0
+
+    flag = dict(_REDUCED_FLAGS)[factor]
+    img = cv2.imdecode(arr, flag)
+    if img is None:
+        return None, 1.0
+    # escala real (o decoder arredonda para cima em dimensões ímpares)
+    scale = max(size) / max(img.shape[:2])
+    return img, scale
+
+
+def scale_face(face, scale: float):
+    """Remapeia bbox/kps de uma face detectada para a imagem original."""
+    if scale != 1.0:
+        face.bbox = face.bbox * scale
+        if getattr(face, "kps", None) is not None:
+            face.kps = face.kps * scale
+    return face
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import uuid
+import logging
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+
+# ============================================================
+# CONTEXTO DA REQUISIÇÃO + LOG ESTRUTURADO (JSON)
+# ------------------------------------------------------------
+# Cada requisição HTTP/WebSocket recebe um request_id (cabeçalho
+# X-Request-ID do cliente ou gerado aqui), devolvido na resposta e
+# incluído em todas as linhas de log emitidas durante ela — inclusive
+# nas threads do inference_executor, que copiam o contexto.
+#
+# Ao final, uma linha "request" com a duração e o tempo somado por
+# etapa (stage_timer em app/services/metrics.py): mostra se a chamada
+# lenta veio do detector ou do Postgres.
+# ============================================================
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("face_api")
+
+_current: ContextVar[Optional[dict]] = ContextVar("face_request", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    ctx = _current.get()
+    return ctx["id"] if ctx else None
+
+
+def add_stage(stage: str, seconds: float):
+    """Soma o tempo da etapa na requisição atual (sem requisição: ignora)."""
+    ctx = _current.get()
+    if ctx is not None:
+        stages = ctx["stages"]
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        request_id = current_request_id()
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI: request_id, log de fim de requisição e callback de métricas."""
+
+    def __init__(self, app, on_finish: Optional[Callable] = None):
+        self.app = app
+        self.on_finish = on_finish
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        ctx = {"id": request_id, "stages": {}}
+        token = _current.set(ctx)
+        status = {"code": "ws" if scope["type"] == "websocket" else 500}
+        t0 = time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - t0
+            # caminho com o prefixo do include_router (versões recentes do
+            # FastAPI guardam em scope["route"] só o caminho do APIRouter)
+            effective = (scope.get("fastapi") or {}).get("effective_route_context")
+            route_path = (getattr(effective, "path", None)
+                          or getattr(scope.get("route"), "path", None) or "unmatched")
+            method = scope.get("method", "WS")
+            logger.info("request", extra={"fields": {
+                "method": method,
+                "path": scope.get("path"),
+                "route": route_path,
+                "status": status["code"],
+                "duration_ms": round(elapsed * 1000, 2),
+                "stages_ms": {k: round(v * 1000, 2) for k, v in ctx["stages"].items()},
+            }})
+            if self.on_finish is not None:
+                self.on_finish(method, route_path, status["code"], elapsed)
+            _current.reset(token)
@@ -0,0 +1,81 @@
+# benchmarks/bench_ann_recall.py
+# ============================================================
+# BENCHMARK: RECALL x LATÊNCIA DO ÍNDICE IVF vs BUSCA EXATA
+# ------------------------------------------------------------
+# Uso (na pasta backend/):
+#     python -m benchmarks.bench_ann_recall --faces 200000 --queries 200
+#
+# Gera uma galeria sintética (identidades com várias fotos
+# ruidosas), constrói o IVF, salva/recarrega via memmap e mede
+# recall@k e latência média para vários nprobe.
+# ============================================================
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+from app.utils.embedding_codec import EMBEDDING_DIM, l2_normalize
+
+
+def synthetic_gallery(n_faces: int, faces_per_user: int, noise: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_faces // faces_per_user)
+    centers = l2_normalize(rng.standard_normal((n_users, EMBEDDING_DIM)).astype(np.float32))
+    user_ids = np.repeat(np.arange(n_users), faces_per_user)[:n_faces]
+    vectors = l2_normalize(centers[user_ids] + noise * rng.standard_normal((n_faces, EMBEDDING_DIM)).astype(np.float32) / np.sqrt(EMBEDDING_DIM))
+    return centers, vectors, user_ids
+
+
+def exact_top_k(vectors: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    sims = vectors @ q
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces", type=int, default=100000)
+    parser.add_argument("--faces-per-user", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--noise", type=float, default=0.8)
+    args = parser.parse_args()
+
+    centers, vectors, user_ids = synthetic_gallery(args.faces, args.faces_per_user, args.noise)
+    face_ids = np.arange(args.faces)
+
+    t0 = time.perf_counter()
+    index = IVFIndex().build(vectors, user_ids, face_ids, nlist=args.nlist)
+    print(f"build: {time.perf_counter() - t0:.2f}s, nlist={index.centroids.shape[0]}")
+
+    rng = np.random.default_rng(1)
+    probe_users = rng.integers(0, centers.shape[0], size=args.queries)
+    queries = l2_normalize(centers[probe_users] + args.noise * rng.standard_normal((args.queries, EMBEDDING_DIM)).astype(np.float32) / np.sqrt(EMBEDDING_DIM))
+
+    t0 = time.perf_counter()
+    exact = [set(face_ids[exact_top_k(vectors, q, args.k)]) for q in queries]
+    exact_ms = (time.perf_counter() - t0) / args.queries * 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        mapped = IVFIndex().load(tmp, mmap=True)
+
+        print(f"{'nprobe':>7} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+        print(f"{'exact':>7} {1.0:>9.4f} {exact_ms:>9.3f} {1.0:>8.1f}")
+        for nprobe in args.nprobe:
+            hits = 0
+            t0 = time.perf_counter()
+            results = [mapped.search(q, k=args.k, nprobe=nprobe) for q in queries]
+            ms = (time.perf_counter() - t0) / args.queries * 1000
+            for got, truth in zip(results, exact):
+                hits += len({r["face_id"] for r in got} & truth)
+            recall = hits / (args.k * args.queries)
+            print(f"{nprobe:>7} {recall:>9.4f} {ms:>9.3f} {exact_ms / ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_decode.py
+# ============================================================
+# BENCHMARK: DECODE COMPLETO vs DECODE REDUZIDO (DCT)
+# ------------------------------------------------------------
+# Uso (na pasta backend/):
+#     python -m benchmarks.bench_decode [--width 1920 --height 1080]
+#
+# Gera um JPEG sintético (ou usa --image) e compara tempo e
+# memória de cv2.IMREAD_COLOR com app.utils.image_decode.
+# ============================================================
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app.utils.image_decode import (
+    DECODE_LONG_SIDE_ENROLLMENT,
+    DECODE_LONG_SIDE_LIVENESS,
+    decode_image,
+    read_image_size,
+)
+
+
+def synthetic_jpeg(width: int, height: int, quality: int = 90) -> bytes:
+    rng = np.random.default_rng(0)
+    img = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8),
+                     (width, height), interpolation=cv2.INTER_CUBIC)
+    cv2.circle(img, (width // 2, height // 2), min(width, height) // 4, (180, 150, 120), -1)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def timed(fn, repeat: int):
+    fn()  # aquecimento
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="JPEG real em vez do sintético")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_jpeg(args.width, args.height)
+
+    print(f"imagem: {read_image_size(data)}, {len(data) / 1024:.0f} KB")
+    print(f"{'modo':<22} {'ms':>8} {'shape':>16} {'MB':>7}")
+
+    ms, img = timed(lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), args.repeat)
+    print(f"{'IMREAD_COLOR':<22} {ms:>8.2f} {str(img.shape):>16} {img.nbytes / 2**20:>7.2f}")
+
+    for name, long_side in (("liveness", DECODE_LONG_SIDE_LIVENESS), ("enrollment", DECODE_LONG_SIDE_ENROLLMENT)):
+        ms, (img, scale) = timed(lambda: decode_image(data, long_side), args.repeat)
+        label = f"{name} (>= {long_side})"
+        print(f"{label:<22} {ms:>8.2f} {str(img.shape):>16} {img.nbytes / 2**20:>7.2f}  scale={scale:.2f}")
+
+
+if __name__ == "__main__":
+    main()
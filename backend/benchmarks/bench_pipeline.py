@@ -0,0 +1,340 @@
+# benchmarks/bench_pipeline.py
+# ============================================================
+# BENCHMARK: ETAPAS DO PIPELINE FACIAL (HEADLESS, JSON)
+# ------------------------------------------------------------
+# Uso (na pasta backend/):
+#     python -m benchmarks.bench_pipeline --out bench.json
+#     python -m benchmarks.bench_pipeline --out novo.json --compare bench.json
+#
+# Sem câmera e sem Postgres: imagens sintéticas fixas (seed) ou
+# --image, e get_user_embeddings contra um SQLite em memória.
+#
+#   decode          liveness / enrollment em 640x480 e 1920x1080
+#   detection       um caso por --det-sizes
+#   recognition     embed_crops por --batch-sizes (ms por face)
+#   matching        match_similarity contra galerias --gallery-sizes
+#   db_fetch        get_user_embeddings: frio (banco) e quente (cache)
+#   precision       int8 vs fp32 (MODEL_PRECISION): tempo e, só com
+#                   fotos reais (--faces-dir), perda de acurácia —
+#                   cosseno entre embeddings, diferença das similaridades
+#                   entre pares e concordância da decisão no
+#                   FACE_MATCH_THRESHOLD; sem rostos, accuracy_delta sai
+#                   como "skipped"
+#
+# Sem os arquivos ONNX, detection/recognition saem como "skipped".
+# --compare marca como regressão o caso com p50 acima de
+# (1 + --tolerance) x o p50 de referência e sai com código 1.
+# ============================================================
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_decode import synthetic_jpeg
+from app.utils.embedding_codec import EMBEDDING_DIM, encode_embedding, l2_normalize
+from app.utils.image_decode import (
+    DECODE_LONG_SIDE_ENROLLMENT,
+    DECODE_LONG_SIDE_LIVENESS,
+    decode_image,
+)
+
+
+def measure(fn, repeat: int, per_call: int = 1) -> dict:
+    """Tempo por chamada em ms (após 1 aquecimento); per_call divide pelo nº de itens."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000 / per_call)
+    times = np.asarray(times)
+    return {
+        "ms_mean": float(times.mean()),
+        "ms_p50": float(np.percentile(times, 50)),
+        "ms_p95": float(np.percentile(times, 95)),
+        "ms_min": float(times.min()),
+        "repeat": repeat,
+    }
+
+
+# ------------------------------------------------------------
+# ETAPAS
+# ------------------------------------------------------------
+def bench_decode(images: dict, repeat: int) -> dict:
+    out = {}
+    for name, data in images.items():
+        for use_case, long_side in (("liveness", DECODE_LONG_SIDE_LIVENESS),
+                                    ("enrollment", DECODE_LONG_SIDE_ENROLLMENT)):
+            out[f"{name}/{use_case}"] = measure(lambda: decode_image(data, long_side), repeat)
+    return out
+
+
+def bench_detection(img: np.ndarray, det_sizes, repeat: int) -> dict:
+    from app.services.model_registry import model_registry
+
+    analyzer = model_registry.analyzer("liveness")
+    return {
+        f"det_{size}": measure(lambda: analyzer.detect(img, det_size=(size, size)), repeat)
+        for size in det_sizes
+    }
+
+
+def bench_recognition(batch_sizes, repeat: int) -> dict:
+    from app.services.model_registry import model_registry
+
+    analyzer = model_registry.analyzer("liveness")
+    rng = np.random.default_rng(0)
+    out = {}
+    for bs in batch_sizes:
+        crops = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(bs)]
+        out[f"batch_{bs}"] = measure(lambda: analyzer.embed_crops(crops, batch_size=bs), repeat, per_call=bs)
+    return out
+
+
+def bench_matching(gallery_sizes, repeat: int) -> dict:
+    from app.services.face_liveness_service import FaceLivenessService
+
+    rng = np.random.default_rng(0)
+    probe = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    out = {}
+    for n in gallery_sizes:
+        gallery = np.empty((n, EMBEDDING_DIM), dtype=np.float32)
+        for start in range(0, n, 65536):   # gera em blocos (1M x 512 = 2 GB)
+            block = rng.standard_normal((min(65536, n - start), EMBEDDING_DIM)).astype(np.float32)
+            gallery[start:start + block.shape[0]] = l2_normalize(block)
+        out[f"gallery_{n}"] = measure(lambda: FaceLivenessService.match_similarity(gallery, probe), repeat)
+        del gallery
+    return out
+
+
+def bench_db_fetch(faces_per_user, repeat: int) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.data.database import Base
+    from app.model.face import Face
+    from app.model.user import User
+    from app.services.embedding_cache import embedding_cache
+    from app.services.face_liveness_service import get_user_embeddings
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rng = np.random.default_rng(0)
+
+    out = {}
+    try:
+        for n in faces_per_user:
+            user = User(name=f"bench {n}", email=f"bench{n}@example.com")
+            db.add(user)
+            db.flush()
+            db.add_all([
+                Face(user_id=user.id, source="BENCH", quality=float(q),
+                     embedding=encode_embedding(rng.standard_normal(EMBEDDING_DIM)))
+                for q in rng.uniform(0.3, 1.0, n)
+            ])
+            db.commit()
+
+            def cold():
+                embedding_cache.invalidate(user.id)
+                get_user_embeddings(db, user.id)
+
+            out[f"faces_{n}/cold"] = measure(cold, repeat)
+            out[f"faces_{n}/warm"] = measure(lambda: get_user_embeddings(db, user.id), repeat)
+    finally:
+        db.close()
+        engine.dispose()
+    return out
+
+
+def _noise_crops(limit: int = 16):
+    """Recortes 112x112 de ruído: servem só para medir tempo."""
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(limit)]
+
+
+def _face_crops(faces_dir, limit: int = 64):
+    """Recortes alinhados 112x112: maior face de cada foto de faces_dir."""
+    from app.services.model_registry import model_registry
+
+    analyzer = model_registry.analyzer("enrollment")
+    crops = []
+    for name in sorted(os.listdir(faces_dir))[:limit]:
+        with open(os.path.join(faces_dir, name), "rb") as f:
+            img, _ = decode_image(f.read(), DECODE_LONG_SIDE_ENROLLMENT)
+        faces = analyzer.detect(img) if img is not None else []
+        if faces:
+            face = max(faces, key=lambda f: f.bbox[2] - f.bbox[0])
+            crops.append(analyzer.align(img, face))
+    return crops
+
+
+def bench_precision(img: np.ndarray, faces_dir, repeat: int) -> dict:
+    """
+    Tempo int8 x fp32 sempre; perda de acurácia só com rostos reais
+    (--faces-dir) — embeddings de ruído não dizem nada sobre reconhecimento.
+    """
+    from app.services.face_liveness_service import FACE_MATCH_THRESHOLD
+    from app.services.model_registry import ModelRegistry
+
+    faces = _face_crops(faces_dir) if faces_dir else []
+    crops = (faces or _noise_crops())[:16]   # só tempo
+    out, embs = {}, {}
+    for precision in ("fp32", "int8"):
+        analyzer = ModelRegistry(precision=precision).analyzer("liveness")
+        if faces:
+            embs[precision] = l2_normalize(analyzer.embed_crops(faces))
+        out[f"recognition/{precision}"] = measure(
+            lambda: analyzer.embed_crops(crops, batch_size=16), repeat, per_call=len(crops)
+        )
+        out[f"detection/{precision}"] = measure(lambda: analyzer.detect(img), repeat)
+
+    for task in ("recognition", "detection"):
+        out[f"{task}/speedup"] = {
+            "int8_vs_fp32": out[f"{task}/fp32"]["ms_p50"] / max(out[f"{task}/int8"]["ms_p50"], 1e-9)
+        }
+
+    if not faces_dir:
+        out["accuracy_delta"] = {"skipped": "sem --faces-dir (acurácia exige fotos reais)"}
+        return out
+    if not faces:
+        out["accuracy_delta"] = {"skipped": f"nenhum rosto detectado em {faces_dir}"}
+        return out
+
+    fp32, int8 = embs["fp32"], embs["int8"]
+    cos = np.sum(fp32 * int8, axis=1)
+    pairs = np.triu_indices(len(faces), k=1)
+    sims_fp32, sims_int8 = (fp32 @ fp32.T)[pairs], (int8 @ int8.T)[pairs]
+    diff = np.abs(sims_fp32 - sims_int8)
+    agree = (sims_fp32 >= FACE_MATCH_THRESHOLD) == (sims_int8 >= FACE_MATCH_THRESHOLD)
+    out["accuracy_delta"] = {
+        "faces": len(faces),
+        "embedding_cosine_mean": float(cos.mean()),
+        "embedding_cosine_min": float(cos.min()),
+        # com um único rosto não há pares
+        "pair_similarity_abs_diff_mean": float(diff.mean()) if diff.size else None,
+        "pair_similarity_abs_diff_max": float(diff.max()) if diff.size else None,
+        "decision_agreement": float(agree.mean()) if agree.size else None,
+    }
+    return out
+
+
+# ------------------------------------------------------------
+# RESULTADO / COMPARAÇÃO
+# ------------------------------------------------------------
+def environment() -> dict:
+    try:
+        import onnxruntime
+        ort = onnxruntime.__version__
+    except Exception:
+        ort = None
+    from app.services.model_registry import (
+        MODEL_PACK,
+        MODEL_PRECISIONS,
+        ORT_INTER_OP_THREADS,
+        ORT_INTRA_OP_THREADS,
+    )
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "onnxruntime": ort,
+        "model_pack": MODEL_PACK,
+        "model_precision": MODEL_PRECISIONS,
+        "ort_threads": {"intra_op": ORT_INTRA_OP_THREADS, "inter_op": ORT_INTER_OP_THREADS},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for stage, cases in current["results"].items():
+        for case, stats in cases.items():
+            ref = baseline.get("results", {}).get(stage, {}).get(case)
+            if not ref or "ms_p50" not in ref or "ms_p50" not in stats:
+                continue
+            ratio = stats["ms_p50"] / max(ref["ms_p50"], 1e-9)
+            if ratio > 1 + tolerance:
+                regressions.append({"stage": stage, "case": case, "baseline_ms": ref["ms_p50"],
+                                    "current_ms": stats["ms_p50"], "ratio": ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench_pipeline.json")
+    parser.add_argument("--image", help="JPEG real (com rosto) em vez do sintético")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--det-sizes", type=int, nargs="+", default=[96, 160, 320, 640])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    parser.add_argument("--faces-per-user", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--faces-dir", help="fotos reais de rostos para a etapa precision")
+    parser.add_argument("--stages", nargs="+",
+                        default=["decode", "detection", "recognition", "matching", "db_fetch"],
+                        help="inclua 'precision' para comparar int8 x fp32")
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            images = {"image": f.read()}
+    else:
+        images = {"640x480": synthetic_jpeg(640, 480), "1920x1080": synthetic_jpeg(1920, 1080)}
+    frame, _ = decode_image(next(iter(images.values())), DECODE_LONG_SIDE_LIVENESS)
+
+    stages = {
+        "decode": lambda: bench_decode(images, args.repeat),
+        "detection": lambda: bench_detection(frame, args.det_sizes, args.repeat),
+        "recognition": lambda: bench_recognition(args.batch_sizes, args.repeat),
+        "matching": lambda: bench_matching(args.gallery_sizes, args.repeat),
+        "db_fetch": lambda: bench_db_fetch(args.faces_per_user, args.repeat),
+        "precision": lambda: bench_precision(frame, args.faces_dir, args.repeat),
+    }
+
+    report = {"environment": environment(), "results": {}}
+    for name in args.stages:
+        t0 = time.perf_counter()
+        try:
+            report["results"][name] = stages[name]()
+        except Exception as e:   # ex.: modelos ONNX ausentes
+            report["results"][name] = {"skipped": f"{type(e).__name__}: {e}"}
+        print(f"{name}: {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    for stage, cases in report["results"].items():
+        if "skipped" in cases:
+            print(f"{stage:<12} skipped ({cases['skipped']})")
+            continue
+        for case, stats in cases.items():
+            if "ms_p50" in stats:
+                print(f"{stage:<12} {case:<28} p50={stats['ms_p50']:>9.3f} ms  p95={stats['ms_p95']:>9.3f} ms")
+            else:
+                print(f"{stage:<12} {case:<28} {json.dumps(stats)}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        for r in report["regressions"]:
+            print(f"REGRESSÃO {r['stage']}/{r['case']}: {r['baseline_ms']:.3f} → "
+                  f"{r['current_ms']:.3f} ms (x{r['ratio']:.2f})")
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"resultado salvo em {args.out}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
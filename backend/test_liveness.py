@@ -7,7 +7,7 @@ from datetime import datetime
 from app.data.database import get_db, Base, engine
 from app.model.user import User
 from app.model.face import Face
-from app.services.face_liveness_service import check_face_liveness_visual
+from app.services.face_challenge_service import check_face_liveness_visual
 
 
 def log_performance(result, elapsed_time, mem_diff_mb, cpu_user, cpu_system):
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+# Antes de qualquer import de app.*: SQLite descartável no lugar do
+# Postgres e sem carregar/aquecer modelos ONNX na subida.
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.gettempdir()}/face_tests_{os.getpid()}.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["MODEL_PRELOAD"] = "0"
+os.environ["MODEL_WARMUP"] = "0"
+os.environ["ANN_INDEX_PATH"] = ""
+os.environ["GALLERY_STORE_PATH"] = ""
+os.environ["STARTUP_RETRIES"] = "1"
+
+import numpy as np
+import pytest
+
+from app.utils.embedding_codec import EMBEDDING_DIM, l2_normalize
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def random_embeddings(rng):
+    """n embeddings normalizados (float32) reprodutíveis."""
+    def make(n: int) -> np.ndarray:
+        return l2_normalize(rng.standard_normal((n, EMBEDDING_DIM)))
+    return make
+
+
+@pytest.fixture
+def db():
+    """Sessão síncrona num banco SQLite limpo a cada teste."""
+    from app.data.database import Base, SessionLocal, engine
+    from app.model import face, face_liveness_state, user  # noqa: F401  (registra as tabelas)
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def enroll(db):
+    """Cadastra um usuário com os embeddings dados; retorna (user_id, face_ids)."""
+    from app.model.face import Face
+    from app.model.user import User
+    from app.utils.embedding_codec import encode_embedding
+
+    def make(embeddings: np.ndarray, name: str = None):
+        count = db.query(User).count()
+        user = User(name=name or f"user {count}", email=f"user{count}@example.com")
+        db.add(user)
+        db.flush()
+        faces = [Face(user_id=user.id, source="TEST", embedding=encode_embedding(e)) for e in embeddings]
+        db.add_all(faces)
+        db.commit()
+        return user.id, [f.face_id for f in faces]
+    return make
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
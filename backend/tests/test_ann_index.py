@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex
+from app.utils.embedding_codec import l2_normalize
+
+
+def clustered(rng, n_clusters: int, per_cluster: int, spread: float = 0.3) -> np.ndarray:
+    """Galeria com estrutura (vários rostos por pessoa), como a real."""
+    centers = rng.standard_normal((n_clusters, 512))
+    noise = rng.standard_normal((n_clusters, per_cluster, 512)) * spread
+    return l2_normalize((centers[:, None, :] + noise).reshape(-1, 512))
+
+
+def recall_at_k(index: IVFIndex, gallery: np.ndarray, probes: np.ndarray, k: int, nprobe: int) -> float:
+    found = 0
+    for probe in probes:
+        exact = set(np.argsort(-(gallery @ probe))[:k])
+        approx = {h["face_id"] for h in index.search(probe, k=k, nprobe=nprobe)}
+        found += len(exact & approx)
+    return found / (k * len(probes))
+
+
+@pytest.fixture
+def gallery(rng):
+    return clustered(rng, n_clusters=50, per_cluster=20)
+
+
+@pytest.fixture
+def probes(gallery, rng):
+    picks = rng.choice(len(gallery), size=20, replace=False)
+    return l2_normalize(gallery[picks] + 0.05 * rng.standard_normal((20, 512)))
+
+
+def build(gallery: np.ndarray, nlist: int = 32) -> IVFIndex:
+    n = len(gallery)
+    return IVFIndex(nprobe=4).build(gallery, np.arange(n) // 20, np.arange(n), nlist=nlist, n_iter=10)
+
+
+def test_recall_against_exact_search(gallery, probes):
+    index = build(gallery)
+    assert recall_at_k(index, gallery, probes, k=5, nprobe=4) >= 0.9
+    # todas as listas = busca exata
+    assert recall_at_k(index, gallery, probes, k=5, nprobe=32) == 1.0
+
+
+def test_pending_rows_are_searched_exactly(gallery, rng):
+    index = build(gallery)
+    new = clustered(rng, n_clusters=1, per_cluster=3)
+    index.add([999] * 3, [5000, 5001, 5002], new)
+    index.add([999], [5000], new[:1])          # repetido: ignorado
+
+    assert index.stats()["pending"] == 3
+    assert len(index) == len(gallery) + 3
+    best = index.search(new[1], k=1, nprobe=1)[0]
+    assert (best["user_id"], best["face_id"]) == (999, 5001)
+
+
+def test_save_load_keeps_results_and_max_face_id(gallery, probes, tmp_path):
+    index = build(gallery)
+    index.save(str(tmp_path))
+    loaded = IVFIndex(nprobe=4).load(str(tmp_path), mmap=True)
+
+    assert loaded.stats()["memory_mapped"]
+    assert loaded.max_face_id == len(gallery) - 1
+    for probe in probes[:5]:
+        assert loaded.search(probe, k=5) == index.search(probe, k=5)
+
+
+def test_catch_up_adds_faces_enrolled_after_build(db, enroll, random_embeddings):
+    embs = random_embeddings(40)
+    _, face_ids = enroll(embs[:30])
+    index = IVFIndex(nprobe=2).build_from_db(db, nlist=4)
+    assert index.max_face_id == max(face_ids)
+
+    # outro worker cadastra depois do build
+    late_user, late_faces = enroll(embs[30:])
+    assert index.search(embs[35], k=1)[0]["face_id"] != late_faces[5]
+
+    assert index.catch_up(db) == 10
+    assert index.catch_up(db) == 0          # nada novo
+    assert index.max_face_id == max(late_faces)
+    best = index.search(embs[35], k=1)[0]
+    assert (best["user_id"], best["face_id"]) == (late_user, late_faces[5])
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.face_liveness_service import EARLY_EXIT_BATCH, FaceLivenessService, face_app
+
+
+def jpeg() -> bytes:
+    ok, buf = cv2.imencode(".jpg", np.full((120, 160, 3), 128, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture
+def scripted(monkeypatch, random_embeddings):
+    """
+    1 face por frame, com embedding roteirizado na ordem de detecção:
+    embed (frame a frame) e align + embed_crops (lote) devolvem o mesmo
+    vetor, como o ArcFace faz para o mesmo recorte.
+    """
+    user = random_embeddings(1)
+    others = random_embeddings(12)
+    # mistura de acertos e erros para a parada antecipada ter o que decidir
+    script = [user[0] if i % 3 else others[i] for i in range(12)]
+    pending = []
+
+    def detect(img, det_size=None):
+        return [SimpleNamespace(bbox=np.array([20, 20, 100, 100], dtype=np.float32),
+                                det_score=0.9, emb=pending.pop(0))]
+
+    monkeypatch.setattr(face_app, "detect", detect)
+    monkeypatch.setattr(face_app, "embed", lambda img, face: face.emb)
+    monkeypatch.setattr(face_app, "align", lambda img, face: face.emb)
+    monkeypatch.setattr(face_app, "embed_crops",
+                        lambda crops, batch_size=32: np.stack(crops).astype(np.float32))
+
+    scores = []
+    match = FaceLivenessService.match_similarity
+    monkeypatch.setattr(FaceLivenessService, "match_similarity",
+                        staticmethod(lambda embs, emb: scores.append(match(embs, emb)) or scores[-1]))
+
+    def run(batch_size, early_exit):
+        pending[:] = script
+        scores.clear()
+        result = FaceLivenessService.process_batch_frames(
+            None, 1, [jpeg()] * len(script), batch_size=batch_size, early_exit=early_exit,
+            tracking=False, user_embs=user, frame_skip=1,
+        )
+        return result, list(scores)
+    return run
+
+
+VERDICT = ("same_person_batch", "matching_ratio", "average_similarity", "frames_analyzed", "early_exit")
+
+
+@pytest.mark.parametrize("early_exit", [False, True])
+@pytest.mark.parametrize("batch_size", [1, 4, 5, 16])
+def test_batched_matches_per_frame(scripted, batch_size, early_exit):
+    single, single_scores = scripted(0, early_exit)
+    batched, batched_scores = scripted(batch_size, early_exit)
+
+    if not early_exit:
+        assert batched_scores == pytest.approx(single_scores)
+    else:
+        # lote termina antes de checar o veredito: mesma sequência, talvez mais longa
+        assert batched_scores[:len(single_scores)] == pytest.approx(single_scores)
+    if not early_exit or batch_size == 1:
+        assert {k: batched[k] for k in VERDICT} == pytest.approx({k: single[k] for k in VERDICT})
+    assert batched["same_person_batch"] == single["same_person_batch"]
+
+
+def test_effective_batch_size_is_reported(scripted):
+    assert scripted(16, False)[0]["batch_size"] == 16
+    assert scripted(16, True)[0]["batch_size"] == min(16, EARLY_EXIT_BATCH)
+    assert scripted(0, True)[0]["batch_size"] == 0
@@ -0,0 +1,116 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.model.face import Face
+from app.services import bulk_enrollment, face_capture_service
+from app.services.bulk_enrollment import bulk_enroll, iter_chunks, write_rows
+
+
+@pytest.fixture
+def dataset(tmp_path, enroll):
+    """5 fotos distintas de 2 usuários + manifesto (uma entrada aponta para arquivo inexistente)."""
+    a, _ = enroll(np.empty((0, 512)))
+    b, _ = enroll(np.empty((0, 512)))
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    entries = []
+    for i in range(5):
+        img = np.full((120, 160, 3), 40 + 40 * i, dtype=np.uint8)
+        cv2.imwrite(str(photos / f"{i}.jpg"), img)
+        entries.append((f"{i}.jpg", a if i < 3 else b))
+    entries.append(("missing.jpg", b))
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("file,user_id\n" + "".join(f"{f},{u}\n" for f, u in entries))
+    return SimpleNamespace(source=str(photos), manifest=str(manifest), users=(a, b),
+                           checkpoint=str(tmp_path / "bulk.json"), errors=str(tmp_path / "errors.jsonl"))
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """Pool de threads no lugar do de processos e detector fixo; registra os lotes enviados."""
+    face = SimpleNamespace(bbox=np.array([10, 10, 110, 110], dtype=np.float32), det_score=0.9,
+                           embedding=np.ones(512, dtype=np.float32))
+    monkeypatch.setattr(face_capture_service, "largest_face", lambda img: face)
+    monkeypatch.setattr(bulk_enrollment, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(bulk_enrollment, "_init_worker", lambda: None)
+
+    sizes = []
+    embed_chunk = bulk_enrollment._embed_chunk
+
+    def recording(chunk):
+        sizes.append(len(chunk))
+        return embed_chunk(chunk)
+
+    monkeypatch.setattr(bulk_enrollment, "_embed_chunk", recording)
+    return sizes
+
+
+def run(dataset, **kwargs):
+    return bulk_enroll(dataset.source, dataset.manifest, workers=2, chunk_size=2,
+                       checkpoint=dataset.checkpoint, errors_path=dataset.errors, **kwargs)
+
+
+def bulk_faces(db):
+    return db.query(Face).filter(Face.source == "BULK").order_by(Face.face_id).all()
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_chunks(iter([]), 3)) == []
+
+
+def test_enrolls_in_chunks_and_logs_failures(db, dataset, chunks):
+    summary = run(dataset)
+    assert chunks == [2, 2, 2]
+    assert (summary["done"], summary["saved"], summary["failed"], summary["duplicates"]) == (6, 5, 1, 0)
+
+    faces = bulk_faces(db)
+    a, b = dataset.users
+    assert [f.user_id for f in faces] == [a, a, a, b, b]
+    assert [f.filename for f in faces] == [f"{i}.jpg" for i in range(5)]
+    assert all(f.content_hash and f.embedding for f in faces)
+
+    with open(dataset.checkpoint) as f:
+        assert json.load(f) == {"done": 6, "saved": 5, "failed": 1}
+    with open(dataset.errors) as f:
+        [error] = [json.loads(line) for line in f]
+    assert error["file"] == "missing.jpg" and error["user_id"] == b
+
+
+def test_resume_starts_after_the_checkpoint(db, dataset, chunks):
+    with open(dataset.checkpoint, "w") as f:
+        json.dump({"done": 4, "saved": 4, "failed": 0}, f)
+
+    summary = run(dataset)
+    assert chunks == [2]
+    assert (summary["done"], summary["saved"], summary["failed"]) == (6, 1, 1)
+    assert [f.filename for f in bulk_faces(db)] == ["4.jpg"]
+
+
+def test_chunk_written_before_a_crash_is_not_duplicated(db, dataset, chunks):
+    run(dataset)
+    # queda depois de gravar os lotes 2 e 3, antes do checkpoint deles
+    with open(dataset.checkpoint, "w") as f:
+        json.dump({"done": 2, "saved": 2, "failed": 0}, f)
+
+    summary = run(dataset)
+    assert (summary["saved"], summary["duplicates"]) == (0, 3)
+    assert len(bulk_faces(db)) == 5
+
+
+def test_insert_fallback_without_copy(db, enroll):
+    user_id, _ = enroll(np.empty((0, 512)))
+    assert bulk_enrollment.engine.dialect.name == "sqlite"   # caminho sem COPY
+    write_rows([{
+        "user_id": user_id, "filename": "a\tb.jpg", "source": "BULK", "embedding": b"\x00" * 2048,
+        "quality": 0.5, "content_hash": "h1", "phash": "p1",
+        "created_at": bulk_enrollment.datetime.utcnow(),
+    }])
+    write_rows([])
+    [face] = bulk_faces(db)
+    assert (face.filename, face.quality, face.content_hash, face.phash) == ("a\tb.jpg", 0.5, "h1", "p1")
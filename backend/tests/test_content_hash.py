@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from app.utils.content_hash import CONTENT_HASH_BYTES, content_hash, hamming_distance, perceptual_hash
+
+
+def photo(seed: int) -> np.ndarray:
+    """Imagem com estrutura (blocos suavizados), não ruído puro."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(small, (320, 240), interpolation=cv2.INTER_LINEAR), (9, 9), 0)
+
+
+def test_content_hash_is_stable_and_sensitive():
+    data = b"\xff\xd8 some jpeg bytes"
+    digest = content_hash(data)
+    assert digest == content_hash(data)
+    assert len(digest) == CONTENT_HASH_BYTES * 2
+    assert content_hash(data + b"\x00") != digest
+
+
+def test_perceptual_hash_format():
+    h = perceptual_hash(photo(0))
+    assert len(h) == 16
+    int(h, 16)
+
+
+def test_perceptual_hash_survives_recompression_and_resize():
+    img = photo(1)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 40])
+    assert ok
+    recompressed = cv2.resize(cv2.imdecode(buf, cv2.IMREAD_COLOR), (160, 120))
+    # bytes diferentes, mesma foto
+    assert content_hash(buf.tobytes()) != content_hash(img.tobytes())
+    assert hamming_distance(perceptual_hash(img), perceptual_hash(recompressed)) <= 6
+
+
+def test_different_images_are_far_apart():
+    distances = [hamming_distance(perceptual_hash(photo(0)), perceptual_hash(photo(s))) for s in range(2, 8)]
+    assert np.mean(distances) > 16
+
+
+def test_grayscale_input():
+    img = photo(3)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    assert perceptual_hash(gray) == perceptual_hash(img)
+
+
+def test_hamming_distance():
+    assert hamming_distance("0" * 16, "0" * 16) == 0
+    assert hamming_distance("0" * 16, "f" * 16) == 64
+    assert hamming_distance("00000000000000ff", "000000000000000f") == 4
@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+def matrix(rows: int) -> np.ndarray:
+    return np.ones((rows, 512), dtype=np.float32)   # 2 KB por linha
+
+
+def test_get_put_and_stats():
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0)
+    assert cache.get(1) is None
+    cache.put(1, matrix(2))
+    assert cache.get(1).shape == (2, 512)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == 2 * 2048
+
+
+def test_cached_arrays_are_read_only():
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0)
+    cache.put(1, matrix(1))
+    with pytest.raises(ValueError):
+        cache.get(1)[0, 0] = 0
+
+
+def test_byte_bound_evicts_least_recently_used():
+    cache = EmbeddingCache(max_bytes=3 * 2048, ttl=0)
+    cache.put(1, matrix(1))
+    cache.put(2, matrix(1))
+    cache.put(3, matrix(1))
+    cache.get(1)                    # 2 passa a ser o mais antigo
+    cache.put(4, matrix(1))
+
+    assert cache.get(2) is None
+    assert all(cache.get(u) is not None for u in (1, 3, 4))
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.evictions == 1
+
+
+def test_entry_larger_than_cache_is_not_stored():
+    cache = EmbeddingCache(max_bytes=2048, ttl=0)
+    cache.put(1, matrix(2))
+    assert cache.get(1) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=60)
+    cache.put(1, matrix(1))
+    now[0] += 59
+    assert cache.get(1) is not None
+    now[0] += 2
+    assert cache.get(1) is None
+    assert cache.expirations == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_invalidate_drops_entry():
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0)
+    cache.put(1, matrix(1))
+    cache.put(2, matrix(1))
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
+    assert cache.invalidations == 1
+
+
+def test_put_after_invalidate_with_old_version_is_dropped():
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0)
+    version = cache.version(1)      # leitura do banco começa
+    cache.invalidate(1)             # cadastro no meio da leitura
+    cache.put(1, matrix(1), version)
+    assert cache.get(1) is None
+    assert cache.stale_puts == 1
+
+    cache.put(1, matrix(1), cache.version(1))
+    assert cache.get(1) is not None
+
+
+def test_clear_invalidates_pending_fills():
+    cache = EmbeddingCache(max_bytes=1 << 20, ttl=0)
+    version = cache.version(1)
+    cache.clear()
+    cache.put(1, matrix(1), version)
+    assert cache.get(1) is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.data import migrate_embeddings
+from app.data.database import Base
+from app.model.face import Face  # noqa: F401  (registra a tabela faces)
+from app.utils.embedding_codec import (
+    EMBEDDING_DIM,
+    decode_embedding,
+    decode_embeddings,
+    encode_embedding,
+)
+
+
+def test_round_trip_is_normalized_float32(rng):
+    vec = rng.standard_normal(EMBEDDING_DIM) * 7.5
+    blob = encode_embedding(vec)
+    assert len(blob) == EMBEDDING_DIM * 4
+
+    out = decode_embedding(blob)
+    assert out.dtype == np.float32
+    assert np.linalg.norm(out) == pytest.approx(1.0, abs=1e-5)
+    np.testing.assert_allclose(out, vec / np.linalg.norm(vec), atol=1e-6)
+
+
+def test_legacy_float_list_converts_like_the_migration(rng):
+    # float8[] do Postgres chega como lista de floats Python
+    legacy = [float(x) for x in rng.standard_normal(EMBEDDING_DIM)]
+    out = decode_embedding(encode_embedding(legacy))
+    np.testing.assert_allclose(out, np.asarray(legacy) / np.linalg.norm(legacy), atol=1e-6)
+
+
+def test_decode_embeddings_builds_matrix_and_skips_none(random_embeddings):
+    embs = random_embeddings(3)
+    blobs = [encode_embedding(embs[0]), None, encode_embedding(embs[1]), memoryview(encode_embedding(embs[2]))]
+    out = decode_embeddings(blobs)
+    assert out.shape == (3, EMBEDDING_DIM)
+    assert out.flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(out, embs, atol=1e-6)
+
+
+def test_decode_empty():
+    assert decode_embedding(None) is None
+    assert decode_embeddings([None]) is None
+    assert decode_embeddings([]) is None
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    monkeypatch.setattr(migrate_embeddings, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_migration_detects_binary_column(sqlite_engine):
+    Base.metadata.create_all(bind=sqlite_engine)
+    with sqlite_engine.connect() as conn:
+        assert migrate_embeddings.embedding_column_is_binary(conn)
+    # já em bytea: nada a converter (idempotente)
+    assert migrate_embeddings.migrate() == 0
+
+
+def test_migration_detects_legacy_column(sqlite_engine):
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE faces (face_id INTEGER PRIMARY KEY, embedding REAL)"))
+    with sqlite_engine.connect() as conn:
+        assert not migrate_embeddings.embedding_column_is_binary(conn)
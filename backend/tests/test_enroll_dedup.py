@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import face_capture_service
+from app.services.face_capture_service import ENROLL_PHASH_MAX_DISTANCE, extract_upload_embeddings
+from app.utils.content_hash import perceptual_hash
+
+
+def photo(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(small, (320, 240), interpolation=cv2.INTER_LINEAR), (9, 9), 0)
+
+
+def jpeg(img: np.ndarray, quality: int = 95) -> bytes:
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture(autouse=True)
+def one_face(monkeypatch):
+    face = SimpleNamespace(bbox=np.array([40, 40, 200, 200], dtype=np.float32), det_score=0.9,
+                           embedding=np.ones(512, dtype=np.float32))
+    monkeypatch.setattr(face_capture_service, "largest_face", lambda img: face)
+
+
+def statuses(results):
+    return [r["status"] for r in results]
+
+
+def test_perceptual_dedup_is_off_by_default():
+    assert ENROLL_PHASH_MAX_DISTANCE == -1
+    known = [(7, perceptual_hash(photo(0)))]
+    results, _ = extract_upload_embeddings([jpeg(photo(0), 70)], ["a.jpg"], known)
+    assert statuses(results) == ["ok"]
+
+
+def test_recompressed_copy_of_enrolled_photo_is_duplicate():
+    known = [(7, perceptual_hash(photo(0)))]
+    results, embeddings = extract_upload_embeddings(
+        [jpeg(photo(0), 70), jpeg(photo(5))], ["copy.jpg", "other.jpg"], known, max_distance=4
+    )
+    assert statuses(results) == ["duplicate", "ok"]
+    assert results[0]["face_id"] == 7 and results[0]["match"] == "perceptual"
+    assert embeddings[0] is None and embeddings[1] is not None
+
+
+def test_similar_photos_in_one_upload_are_all_enrolled():
+    results, embeddings = extract_upload_embeddings(
+        [jpeg(photo(0)), jpeg(photo(0), 70)], ["a.jpg", "b.jpg"], [], max_distance=4
+    )
+    assert statuses(results) == ["ok", "ok"]
+    assert all(e is not None for e in embeddings)
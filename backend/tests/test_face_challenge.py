@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.model.face_liveness_state import FaceLivenessState
+from app.services import face_challenge_service as challenge_service
+from app.services.face_challenge_service import (
+    HeadPoseChallenge,
+    challenge_expired,
+    classify_move,
+    estimate_pose,
+)
+
+# 5 keypoints (olho esq., olho dir., nariz, boca esq., boca dir.) de frente
+FRONTAL = np.array([[40, 50], [80, 50], [60, 70], [45, 90], [75, 90]], dtype=np.float32)
+
+
+def kps_for(move: str) -> np.ndarray:
+    kps = FRONTAL.copy()
+    nose_shift = {"CENTER": (0, 0), "LEFT": (-15, 0), "RIGHT": (15, 0), "UP": (0, -18), "DOWN": (0, 18)}
+    kps[2] += nose_shift[move]
+    return kps
+
+
+@pytest.mark.parametrize("move", ["CENTER", "LEFT", "RIGHT", "UP", "DOWN"])
+def test_classify_move_from_keypoints(move):
+    assert classify_move(estimate_pose(kps_for(move)), mirrored=True) == move
+
+
+def test_unmirrored_camera_swaps_left_and_right():
+    assert classify_move(estimate_pose(kps_for("LEFT")), mirrored=False) == "RIGHT"
+
+
+def test_intermediate_pose_is_unclassified():
+    kps = FRONTAL.copy()
+    kps[2] += (8, 0)       # entre CENTER e RIGHT
+    assert classify_move(estimate_pose(kps), mirrored=True) is None
+
+
+def test_roll_in_degrees():
+    kps = FRONTAL.copy()
+    kps[1] += (0, 40)      # olho direito 40 px abaixo → 45°
+    assert estimate_pose(kps)["roll"] == pytest.approx(45.0, abs=0.1)
+
+
+class StubAnalyzer:
+    """Face (kps, embedding) roteirizada por frame; a ROI do tracker cai no mesmo frame."""
+
+    def __init__(self, script: dict):
+        self.script = script   # id(frame) → (kps, embedding) ou (None, None)
+
+    def detect(self, img, det_size=None):
+        frame = img if img.base is None else img.base
+        kps, emb = self.script[id(frame)]
+        if kps is None:
+            return []
+        bbox = np.array([30, 40, 90, 100], dtype=np.float32)
+        return [SimpleNamespace(bbox=bbox, kps=kps.copy(), det_score=0.9, emb=emb)]
+
+    def embed(self, img, face):
+        return face.emb
+
+
+USER = np.zeros(512, dtype=np.float32)
+USER[0] = 1.0
+OTHER = np.zeros(512, dtype=np.float32)
+OTHER[1] = 1.0
+
+
+def new_state(sequence=("LEFT", "RIGHT")) -> FaceLivenessState:
+    return FaceLivenessState(
+        id=1, user_id=1, face_id=1, movement_history=[], required_sequence=list(sequence),
+        next_expected_move=sequence[0], finished=False, hold_streak=0, need_center=False,
+        face_frames=0, matched_frames=0, attempts=0, created_at=datetime.utcnow(),
+    )
+
+
+def send(state, frames, hold_frames=2) -> HeadPoseChallenge:
+    """Um POST: nova instância do desafio sobre o mesmo estado."""
+    images = [np.zeros((160, 160, 3), dtype=np.uint8) for _ in frames]
+    analyzer = StubAnalyzer({id(img): entry for img, entry in zip(images, frames)})
+    challenge = HeadPoseChallenge(state, USER[None, :], hold_frames=hold_frames, analyzer=analyzer)
+    for img in images:
+        challenge.feed(img)
+    return challenge
+
+
+def moves(*names, emb=USER):
+    return [(kps_for(n), emb) for n in names]
+
+
+@pytest.fixture(autouse=True)
+def mirrored(monkeypatch):
+    monkeypatch.setattr(challenge_service, "POSE_MIRRORED", True)
+
+
+def test_challenge_completes_with_hold_and_center():
+    state = new_state()
+    challenge = send(state, moves("LEFT", "LEFT", "RIGHT", "RIGHT", "CENTER", "RIGHT", "RIGHT"))
+    assert state.movement_history == ["LEFT", "RIGHT"]
+    assert state.finished
+    assert challenge.transitions == 2
+    result = challenge.result()
+    assert result["live"]
+    assert result["challenge_identity"]["matched_frames"] == 7
+
+
+def test_hold_streak_survives_across_requests():
+    state = new_state()
+    send(state, moves("LEFT"))
+    assert state.hold_streak == 1 and state.movement_history == []
+    send(state, moves("LEFT"))
+    assert state.movement_history == ["LEFT"]
+
+
+def test_center_required_between_moves_across_requests():
+    state = new_state()
+    send(state, moves("LEFT", "LEFT"))
+    assert state.need_center
+    # um movimento por requisição, sem passar pelo CENTER: não avança
+    send(state, moves("RIGHT", "RIGHT"))
+    send(state, moves("RIGHT", "RIGHT"))
+    assert state.movement_history == ["LEFT"]
+    send(state, moves("CENTER", "RIGHT", "RIGHT"))
+    assert state.finished
+
+
+def test_other_face_cannot_perform_moves():
+    state = new_state()
+    send(state, moves("LEFT", "LEFT", "CENTER", "RIGHT", "RIGHT", emb=OTHER))
+    assert state.movement_history == []
+    assert state.face_frames == 5 and state.matched_frames == 0
+
+
+def test_live_uses_identity_of_the_whole_challenge():
+    state = new_state(("LEFT",))
+    # muitos frames de outra pessoa antes; o usuário só aparece no fim
+    send(state, moves(*["CENTER"] * 6, emb=OTHER))
+    last = send(state, moves("LEFT", "LEFT"))
+    assert state.finished
+    assert last.result()["identity"]["same_person_batch"]   # o último lote sozinho passaria
+    assert not last.result()["live"]
+
+
+def test_missing_face_breaks_the_streak():
+    state = new_state()
+    send(state, [(kps_for("LEFT"), USER), (None, None), (kps_for("LEFT"), USER)])
+    assert state.movement_history == []
+
+
+def test_challenge_expiry():
+    state = new_state()
+    now = state.created_at
+    assert challenge_expired(state, now=now, ttl=120, max_attempts=3) is None
+    assert challenge_expired(state, now=now + timedelta(seconds=121), ttl=120, max_attempts=3) == "expired"
+    state.attempts = 3
+    assert challenge_expired(state, now=now, ttl=120, max_attempts=3) == "too_many_attempts"
+    assert challenge_expired(state, now=now + timedelta(days=1), ttl=0, max_attempts=0) is None
+
+
+def test_expired_challenge_returns_410(client, db, enroll, random_embeddings):
+    user_id, face_ids = enroll(random_embeddings(1))
+    state = new_state()
+    state.id = None
+    state.user_id, state.face_id = user_id, face_ids[0]
+    state.created_at = datetime.utcnow() - timedelta(hours=1)
+    db.add(state)
+    db.commit()
+
+    response = client.post(f"/faces/challenge/{user_id}/{state.id}",
+                           files=[("files", ("f.jpg", b"\xff\xd8", "image/jpeg"))])
+    assert response.status_code == 410
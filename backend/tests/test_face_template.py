@@ -0,0 +1,76 @@
+import numpy as np
+
+from app.services.face_template import build_template, k_center, weighted_centroid
+
+
+def test_template_is_bounded_and_normalized(random_embeddings):
+    embs = random_embeddings(30)
+    template = build_template(embs, size=8)
+    assert template.shape == (9, 512)
+    assert template.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(template, axis=1), 1.0, atol=1e-5)
+
+
+def test_small_galleries_keep_every_embedding(random_embeddings):
+    embs = random_embeddings(3)
+    template = build_template(embs, size=8)
+    assert template.shape == (4, 512)            # centróide + as 3
+    single = random_embeddings(1)
+    assert build_template(single) is single
+
+
+def test_centroid_weights_by_quality(random_embeddings):
+    embs = random_embeddings(2)
+    centroid = weighted_centroid(embs, np.array([0.9, 0.1]))
+    assert centroid @ embs[0] > centroid @ embs[1]
+    # qualidade ausente (NaN) pesa como 1
+    np.testing.assert_allclose(
+        weighted_centroid(embs, np.array([np.nan, np.nan])), weighted_centroid(embs), atol=1e-6
+    )
+
+
+def test_k_center_picks_distinct_clusters(rng):
+    centers = np.eye(512, dtype=np.float32)[:3]
+    embs = np.repeat(centers, 5, axis=0) + 0.01 * rng.standard_normal((15, 512)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+
+    chosen = k_center(embs, 3)
+    assert sorted(i // 5 for i in chosen) == [0, 1, 2]
+
+
+def test_template_still_matches_every_pose(rng):
+    # 4 "poses" bem separadas, 10 fotos cada: o template não pode perder nenhuma
+    poses = np.eye(512, dtype=np.float32)[:4]
+    embs = np.repeat(poses, 10, axis=0) + 0.05 * rng.standard_normal((40, 512)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+
+    template = build_template(embs, size=4)
+    for pose in poses:
+        full = np.max(embs @ pose)
+        assert np.max(template @ pose) >= full - 0.05
+
+
+def test_centroid_row_raises_max_similarity(rng):
+    # efeito no threshold que justifica o opt-in: o centróide de fotos
+    # ruidosas da mesma pessoa fica mais perto de um probe novo que elas
+    identity = rng.standard_normal(512)
+    photos = identity + 1.2 * rng.standard_normal((8, 512))
+    photos /= np.linalg.norm(photos, axis=1, keepdims=True)
+    probe = identity + 1.2 * rng.standard_normal(512)
+    probe /= np.linalg.norm(probe)
+
+    raw = np.max(photos @ probe)
+    templated = np.max(build_template(photos.astype(np.float32), size=8) @ probe)
+    assert templated > raw + 0.05
+
+
+def test_raw_rows_are_matched_without_template(monkeypatch, db, enroll, random_embeddings):
+    from app.services import face_liveness_service
+    from app.services.embedding_cache import embedding_cache
+
+    monkeypatch.setattr(face_liveness_service, "TEMPLATE_ENABLED", False)
+    embs = random_embeddings(3)
+    user_id, _ = enroll(embs)
+    embedding_cache.invalidate(user_id)
+    np.testing.assert_allclose(face_liveness_service.get_user_embeddings(db, user_id), embs, atol=1e-6)
+    embedding_cache.invalidate(user_id)
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.face_tracker import FaceTracker, TrackingStats
+
+
+def face(x1, y1, x2, y2):
+    kps = np.array([[x1 + 10, y1 + 10], [x2 - 10, y1 + 10], [(x1 + x2) / 2, (y1 + y2) / 2],
+                    [x1 + 12, y2 - 10], [x2 - 12, y2 - 10]], dtype=np.float32)
+    return SimpleNamespace(bbox=np.array([x1, y1, x2, y2], dtype=np.float32), kps=kps, det_score=0.9)
+
+
+class StubAnalyzer:
+    """Registra cada chamada; `roi_faces` responde às detecções com det_size (ROI)."""
+
+    def __init__(self, full_faces, roi_faces=()):
+        self.full_faces = list(full_faces)
+        self.roi_faces = list(roi_faces)
+        self.calls = []
+
+    def detect(self, img, det_size=None):
+        self.calls.append((img.shape[:2], det_size))
+        queue = self.roi_faces if det_size else self.full_faces
+        found = queue.pop(0) if queue else None   # None = nenhum rosto
+        return [found] if found is not None else []
+
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+def test_first_frame_uses_full_detection():
+    analyzer = StubAnalyzer([face(200, 150, 300, 250)])
+    tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+    faces = tracker.detect(FRAME)
+    assert analyzer.calls == [((480, 640), None)]
+    np.testing.assert_allclose(faces[0].bbox, [200, 150, 300, 250])
+    assert tracker.stats()["full_detections"] == 1
+
+
+def test_roi_detection_maps_back_to_frame_coordinates():
+    analyzer = StubAnalyzer([face(200, 150, 300, 250)], roi_faces=[face(55, 45, 155, 145)])
+    tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+    tracker.detect(FRAME)
+    faces = tracker.detect(FRAME)
+
+    # bbox 100x100 centrada em (250, 200), meia-largura 100 → ROI [150,100]-[350,300]
+    assert analyzer.calls[1] == ((200, 200), (96, 96))
+    np.testing.assert_allclose(faces[0].bbox, [205, 145, 305, 245])
+    np.testing.assert_allclose(faces[0].kps[0], [215, 155])
+    np.testing.assert_allclose(tracker.prev_bbox, [205, 145, 305, 245])
+    assert tracker.stats() == {"full_detections": 1, "roi_detections": 1,
+                               "fallbacks": 0, "fallback_rate": 0.0}
+
+
+def test_roi_is_clipped_to_the_frame():
+    analyzer = StubAnalyzer([face(0, 0, 100, 100)], roi_faces=[face(5, 5, 105, 105)])
+    tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+    tracker.detect(FRAME)
+    faces = tracker.detect(FRAME)
+    assert analyzer.calls[1] == ((150, 150), (96, 96))
+    np.testing.assert_allclose(faces[0].bbox, [5, 5, 105, 105])
+
+
+def test_lost_face_falls_back_to_full_frame():
+    analyzer = StubAnalyzer([face(200, 150, 300, 250), face(400, 100, 500, 200)],
+                            roi_faces=[None])
+    tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+    tracker.detect(FRAME)
+    faces = tracker.detect(FRAME)
+
+    assert [det_size for _, det_size in analyzer.calls] == [None, (96, 96), None]
+    np.testing.assert_allclose(faces[0].bbox, [400, 100, 500, 200])
+    stats = tracker.stats()
+    assert (stats["full_detections"], stats["roi_detections"], stats["fallbacks"]) == (2, 0, 1)
+    assert stats["fallback_rate"] == 1.0
+
+
+def test_no_face_resets_tracking():
+    analyzer = StubAnalyzer([face(200, 150, 300, 250), None, face(10, 10, 90, 90)], roi_faces=[None])
+    tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+    tracker.detect(FRAME)
+    assert tracker.detect(FRAME) == []          # ROI falha e o frame inteiro também
+    assert tracker.prev_bbox is None
+    tracker.detect(FRAME)                       # sem bbox anterior: direto no frame inteiro
+    assert [det_size for _, det_size in analyzer.calls] == [None, (96, 96), None, None]
+
+
+def test_process_counters_aggregate_trackers():
+    stats = TrackingStats()
+    for _ in range(2):
+        analyzer = StubAnalyzer([face(200, 150, 300, 250), face(200, 150, 300, 250)],
+                                roi_faces=[face(55, 45, 155, 145), None])
+        tracker = FaceTracker(analyzer, expand=0.5, roi_det_size=96)
+        for _ in range(3):
+            tracker.detect(FRAME)
+        stats.record(tracker)
+    assert stats.snapshot() == {"full_detections": 4, "roi_detections": 2,
+                                "fallbacks": 2, "fallback_rate": 0.5}
@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+from app.data.database import get_async_engine
+from app.services import face_verify_service
+from app.services.embedding_cache import embedding_cache
+from app.services.face_verify_service import probe_cache
+
+
+def jpeg(value: int = 128) -> bytes:
+    ok, buf = cv2.imencode(".jpg", np.full((120, 160, 3), value, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    """Embedding devolvido pela "inferência" (maior face), com contagem de chamadas."""
+    state = {"embedding": None, "calls": 0}
+
+    def embed_largest_face(img):
+        state["calls"] += 1
+        return state["embedding"]
+
+    monkeypatch.setattr(face_verify_service, "embed_largest_face", embed_largest_face)
+    probe_cache.clear()
+    return state
+
+
+@pytest.fixture
+def statements():
+    """SQL emitido pela sessão assíncrona durante o teste."""
+    captured = []
+    engine = get_async_engine().sync_engine
+
+    def capture(conn, cursor, statement, *args):
+        captured.append(" ".join(statement.split()))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+def verify(client, user_id, face_id=None, content=None):
+    params = {"face_id": face_id} if face_id is not None else {}
+    return client.post(f"/faces/verify/{user_id}", params=params,
+                       files={"file": ("probe.jpg", content or jpeg(), "image/jpeg")})
+
+
+def test_face_id_fetches_only_the_embedding_column(client, enroll, random_embeddings, probe, statements):
+    embs = random_embeddings(2)
+    user_id, face_ids = enroll(embs)
+    probe["embedding"] = embs[1]
+
+    body = verify(client, user_id, face_id=face_ids[1]).json()
+    assert body["status"] == "ok" and body["match"]
+    assert body["score"] == pytest.approx(1.0, abs=1e-5)
+    assert body["face_id"] == face_ids[1]
+
+    faces_selects = [s for s in statements if s.startswith("SELECT") and "FROM faces" in s]
+    assert faces_selects == [faces_selects[0]]
+    columns = faces_selects[0].split(" FROM ")[0]
+    assert columns == "SELECT faces.embedding"
+
+
+def test_missing_reference_is_404_without_inference(client, enroll, random_embeddings, probe):
+    owner, face_ids = enroll(random_embeddings(1))
+    other, _ = enroll(random_embeddings(1))
+    embedding_cache.invalidate(owner)
+
+    assert verify(client, other, face_id=face_ids[0]).status_code == 404   # face de outro usuário
+    assert verify(client, owner, face_id=999).status_code == 404
+    response = verify(client, 999)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Nenhuma face cadastrada"
+    assert probe["calls"] == 0
+
+
+def test_other_person_is_a_mismatch(client, enroll, random_embeddings, probe):
+    embs = random_embeddings(2)
+    user_id, _ = enroll(embs[:1])
+    embedding_cache.invalidate(user_id)
+    probe["embedding"] = embs[1]
+
+    response = verify(client, user_id)
+    body = response.json()
+    assert response.status_code == 200
+    assert body["status"] == "mismatch" and not body["match"]
+    assert body["score"] < face_verify_service.FACE_MATCH_THRESHOLD
+
+
+def test_no_face_detected(client, enroll, random_embeddings, probe):
+    user_id, _ = enroll(random_embeddings(1))
+    embedding_cache.invalidate(user_id)
+    assert verify(client, user_id).json()["status"] == "no_face_detected"
+
+
+def test_repeated_probe_hits_the_cache(client, enroll, random_embeddings, probe):
+    embs = random_embeddings(1)
+    user_id, face_ids = enroll(embs)
+    embedding_cache.invalidate(user_id)
+    probe["embedding"] = embs[0]
+    hits = probe_cache.hits
+
+    first = verify(client, user_id, content=jpeg(90)).json()
+    second = verify(client, user_id, face_id=face_ids[0], content=jpeg(90)).json()
+    assert (first["probe_cached"], second["probe_cached"]) == (False, True)
+    assert second["score"] == pytest.approx(first["score"])
+    assert probe["calls"] == 1
+    assert probe_cache.hits == hits + 1
+
+    assert not verify(client, user_id, content=jpeg(91)).json()["probe_cached"]
+    assert probe["calls"] == 2
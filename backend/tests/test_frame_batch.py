@@ -0,0 +1,74 @@
+import pytest
+
+from app.utils import frame_batch
+from app.utils.frame_batch import FrameBatchError, encode_frame_batch, read_frame_batch
+
+
+async def chunked(data: bytes, size: int = 7):
+    """Corpo em pedaços pequenos, como request.stream()."""
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+FRAMES = [bytes([i]) * (10 + i) for i in range(9)]
+
+
+async def test_round_trip_without_skip():
+    body = encode_frame_batch(FRAMES, 320, 240, stride=1, quality=70)
+    header, frames, skipped = await read_frame_batch(chunked(body), frame_skip=1)
+    assert (header.width, header.height, header.count, header.stride, header.quality) == (320, 240, 9, 1, 70)
+    assert frames == FRAMES
+    assert skipped == 0
+
+
+async def test_server_skip_discards_while_reading():
+    body = encode_frame_batch(FRAMES, 320, 240)
+    _, frames, skipped = await read_frame_batch(chunked(body), frame_skip=3)
+    assert frames == FRAMES[::3]
+    assert skipped == 6
+
+
+async def test_client_stride_reduces_server_skip():
+    body = encode_frame_batch(FRAMES, 320, 240, stride=3)
+    _, frames, skipped = await read_frame_batch(chunked(body), frame_skip=3)
+    assert frames == FRAMES
+    assert skipped == 0
+
+
+@pytest.mark.parametrize("cut", [3, 16, 18, 40])
+async def test_truncated_body(cut):
+    body = encode_frame_batch(FRAMES, 320, 240)
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(body[:cut]), frame_skip=1)
+
+
+async def test_truncated_inside_skipped_frame():
+    body = encode_frame_batch(FRAMES[:2], 320, 240)
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(body[:-3]), frame_skip=2)
+
+
+async def test_bad_magic():
+    body = b"XXXX" + encode_frame_batch(FRAMES, 320, 240)[4:]
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(body), frame_skip=1)
+
+
+async def test_limits(monkeypatch):
+    monkeypatch.setattr(frame_batch, "FRAME_BATCH_MAX_FRAMES", 4)
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(encode_frame_batch(FRAMES, 320, 240)), frame_skip=1)
+
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(encode_frame_batch(FRAMES[:1], 4000, 240)), frame_skip=1)
+
+    monkeypatch.setattr(frame_batch, "FRAME_BATCH_MAX_FRAME_BYTES", 12)
+    with pytest.raises(FrameBatchError):
+        await read_frame_batch(chunked(encode_frame_batch(FRAMES[:4], 320, 240)), frame_skip=1)
+
+
+def test_endpoint_requires_frame_batch_content_type(client):
+    body = encode_frame_batch(FRAMES, 320, 240)
+    response = client.post("/faces/liveness/1/frames", content=body,
+                           headers={"Content-Type": "application/octet-stream"})
+    assert response.status_code == 415
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.face_liveness_service import FaceLivenessService, LivenessAccumulator
+from app.services.frame_quality import QUALITY_MIN_FACE_PX, check_face, check_frame
+from app.services.metrics import REJECTIONS
+
+
+def sharp(height: int = 480, width: int = 640) -> np.ndarray:
+    """Tabuleiro em tons médios: nítido e bem exposto."""
+    yy, xx = np.mgrid[:height, :width]
+    board = np.where(((yy // 16) + (xx // 16)) % 2, 90, 170).astype(np.uint8)
+    return cv2.merge([board, board, board])
+
+
+def flat(value: int) -> np.ndarray:
+    return np.full((480, 640, 3), value, dtype=np.uint8)
+
+
+def jpeg(img: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def face(size: float, det_score: float = 0.9):
+    return SimpleNamespace(bbox=np.array([100, 100, 100 + size, 100 + size], dtype=np.float32),
+                           kps=None, det_score=det_score)
+
+
+@pytest.mark.parametrize("img, reason", [
+    (sharp(), None),
+    (cv2.GaussianBlur(sharp(), (0, 0), 12), "blur"),
+    (flat(128), "blur"),
+    (flat(10), "too_dark"),
+    (flat(250), "too_bright"),
+])
+def test_check_frame(img, reason):
+    assert check_frame(img) == reason
+
+
+def test_check_face_size_and_score():
+    assert check_face(face(QUALITY_MIN_FACE_PX + 10)) is None
+    assert check_face(face(QUALITY_MIN_FACE_PX - 10)) == "face_too_small"
+    assert check_face(face(QUALITY_MIN_FACE_PX + 10, det_score=0.1)) == "low_det_score"
+
+
+def test_face_size_is_measured_in_original_pixels():
+    small_in_decode = face(QUALITY_MIN_FACE_PX * 0.6)
+    assert check_face(small_in_decode, scale=1.0) == "face_too_small"
+    # frame decodificado a 1/2: no original a face tem 1.2 x o mínimo
+    assert check_face(small_in_decode, scale=2.0) is None
+
+
+def rejections(reason: str) -> float:
+    return REJECTIONS._values.get((reason,), 0)
+
+
+def test_rejections_are_counted_per_reason():
+    before = {r: rejections(r) for r in ("blur", "too_dark", "too_bright", "face_too_small", "low_det_score")}
+    acc = LivenessAccumulator(np.zeros((1, 512)), frame_skip=1)
+    frames = [jpeg(sharp()), jpeg(flat(128)), jpeg(flat(10)), jpeg(flat(250)), jpeg(sharp())]
+    detected = iter([[face(10)], [face(200, det_score=0.1)]])
+    kept = FaceLivenessService._sampled_faces(frames, acc, lambda _: next(detected), quality_gate=True)
+    assert list(kept) == []
+
+    expected = {"blur": 1, "too_dark": 1, "too_bright": 1, "face_too_small": 1, "low_det_score": 1}
+    assert acc.result()["rejected_frames"] == expected
+    for reason, count in expected.items():
+        assert rejections(reason) - before[reason] == count
+
+
+def test_gate_off_keeps_every_frame():
+    acc = LivenessAccumulator(np.zeros((1, 512)), frame_skip=1)
+    frames = [jpeg(flat(10)), jpeg(flat(128))]
+    kept = FaceLivenessService._sampled_faces(frames, acc, lambda _: [face(10)], quality_gate=False)
+    assert len(list(kept)) == 2
+    assert acc.rejections == {}
+
+
+def test_sampled_faces_are_sized_in_original_pixels():
+    acc = LivenessAccumulator(np.zeros((1, 512)), frame_skip=1)
+    small = QUALITY_MIN_FACE_PX * 0.75   # abaixo do mínimo no frame reduzido, acima no original
+    [(img, found)] = FaceLivenessService._sampled_faces(
+        [jpeg(sharp(1080, 1920))], acc, lambda _: [face(small)], quality_gate=True
+    )
+    assert img.shape[:2] == (540, 960)
+    assert acc.rejections == {}
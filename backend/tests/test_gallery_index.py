@@ -0,0 +1,56 @@
+import numpy as np
+
+from app.services.gallery_index import GalleryIndex
+
+
+def exact_top_k(matrix: np.ndarray, probe: np.ndarray, k: int) -> list:
+    return list(np.argsort(-(matrix @ probe))[:k])
+
+
+def test_search_matches_brute_force(random_embeddings):
+    embs = random_embeddings(300)
+    index = GalleryIndex(capacity=16)       # força crescimento
+    index.add(np.arange(300) // 3, np.arange(300), embs)
+    assert len(index) == 300
+
+    for probe in random_embeddings(10):
+        hits = index.search(probe, k=5)
+        assert [h["face_id"] for h in hits] == exact_top_k(embs, probe, 5)
+        scores = [h["score"] for h in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_finds_noisy_copy(random_embeddings, rng):
+    embs = random_embeddings(100)
+    index = GalleryIndex()
+    index.add(np.arange(100) + 1000, np.arange(100), embs)
+    probe = embs[42] + 0.05 * rng.standard_normal(embs.shape[1])
+    best = index.search(probe, k=1)[0]
+    assert (best["user_id"], best["face_id"]) == (1042, 42)
+
+
+def test_k_larger_than_gallery_and_empty(random_embeddings):
+    index = GalleryIndex()
+    assert index.search(random_embeddings(1)[0]) == []
+    index.add([1, 2], [10, 20], random_embeddings(2))
+    assert len(index.search(random_embeddings(1)[0], k=10)) == 2
+
+
+def test_build_from_db(db, enroll, random_embeddings):
+    embs = random_embeddings(6)
+    alice, alice_faces = enroll(embs[:4])
+    bob, bob_faces = enroll(embs[4:])
+
+    index = GalleryIndex()
+    assert index.build(db) == 6
+    assert index.loaded
+    best = index.search(embs[5], k=1)[0]
+    assert (best["user_id"], best["face_id"]) == (bob, bob_faces[1])
+    assert index.search(embs[0], k=1)[0]["user_id"] == alice
+
+
+def test_identify_rejects_bad_top_k(client):
+    files = {"file": ("probe.jpg", b"\xff\xd8\xff\xd9", "image/jpeg")}
+    for top_k in (0, -3, 101):
+        response = client.post("/faces/identify", params={"top_k": top_k}, files=files)
+        assert response.status_code == 422
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.utils.image_decode import decode_image, read_image_size, reduction_factor, scale_face
+
+
+def encode(ext: str, width: int, height: int) -> bytes:
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(img, (width // 4, height // 4), (width // 2, height // 2), (255, 255, 255), -1)
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".png"])
+def test_read_image_size_from_header(ext):
+    assert read_image_size(encode(ext, 1920, 1080)) == (1920, 1080)
+
+
+def test_read_image_size_unknown_format():
+    assert read_image_size(b"not an image") is None
+
+
+@pytest.mark.parametrize("size, long_side, factor", [
+    ((1920, 1080), 640, 2),
+    ((1920, 1080), 240, 8),
+    ((640, 480), 640, 1),
+    ((1920, 1080), 0, 1),
+    (None, 640, 1),
+])
+def test_reduction_factor(size, long_side, factor):
+    assert reduction_factor(size, long_side) == factor
+
+
+def test_reduced_decode_keeps_long_side_and_reports_scale():
+    img, scale = decode_image(encode(".jpg", 1920, 1080), long_side=640)
+    assert img.shape == (540, 960, 3)
+    assert scale == pytest.approx(2.0)
+    assert max(img.shape[:2]) >= 640
+
+
+def test_full_decode_without_target():
+    img, scale = decode_image(encode(".jpg", 640, 480))
+    assert img.shape == (480, 640, 3)
+    assert scale == 1.0
+
+
+def test_invalid_bytes_decode_to_none():
+    img, scale = decode_image(b"\xff\xd8 truncated", long_side=640)
+    assert img is None
+    assert scale == 1.0
+
+
+def test_scale_face_maps_back_to_original():
+    class Face:
+        bbox = np.array([10.0, 20.0, 30.0, 40.0])
+        kps = np.array([[15.0, 25.0]])
+
+    face = scale_face(Face(), 2.0)
+    np.testing.assert_allclose(face.bbox, [20, 40, 60, 80])
+    np.testing.assert_allclose(face.kps, [[30, 50]])
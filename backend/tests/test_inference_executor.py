@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.inference_executor import InferenceExecutor, InferenceQueueFull, inference_executor
+
+
+class Blocker:
+    """Job que segura a thread até release(); registra quem chegou a rodar."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = []
+
+    def __call__(self, name):
+        self.started.append(name)
+        self.gate.wait(5)
+        return name
+
+    def release(self):
+        self.gate.set()
+
+
+async def until(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condição não atingida"
+        await asyncio.sleep(0.005)
+
+
+async def test_queue_is_bounded():
+    executor, job = InferenceExecutor(max_workers=1, max_queue=1), Blocker()
+    running = asyncio.ensure_future(executor.run(job, "a"))
+    queued = asyncio.ensure_future(executor.run(job, "b"))
+    await until(lambda: job.started == ["a"])
+
+    with pytest.raises(InferenceQueueFull) as full:
+        await executor.run(job, "c")
+    assert full.value.retry_after >= 1
+    assert executor.stats()["running"] == 1
+    assert executor.stats()["queue_depth"] == 1
+    assert executor.rejected == 1
+
+    job.release()
+    assert await asyncio.gather(running, queued) == ["a", "b"]
+    assert await executor.run(job, "d") == "d"
+    assert executor.stats()["completed"] == 3
+    executor.shutdown()
+
+
+async def test_cancelled_caller_keeps_the_slot_until_the_job_ends():
+    executor, job = InferenceExecutor(max_workers=1, max_queue=1), Blocker()
+    running = asyncio.ensure_future(executor.run(job, "a"))
+    queued = asyncio.ensure_future(executor.run(job, "b"))
+    await until(lambda: job.started == ["a"])
+
+    # ainda na fila: cancelar libera a vaga na hora e o job nunca roda
+    queued.cancel()
+    await until(lambda: executor._pending == 1)
+
+    # já rodando: a thread continua ocupada, a vaga só volta no fim do job
+    running.cancel()
+    await asyncio.sleep(0.05)
+    assert executor._pending == 1
+    waiting = asyncio.ensure_future(executor.run(job, "c"))
+    await until(lambda: executor._pending == 2)
+    with pytest.raises(InferenceQueueFull):
+        await executor.run(job, "d")
+
+    job.release()
+    assert await waiting == "c"
+    await until(lambda: executor._pending == 0)
+    assert job.started == ["a", "c"]
+    executor.shutdown()
+
+
+def test_full_queue_returns_503_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(inference_executor, "_pending",
+                        inference_executor.max_workers + inference_executor.max_queue)
+    expected = inference_executor.retry_after()
+
+    response = client.post("/faces/identify", files={"file": ("f.jpg", b"\xff\xd8", "image/jpeg")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(expected)
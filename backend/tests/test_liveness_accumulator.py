@@ -0,0 +1,95 @@
+import numpy as np
+
+from app.services.face_liveness_service import (
+    BATCH_MATCH_RATIO,
+    FACE_MATCH_THRESHOLD,
+    LivenessAccumulator,
+)
+
+MATCH = FACE_MATCH_THRESHOLD + 0.2
+MISS = FACE_MATCH_THRESHOLD - 0.2
+
+
+def feed(acc: LivenessAccumulator, scores):
+    for score in scores:
+        assert acc.next_frame()
+        acc.add(score)
+
+
+def test_frame_skip_samples_one_in_n():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=9, frame_skip=3)
+    sampled = [acc.next_frame() for _ in range(9)]
+    assert sampled == [True, False, False] * 3
+    assert acc.frames_sampled == 3
+    assert acc.remaining() == 0
+
+
+def test_settled_accept_when_remaining_cannot_flip():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=10, frame_skip=1)
+    feed(acc, [MATCH] * 4)
+    assert acc.settled() is None          # 4/10 < 0.5: depende dos restantes
+    feed(acc, [MATCH])
+    assert acc.settled() is True          # 5 / 10 >= BATCH_MATCH_RATIO
+    assert acc.decide() is True
+    assert acc.exit_reason == "settled"
+
+    result = acc.result()
+    assert result["same_person_batch"] is True
+    assert result["early_exit"] == "settled"
+    assert result["frames_skipped"] == 5
+
+
+def test_settled_reject_when_matches_are_out_of_reach():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=10, frame_skip=1)
+    feed(acc, [MISS] * 5)
+    assert acc.settled() is None          # 5 restantes ainda empatam em 0.5
+    feed(acc, [MISS])
+    assert acc.settled() is False
+    assert acc.decide() is False
+    assert acc.result()["same_person_batch"] is False
+
+
+def test_settled_needs_known_total():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=None, frame_skip=1)
+    feed(acc, [MATCH] * 20)
+    assert acc.remaining() is None
+    assert acc.settled() is None
+
+
+def test_sprt_decides_before_settled():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=100, frame_skip=1)
+    feed(acc, [MATCH] * 4)
+    assert acc.settled() is None
+    assert acc.sprt(0.0) is None          # desligado
+    # LLR = 4·ln(4) ≈ 5.5 >= ln(0.99/0.01) ≈ 4.6
+    assert acc.sprt(0.99) is True
+    assert acc.decide(0.99) is True
+    assert acc.exit_reason == "sprt"
+
+
+def test_sprt_rejects_impostor():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=100, frame_skip=1)
+    feed(acc, [MISS] * 4)
+    assert acc.sprt(0.99) is False
+
+
+def test_no_early_exit_keeps_batch_ratio():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=None, frame_skip=1)
+    feed(acc, [MATCH, MISS, MATCH, MISS])
+    assert acc.decide(0.0) is None
+    result = acc.result()
+    assert result["matching_ratio"] == 0.5
+    assert result["same_person_batch"] is (0.5 >= BATCH_MATCH_RATIO)
+    assert result["early_exit"] is None
+    assert result["frames_skipped"] == 0
+
+
+def test_rejections_and_no_faces():
+    acc = LivenessAccumulator(np.zeros((1, 512)), expected_frames=3, frame_skip=1)
+    acc.next_frame()
+    acc.reject("blur")
+    acc.next_frame()
+    acc.add(None)
+    result = acc.result()
+    assert result["status"] == "error"
+    assert result["rejected_frames"] == {"blur": 1}
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.routes import face_routes
+from app.services.embedding_cache import embedding_cache
+from app.services.face_liveness_service import face_app
+
+
+def jpeg() -> bytes:
+    ok, buf = cv2.imencode(".jpg", np.full((120, 160, 3), 128, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture
+def stub_analyzer(monkeypatch):
+    """Toda imagem tem uma face; o embedding devolvido é configurável."""
+    face = SimpleNamespace(bbox=np.array([20, 20, 100, 100], dtype=np.float32), kps=None, det_score=0.9)
+    stub = SimpleNamespace(embedding=None)
+    monkeypatch.setattr(face_app, "detect", lambda img, det_size=None: [face])
+    monkeypatch.setattr(face_app, "embed", lambda img, found: stub.embedding)
+    return stub
+
+
+def stream(client, user_id, frames, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    messages = []
+    with client.websocket_connect(f"/faces/liveness/ws/{user_id}?{query}") as ws:
+        for raw in frames:
+            ws.send_bytes(raw)
+            messages.append(ws.receive_json())
+            if messages[-1]["type"] == "result":
+                break
+        else:
+            ws.send_json({"event": "end"})
+            messages.append(ws.receive_json())
+    return messages
+
+
+def test_stream_matches_enrolled_user(client, enroll, random_embeddings, stub_analyzer):
+    embs = random_embeddings(2)
+    user_id, _ = enroll(embs)
+    embedding_cache.invalidate(user_id)
+    stub_analyzer.embedding = embs[0]
+
+    messages = stream(client, user_id, [jpeg()] * 4, stride=3)
+    frames = [m for m in messages if m["type"] == "frame"]
+    result = messages[-1]
+    assert frames and all(m["similarity"] == pytest.approx(1.0, abs=1e-5) for m in frames)
+    assert result["type"] == "result"
+    assert result["same_person_batch"]
+    assert result["frames_analyzed"] == len(frames)
+
+
+def test_stream_rejects_other_face(client, enroll, random_embeddings, stub_analyzer):
+    embs = random_embeddings(2)
+    user_id, _ = enroll(embs[:1])
+    embedding_cache.invalidate(user_id)
+    stub_analyzer.embedding = embs[1]
+
+    result = stream(client, user_id, [jpeg()] * 3, stride=3, total_frames=3)[-1]
+    assert result["type"] == "result"
+    assert not result["same_person_batch"]
+
+
+def test_stream_without_enrollment(client, db, stub_analyzer):
+    with client.websocket_connect("/faces/liveness/ws/999") as ws:
+        message = ws.receive_json()
+    assert message == {"type": "result", "status": "error", "message": "Nenhuma face cadastrada"}
+
+
+def test_idle_stream_is_closed(client, enroll, random_embeddings, stub_analyzer, monkeypatch):
+    monkeypatch.setattr(face_routes, "WS_IDLE_TIMEOUT", 0.05)
+    user_id, _ = enroll(random_embeddings(1))
+    embedding_cache.invalidate(user_id)
+
+    with client.websocket_connect(f"/faces/liveness/ws/{user_id}") as ws:
+        message = ws.receive_json()
+        closed = ws.receive()
+    assert message["type"] == "error"
+    assert closed == {"type": "websocket.close", "code": 1008, "reason": ""}
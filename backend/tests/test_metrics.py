@@ -0,0 +1,81 @@
+import re
+import time
+
+from app.services.metrics import REQUEST_SECONDS, STAGE_SECONDS, MetricsRegistry, stage_timer
+from app.utils import request_context
+
+ROUTE = "/faces/liveness/{user_id}/frames"
+
+
+def request_count(route: str, status: str) -> int:
+    series = REQUEST_SECONDS._series.get(("POST", route, status))
+    return series[2] if series else 0
+
+
+def test_route_template_label_and_request_id(client):
+    before = request_count(ROUTE, "415")
+    response = client.post("/faces/liveness/7/frames", content=b"x",
+                           headers={"X-Request-ID": "req-abc", "Content-Type": "application/octet-stream"})
+    assert response.status_code == 415
+    assert response.headers["X-Request-ID"] == "req-abc"
+    assert request_count(ROUTE, "415") == before + 1
+
+    text = client.get("/metrics").text
+    line = f'face_http_request_seconds_count{{method="POST",route="{ROUTE}",status="415"}} {before + 1}'
+    assert line in text.splitlines()
+    assert "/faces/liveness/7/frames" not in text      # id do usuário não vira label
+
+
+def test_request_id_is_generated_when_missing(client):
+    first = client.get("/health/live").headers["X-Request-ID"]
+    second = client.get("/health/live").headers["X-Request-ID"]
+    assert re.fullmatch(r"[0-9a-f]{32}", first) and first != second
+
+
+def test_stage_timer_feeds_histogram_and_request_log():
+    ctx = {"id": "req-1", "stages": {}}
+    token = request_context._current.set(ctx)
+    try:
+        series = STAGE_SECONDS._series.get(("decode",))
+        before = series[2] if series else 0
+        for _ in range(2):
+            with stage_timer("decode"):
+                time.sleep(0.002)
+    finally:
+        request_context._current.reset(token)
+
+    assert STAGE_SECONDS._series[("decode",)][2] == before + 2
+    assert ctx["stages"]["decode"] >= 0.004
+    with stage_timer("decode"):      # fora de requisição: só o histograma
+        pass
+    assert STAGE_SECONDS._series[("decode",)][2] == before + 3
+
+
+def test_text_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo.", ("outcome",))
+    histogram = registry.histogram("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    registry.callback("demo_depth", "Demo.", lambda: 3)
+    registry.callback("demo_broken", "Demo.", lambda: 1 / 0)
+    counter.inc(outcome="ok")
+    counter.inc(2, outcome="ok")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_total Demo.",
+        "# TYPE demo_total counter",
+        'demo_total{outcome="ok"} 3.0',
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1.0"} 2',
+        'demo_seconds_bucket{le="+Inf"} 3',
+        "demo_seconds_sum 5.55",
+        "demo_seconds_count 3",
+        "# HELP demo_depth Demo.",
+        "# TYPE demo_depth gauge",
+        "demo_depth 3.0",
+    ]
+    assert registry.counter("demo_total", "Outro.") is counter   # mesmo nome → mesma métrica
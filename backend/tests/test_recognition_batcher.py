@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+import pytest
+
+from app.services.recognition_batcher import RecognitionBatcher
+
+
+def crop(value: float) -> np.ndarray:
+    return np.full((2, 2), value, dtype=np.float32)
+
+
+class StubRecognizer:
+    """get_feat: linha i = valor do recorte i; registra o tamanho de cada session.run."""
+
+    def __init__(self):
+        self.calls = []
+        self.error = None
+        self.gate = None        # threading.Event: segura o session.run até ser liberado
+        self.entered = threading.Event()
+
+    def get_feat(self, crops):
+        self.calls.append(len(crops))
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return np.stack([np.full(512, c.flat[0]) for c in crops])
+
+
+def make(rec, **kwargs):
+    kwargs.setdefault("max_wait_ms", 10_000)
+    kwargs.setdefault("producers", lambda: 100)
+    return RecognitionBatcher(lambda: rec, enabled=True, **kwargs)
+
+
+def test_flush_on_max_batch():
+    rec = StubRecognizer()
+    batcher = make(rec, max_batch=4)
+    t0 = time.perf_counter()
+    futures = [batcher.submit([crop(i)]) for i in range(4)]
+    results = [f.result(timeout=2) for f in futures]
+    assert time.perf_counter() - t0 < 2
+    assert rec.calls == [4]
+    assert [r[0, 0] for r in results] == [0, 1, 2, 3]
+
+
+def test_flush_on_max_wait():
+    rec = StubRecognizer()
+    batcher = make(rec, max_batch=32, max_wait_ms=50)
+    t0 = time.perf_counter()
+    result = batcher.embed([crop(7), crop(8)])
+    assert time.perf_counter() - t0 >= 0.045
+    assert rec.calls == [2]
+    assert result.shape == (2, 512) and result.dtype == np.float32
+    assert list(result[:, 0]) == [7, 8]
+
+
+def test_flush_when_all_producers_are_queued():
+    rec = StubRecognizer()
+    batcher = make(rec, max_batch=32, producers=lambda: 2)
+    t0 = time.perf_counter()
+    futures = [batcher.submit([crop(1)]), batcher.submit([crop(2), crop(3)])]
+    results = [f.result(timeout=2) for f in futures]
+    assert time.perf_counter() - t0 < 2     # sem esperar os 10 s de max_wait
+    assert rec.calls == [3]
+    assert [list(r[:, 0]) for r in results] == [[1], [2, 3]]
+    assert batcher.stats()["avg_requests_per_batch"] == 2
+
+
+def test_error_reaches_every_caller_and_thread_survives():
+    rec = StubRecognizer()
+    rec.error = RuntimeError("onnx failed")
+    batcher = make(rec, max_wait_ms=20, producers=lambda: 3)
+    futures = [batcher.submit([crop(i)]) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="onnx failed"):
+            future.result(timeout=2)
+
+    rec.error = None
+    assert batcher.submit([crop(5)]).result(timeout=2)[0, 0] == 5
+    assert batcher.restarts == 0
+
+
+class Fatal(BaseException):
+    pass
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_thread_is_restarted():
+    rec = StubRecognizer()
+    rec.error = Fatal()
+    batcher = make(rec, producers=lambda: 1)
+    with pytest.raises(Fatal):
+        batcher.submit([crop(1)]).result(timeout=2)
+    batcher._thread.join(2)
+
+    rec.error = None
+    assert batcher.submit([crop(2)]).result(timeout=2)[0, 0] == 2
+    assert batcher.restarts == 1
+
+
+def test_timed_out_caller_is_dropped_from_the_batch():
+    rec = StubRecognizer()
+    rec.gate = threading.Event()
+    batcher = make(rec, producers=lambda: 1, timeout=0.05)
+
+    first = batcher.submit([crop(1)])          # ocupa o session.run
+    assert rec.entered.wait(2)
+    with pytest.raises(FutureTimeout):
+        batcher.embed([crop(2), crop(3)])      # desiste antes de entrar no lote
+    rec.gate.set()
+    assert first.result(timeout=2)[0, 0] == 1
+
+    assert batcher.submit([crop(4)]).result(timeout=2)[0, 0] == 4
+    assert rec.calls == [1, 1]                  # o recorte abandonado nunca rodou
+
+
+def test_empty_input_skips_the_queue():
+    rec = StubRecognizer()
+    batcher = make(rec)
+    assert batcher.embed([]).shape == (0, 512)
+    assert rec.calls == [] and batcher._thread is None
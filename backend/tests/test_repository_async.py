@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from app.data.database import AsyncSessionLocal
+from app.model.face import Face
+from app.repository.repository_face import (
+    get_embeddings_by_user_async,
+    get_face_embedding_async,
+    get_upload_hashes_async,
+)
+from app.repository.repository_liveness_state import (
+    create_liveness_state,
+    get_latest_face_id_async,
+    get_liveness_state_async,
+)
+from app.utils.embedding_codec import decode_embedding
+
+
+@pytest.fixture
+def two_users(db, enroll, random_embeddings):
+    first, second = random_embeddings(2), random_embeddings(1)
+    a, a_faces = enroll(first)
+    b, b_faces = enroll(second)
+    db.query(Face).filter(Face.face_id == a_faces[0]).update(
+        {"content_hash": "abc", "phash": "0f0f", "quality": 0.5}
+    )
+    db.commit()
+    return {"a": (a, a_faces, first), "b": (b, b_faces, second)}
+
+
+async def test_embeddings_by_user(two_users):
+    a, _, first = two_users["a"]
+    async with AsyncSessionLocal() as db:
+        rows = await get_embeddings_by_user_async(db, a)
+        assert await get_embeddings_by_user_async(db, 999) == []
+    assert len(rows) == 2
+    found = np.stack([decode_embedding(r.embedding) for r in rows])
+    assert (found @ first.T).max(axis=0) == pytest.approx([1.0, 1.0], abs=1e-5)   # sem ordem garantida
+    assert sorted(r.quality for r in rows if r.quality is not None) == [0.5]
+
+
+async def test_face_embedding_is_scoped_to_the_user(two_users):
+    a, a_faces, first = two_users["a"]
+    b, _, _ = two_users["b"]
+    async with AsyncSessionLocal() as db:
+        blob = await get_face_embedding_async(db, a, a_faces[1])
+        assert await get_face_embedding_async(db, b, a_faces[1]) is None
+        assert await get_face_embedding_async(db, a, 999) is None
+    assert decode_embedding(blob) == pytest.approx(first[1], abs=1e-6)
+
+
+async def test_upload_hashes(two_users):
+    a, a_faces, _ = two_users["a"]
+    async with AsyncSessionLocal() as db:
+        rows = await get_upload_hashes_async(db, a)
+    assert {(r.face_id, r.content_hash, r.phash) for r in rows} == {
+        (a_faces[0], "abc", "0f0f"), (a_faces[1], None, None)
+    }
+
+
+async def test_liveness_state_round_trip(two_users):
+    a, a_faces, _ = two_users["a"]
+    b, _, _ = two_users["b"]
+    async with AsyncSessionLocal() as db:
+        face_id = await get_latest_face_id_async(db, a)
+        assert face_id == max(a_faces)
+        assert await get_latest_face_id_async(db, 999) is None
+
+        state = create_liveness_state(db, a, face_id, ["LEFT", "RIGHT"])
+        await db.commit()
+        state_id = state.id
+
+    async with AsyncSessionLocal() as db:
+        loaded = await get_liveness_state_async(db, state_id, a)
+        assert await get_liveness_state_async(db, state_id, b) is None
+    assert loaded.required_sequence == ["LEFT", "RIGHT"]
+    assert loaded.next_expected_move == "LEFT"
+    assert (loaded.hold_streak, loaded.attempts, loaded.finished) == (0, 0, False)
+    assert loaded.created_at is not None
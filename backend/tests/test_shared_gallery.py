@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.shared_gallery import _CAPACITY, SharedGallery
+
+
+@pytest.fixture
+def store(tmp_path, db, enroll, random_embeddings):
+    """Galeria construída com 2 usuários; retorna (path, {user_id: embeddings})."""
+    users = {}
+    for n in (2, 3):
+        embs = random_embeddings(n)
+        user_id, _ = enroll(embs)
+        users[user_id] = embs
+    path = str(tmp_path / "gallery")
+    assert SharedGallery(path).build(db) == 5
+    return path, users
+
+
+def worker(path: str, **kwargs) -> SharedGallery:
+    gallery = SharedGallery(path, **kwargs)
+    assert gallery.attach()
+    return gallery
+
+
+def test_attach_requires_a_built_store(tmp_path):
+    assert not SharedGallery(str(tmp_path / "missing")).attach()
+    assert not SharedGallery("").attach()
+
+
+def test_attached_worker_reads_users_and_searches(store):
+    path, users = store
+    gallery = worker(path)
+    for user_id, embs in users.items():
+        found, qualities = gallery.user_embeddings(user_id)
+        assert found == pytest.approx(embs, abs=1e-6)
+        assert np.isnan(qualities).all()
+        assert gallery.search(embs[0], k=1)[0]["user_id"] == user_id
+    assert gallery.user_embeddings(999) is None
+    assert gallery.stats()["faces"] == 5
+
+
+def test_append_is_visible_to_other_workers(store, random_embeddings):
+    path, users = store
+    reader, writer = worker(path), worker(path)
+    user_id = next(iter(users))
+    extra = random_embeddings(1)
+
+    writer.append([user_id], [100], extra, [0.7])
+    found, qualities = reader.user_embeddings(user_id)
+    assert found.shape[0] == len(users[user_id]) + 1
+    assert qualities[-1] == pytest.approx(0.7)
+    assert reader.changed_users() == {user_id}
+    assert reader.changed_users() == set()
+
+    writer.append([user_id], [100], extra)    # face já na galeria: ignorada
+    assert reader.user_embeddings(user_id)[0].shape[0] == len(users[user_id]) + 1
+    assert reader.changed_users() == set()
+
+
+def test_change_ring_overflow_and_rebuild_invalidate_everything(store, db, random_embeddings):
+    path, _ = store
+    reader = worker(path, changes=2)
+    writer = SharedGallery(path, changes=2)
+    writer.append([7, 8, 9], [201, 202, 203], random_embeddings(3))
+    assert reader.changed_users() is None      # 3 gerações num anel de 2
+
+    SharedGallery(path).build(db)
+    assert reader.changed_users() is None      # rebuild limpa o anel
+    assert reader.changed_users() == set()
+
+
+def test_grow_moves_to_a_new_epoch(store, random_embeddings):
+    path, users = store
+    reader = worker(path)
+    epoch, capacity = reader.stats()["epoch"], reader.stats()["capacity"]
+    old_arrays = reader._arrays
+
+    n = capacity                               # não cabe: dobra a capacidade
+    SharedGallery(path).append(np.full(n, 42), np.arange(1000, 1000 + n), random_embeddings(n))
+
+    stats = reader.stats()
+    assert stats["epoch"] == epoch + 1
+    assert stats["capacity"] >= 5 + n
+    assert stats["faces"] == 5 + n
+    assert reader.user_embeddings(42)[0].shape[0] == n
+    assert not os.path.exists(os.path.join(path, f"vectors.{epoch}.f32"))
+
+    # mapa antigo continua válido e com o próprio size: nada de linha zerada
+    old_size = int(old_arrays["size"][0])
+    assert old_size == 5
+    assert (old_arrays["face_ids"][:old_size] > 0).all()
+
+
+def test_epoch_removed_before_open_is_retried(store, random_embeddings):
+    path, _ = store
+    reader = worker(path)
+    writer = SharedGallery(path)
+    open_epoch = reader._open_epoch
+    calls = []
+
+    def racing_open(epoch, mode, capacity=None):
+        calls.append(epoch)
+        if len(calls) == 1:
+            # outro worker cresce a galeria de novo entre a leitura do header e o open
+            cap = int(writer._open_header()[0][_CAPACITY])
+            writer.append(np.full(cap, 43), np.arange(5000, 5000 + cap), random_embeddings(cap))
+        return open_epoch(epoch, mode, capacity)
+
+    cap = reader.stats()["capacity"]
+    writer.append(np.full(cap, 42), np.arange(1000, 1000 + cap), random_embeddings(cap))
+    reader._open_epoch = racing_open
+
+    assert reader.user_embeddings(43)[0].shape[0] > 0
+    assert calls == [calls[0], calls[0] + 1]
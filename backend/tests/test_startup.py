@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.routes import health
+
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(main, "STARTUP_RETRIES", 3)
+    monkeypatch.setattr(main, "STARTUP_RETRY_DELAY", 0.0)
+
+
+def flaky(failures, result=None):
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append(1)
+        if len(calls) <= failures:
+            raise ConnectionError("db starting")
+        return result
+    fn.calls = calls
+    return fn
+
+
+async def run_lifespan():
+    async with main.lifespan(main.app):
+        return dict(health._startup)
+
+
+def test_retry_delays_double_up_to_cap(monkeypatch):
+    monkeypatch.setattr(main, "STARTUP_RETRIES", 6)
+    monkeypatch.setattr(main, "STARTUP_RETRY_DELAY", 1.0)
+    monkeypatch.setattr(main, "STARTUP_RETRY_MAX_DELAY", 5.0)
+    assert list(main.retry_delays()) == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_lifespan_retries_transient_failures(monkeypatch, fast_retry):
+    startup = flaky(2, result={})
+    monkeypatch.setattr(main, "startup", startup)
+
+    state = asyncio.run(run_lifespan())
+    assert len(startup.calls) == 3
+    assert state["status"] == "ready"
+    assert state["report"]["startup_attempts"] == 3
+
+
+def test_lifespan_reraises_when_retries_exhausted(monkeypatch, fast_retry):
+    startup = flaky(10)
+    monkeypatch.setattr(main, "startup", startup)
+
+    # o erro sobe: o processo sai e é reiniciado, em vez de ficar vivo e nunca "ready"
+    with pytest.raises(ConnectionError):
+        asyncio.run(run_lifespan())
+    assert len(startup.calls) == 3
+    assert health._startup["status"] == "failed"
+
+
+def test_create_tables_retries_then_raises(monkeypatch, fast_retry):
+    create_all = flaky(2)
+    monkeypatch.setattr(main.Base.metadata, "create_all", create_all)
+    main.create_tables()
+    assert len(create_all.calls) == 3
+
+    create_all = flaky(10)
+    monkeypatch.setattr(main.Base.metadata, "create_all", create_all)
+    with pytest.raises(ConnectionError):
+        main.create_tables()
+    assert len(create_all.calls) == 3
@@ -2,6 +2,31 @@ import { useState, useRef, useEffect } from "react";
 import * as faceapi from "face-api.js";
 import "./FaceLiveness.css";
 
+// === Lote binário de frames (application/x-face-frames) ===
+// Mesmo formato de backend/app/utils/frame_batch.py: header de 16 bytes
+// little-endian ("FRMB", versão, stride, qualidade, reservado, largura,
+// altura, quantidade) e cada JPEG prefixado pelo tamanho (u32).
+const FRAME_BATCH_MEDIA_TYPE = "application/x-face-frames";
+
+const encodeFrameBatch = (frames, width, height, stride, quality) => {
+  const header = new DataView(new ArrayBuffer(16));
+  [..."FRMB"].forEach((c, i) => header.setUint8(i, c.charCodeAt(0)));
+  header.setUint8(4, 1);
+  header.setUint8(5, stride);
+  header.setUint8(6, quality);
+  header.setUint16(8, width, true);
+  header.setUint16(10, height, true);
+  header.setUint32(12, frames.length, true);
+
+  const parts = [header];
+  for (const frame of frames) {
+    const length = new DataView(new ArrayBuffer(4));
+    length.setUint32(0, frame.byteLength, true);
+    parts.push(length, frame);
+  }
+  return new Blob(parts, { type: FRAME_BATCH_MEDIA_TYPE });
+};
+
 export default function FaceLiveness() {
   const [userId, setUserId] = useState("");
   const [cameraActive, setCameraActive] = useState(false);
@@ -15,11 +40,21 @@ export default function FaceLiveness() {
   const streamRef = useRef(null);
   const detectorRef = useRef(null);
   const rafRef = useRef(null);
+  const wsRef = useRef(null);
+  const decidedRef = useRef(false);
+  // sem WebSocket (proxy/rede bloqueando): junta os frames e envia num POST só
+  const batchRef = useRef(null);
 
   const CENTER_TOLERANCE = 0.22;
   const movementSequence = ["ESQUERDA", "DIREITA"];
   const framesPerMove = 5;
   const frameInterval = 400;
+  // Amostragem no cliente: só 1 a cada SAMPLE_EVERY frames é capturado e
+  // enviado (o servidor descartaria os outros), em resolução e JPEG reduzidos
+  const SAMPLE_EVERY = 3;
+  const SEND_WIDTH = 320;
+  const JPEG_QUALITY = 0.7;
+  const sentPerMove = Math.ceil(framesPerMove / SAMPLE_EVERY);
 
   // === Inicia câmera ===
   const startCamera = async () => {
@@ -111,81 +146,135 @@ export default function FaceLiveness() {
     }
   }, [faceCentered]);
 
-  // === Captura frames e envia ao backend ===
+  // === Abre o stream de liveness (WebSocket) ===
+  const openStream = () =>
+    new Promise((resolve, reject) => {
+      const totalFrames = movementSequence.length * sentPerMove;
+      const ws = new WebSocket(
+        `ws://localhost:8000/faces/liveness/ws/${userId}?total_frames=${totalFrames}&stride=${SAMPLE_EVERY}`
+      );
+      ws.binaryType = "arraybuffer";
+      decidedRef.current = false;
+
+      ws.onopen = () => resolve(ws);
+      ws.onerror = () => reject(new Error("falha na conexão com o servidor"));
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === "result") {
+          decidedRef.current = true;
+          setOverlayMessage(
+            data.same_person_batch
+              ? "Verificação realizada com sucesso!"
+              : "Rosto diferente ou não reconhecido"
+          );
+          setCurrentMoveIndex(movementSequence.length);
+        } else if (data.type === "error") {
+          decidedRef.current = true;
+          setOverlayMessage("Erro ao enviar dados: " + data.message);
+          setCurrentMoveIndex(movementSequence.length);
+        }
+      };
+      wsRef.current = ws;
+    });
+
+  // === Fallback: envia o lote inteiro de uma vez (POST binário) ===
+  const sendBatch = async (width, height) => {
+    const body = encodeFrameBatch(
+      batchRef.current, width, height, SAMPLE_EVERY, Math.round(JPEG_QUALITY * 100)
+    );
+    batchRef.current = null;
+    try {
+      const res = await fetch(`http://localhost:8000/faces/liveness/${userId}/frames`, {
+        method: "POST",
+        headers: { "Content-Type": FRAME_BATCH_MEDIA_TYPE },
+        body,
+      });
+      const data = await res.json();
+      if (!res.ok || data.status === "error") {
+        throw new Error(data.detail || data.message || `HTTP ${res.status}`);
+      }
+      setOverlayMessage(
+        data.same_person_batch
+          ? "Verificação realizada com sucesso!"
+          : "Rosto diferente ou não reconhecido"
+      );
+    } catch (err) {
+      setOverlayMessage("Erro ao enviar dados: " + err.message);
+    }
+    setCurrentMoveIndex(movementSequence.length);
+  };
+
+  // === Captura frames e envia ao backend (um a um via stream, ou em lote) ===
   useEffect(() => {
     const captureMove = async () => {
       if (currentMoveIndex === -1 || currentMoveIndex >= movementSequence.length) return;
 
+      let ws = wsRef.current;
+      if (currentMoveIndex === 0) {
+        batchRef.current = null;
+        decidedRef.current = false;
+      }
+      if (!batchRef.current && (!ws || ws.readyState !== WebSocket.OPEN)) {
+        try {
+          ws = await openStream();
+        } catch {
+          ws = null;
+          batchRef.current = [];
+        }
+      }
+
       setOverlayMessage(`Mova o rosto para ${movementSequence[currentMoveIndex]}...`);
 
       const canvas = canvasRef.current;
       const ctx = canvas.getContext("2d");
-      canvas.width = videoRef.current.videoWidth || 640;
-      canvas.height = videoRef.current.videoHeight || 480;
+      const videoWidth = videoRef.current.videoWidth || 640;
+      const videoHeight = videoRef.current.videoHeight || 480;
+      canvas.width = Math.min(SEND_WIDTH, videoWidth);
+      canvas.height = Math.round((videoHeight * canvas.width) / videoWidth);
 
-      const frames = [];
       for (let f = 0; f < framesPerMove; f++) {
-        ctx.save();
-        ctx.scale(-1, 1);
-        ctx.drawImage(videoRef.current, -canvas.width, 0, canvas.width, canvas.height);
-        ctx.restore();
-
-        const blob = await new Promise((res) => canvas.toBlob(res, "image/jpeg", 0.9));
-        if (blob)
-          frames.push(
-            new File(
-              [blob],
-              `frame_${movementSequence[currentMoveIndex]}_${f}_${Date.now()}.jpg`,
-              { type: "image/jpeg" }
-            )
-          );
+        if (decidedRef.current) return;
+
+        // mantém o ritmo do movimento, mas só codifica os frames amostrados
+        if (f % SAMPLE_EVERY === 0) {
+          ctx.save();
+          ctx.scale(-1, 1);
+          ctx.drawImage(videoRef.current, -canvas.width, 0, canvas.width, canvas.height);
+          ctx.restore();
+
+          const blob = await new Promise((res) => canvas.toBlob(res, "image/jpeg", JPEG_QUALITY));
+          if (blob && batchRef.current) batchRef.current.push(await blob.arrayBuffer());
+          else if (blob && ws.readyState === WebSocket.OPEN) ws.send(await blob.arrayBuffer());
+        }
         await new Promise((r) => setTimeout(r, frameInterval));
       }
 
-      if (!canvas.framesCollected) canvas.framesCollected = [];
-      canvas.framesCollected.push(...frames);
+      if (decidedRef.current) return;
 
       const nextIndex = currentMoveIndex + 1;
       if (nextIndex < movementSequence.length) {
         setCurrentMoveIndex(nextIndex);
       } else {
         setOverlayMessage("Salvando e validando rosto...");
-        await captureFinalResult();
-        setCurrentMoveIndex(movementSequence.length);
+        if (batchRef.current) {
+          await sendBatch(canvas.width, canvas.height);
+        } else if (ws.readyState === WebSocket.OPEN) {
+          // Sinaliza fim do envio; o resultado chega em ws.onmessage
+          ws.send(JSON.stringify({ event: "end" }));
+        }
       }
     };
 
     captureMove();
   }, [currentMoveIndex]);
 
-  // === Chamada ao backend ===
-  const captureFinalResult = async () => {
-    const formData = new FormData();
-    canvasRef.current.framesCollected.forEach((f) => formData.append("files", f));
-
-    try {
-      const res = await fetch(`http://localhost:8000/faces/liveness/${userId}`, {
-        method: "POST",
-        body: formData,
-      });
-      if (!res.ok) throw new Error(await res.text());
-      const data = await res.json();
-      setOverlayMessage(
-        data.same_person_batch
-          ? "Verificação realizada com sucesso!"
-          : "Rosto diferente ou não reconhecido"
-      );
-    } catch (err) {
-      setOverlayMessage("Erro ao enviar dados: " + err.message);
-    } finally {
-      canvasRef.current.framesCollected = [];
-    }
-  };
-
   // === Parar tudo ===
   const stopAll = () => {
     if (rafRef.current) cancelAnimationFrame(rafRef.current);
     if (streamRef.current) streamRef.current.getTracks().forEach((t) => t.stop());
+    if (wsRef.current) wsRef.current.close();
+    wsRef.current = null;
+    batchRef.current = null;
     detectorRef.current = null;
     setCameraActive(false);
     setFaceDetected(false);